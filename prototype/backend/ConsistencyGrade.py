@@ -3,143 +3,168 @@
 
 # In[32]:
 
-import warnings
-warnings.filterwarnings("ignore")
+import pandas as pd
+import numpy as np
 
+## a weekly score strictly above the threshold counts as a good game
+GOOD_GAME_THRESHOLDS = {"QB": 19.2, "RB": 14.8, "WR": 14.2, "TE": 10.4}
 
-import rpy2.robjects as ro
-import pandas as pd
-import json
-import statistics as st
-
-r = ro.r
-r['source']('ParseNFLPlayers.R')
-
-parse_nfl_player_r = ro.globalenv['get_player_data']
-parse_position_players_r = ro.globalenv['get_position_players']
-
-
-# In[33]:
-
-
-from rpy2.robjects import pandas2ri
-from rpy2.robjects.conversion import localconverter
-
-# This is an R "tibble" of the data
-# We load this object from the R script we used earlier
-player_stats_r = ro.globalenv['player_stats']
-team_data_r = ro.globalenv['team_data']
-player_stats_kicker_r = ro.globalenv['player_stats_kicker']
-roster_r = ro.globalenv['roster']
-official_player_stats_r = ro.globalenv['official_player_stats_total']
-weekly_stats = ro.globalenv['official_player_stats']
-
-# Convert the tibble to a pandas data frame
-with localconverter(ro.default_converter + pandas2ri.converter):
-    df_player_stats = ro.conversion.rpy2py(player_stats_r)
-    df_team_data = ro.conversion.rpy2py(player_stats_r)
-    df_player_stats_kicker = ro.conversion.rpy2py(player_stats_kicker_r)
-    df_roster = ro.conversion.rpy2py(roster_r)
-    df_official_player_stats = ro.conversion.rpy2py(official_player_stats_r)
-    df_weekly_stats = ro.conversion.rpy2py(weekly_stats)
-
-
-test = df_weekly_stats.iloc[0:17,47]
-st.variance(test)
-
-## array of weekly scores
-player_scores = {"" : []}
-name = ""
-for index, player_name in df_weekly_stats.iterrows():
-    name = df_weekly_stats["player_name"][index]
-    if(name not in player_scores.keys()):
-        player_scores[name] = []
-    player_scores[name].append(df_weekly_stats["fantasy_points_ppr"][index])
-
-## name to id connection
-player_name_id = {"" : ""}
-for index, player_name in df_official_player_stats.iterrows():
-    name = df_official_player_stats["player_name"][index]
-    id = df_official_player_stats["player_id"][index]
-    player_name_id[name] = id
-
-## id to pos connection
-idpos = {"":""}
-for index, gsis_id in df_roster.iterrows():
-    id2 = df_roster["gsis_id"][index]
-    pos1 = df_roster["position"][index]
-    idpos[id2] = pos1
-
-## adding position
-df_official_player_stats["pos"] = "NA"
-for index, player_name in df_official_player_stats.iterrows():
-    name = df_official_player_stats["player_name"][index]
-    id1 = player_name_id[name]
-    if(idpos.__contains__(id1)):
-        position = idpos[id1]
-        df_official_player_stats["pos"][index] = position
-
-## Calculating good games
-player_gg = {"" : 0}
-for x in player_scores:
-    if(len(player_scores[x]) > 1):
-        score = 0
-        if(player_name_id.__contains__(x) and idpos.__contains__(player_name_id[x])):
-            pos2 = idpos[player_name_id[x]]
-        if(pos2 == "QB"):
-            for y in player_scores[x]:
-                if(y > 19.2):
-                    score += 1
-        if(pos2 == "RB"):
-            for y in player_scores[x]:
-                if(y > 14.8):
-                    score += 1
-        if(pos2 == "WR"):
-            for y in player_scores[x]:
-                if(y > 14.2):
-                    score += 1
-        if(pos2 == "TE"):
-            for y in player_scores[x]:
-                if(y > 10.4):
-                    score += 1
-        player_gg[x] = score
-
-
-
-player_var = {"" : 0}
-for x in player_scores:
-    if(len(player_scores[x]) > 1): 
-        player_var[x] = st.variance(player_scores[x])
-
-player_grade = {"" : "F"}
-for x in player_gg:
-    score1 = player_gg[x]
-    if(score1 >= 14):
-        player_grade[x] = "A+"
-    elif(score1 >= 12):
-        player_grade[x] = "A"
-    elif(score1 >= 10):
-        player_grade[x] = "A-"
-    elif(score1 >= 9):
-        player_grade[x] = "B+"
-    elif(score1 >= 7):
-        player_grade[x] = "B"
-    elif(score1 == 6):
-        player_grade[x] = "B-"
-    elif(score1 == 5):
-        player_grade[x] = "C+"
-    elif(score1 < 4 and score1 > 2):
-        player_grade[x] = "C"
-    else:
-        player_grade[x] = "D"
-
-
-df_official_player_stats["consistency_grade"] = "F"
-
-for index, player_name in df_official_player_stats.iterrows():
-    pname = df_official_player_stats["player_name"][index]
-    ##print(len(player_scores[pname]))
-    if(player_scores.__contains__(pname)):
-      if (len(player_scores[pname]) > 1):
-        df_official_player_stats["consistency_grade"][index] = player_grade[pname]
+## good-game count bins -> grade. A count c falls in bin i where
+## GRADE_EDGES[i - 1] <= c < GRADE_EDGES[i]; note 4 good games is a "D"
+GRADE_EDGES = np.array([3, 4, 5, 6, 7, 9, 10, 12, 14])
+GRADE_LABELS = np.array(["D", "C", "D", "C+", "B-", "B", "B+", "A-", "A", "A+"])
+
+
+def grade_good_games(good_games):
+    """Maps good-game counts to letter grades.
+
+    Args:
+        good_games (array-like[int]): Number of good games per player.
+
+    Returns:
+        grades (np.ndarray[str]): Letter grade for each count.
+
+    """
+
+    return GRADE_LABELS[np.searchsorted(GRADE_EDGES, good_games, side="right")]
+
+
+def good_game_counts(df_weekly_stats):
+    """Summarizes each player's weekly scores into running aggregates.
+
+    The grades only need, per player, the number of games and of scores
+    above each position's threshold, so these can be kept and updated as
+    new weeks arrive (see `merge_counts`) instead of re-reading every
+    week. The mean and sum of squared deviations of the scores (Welford)
+    are kept as well, for their standard deviation.
+
+    Args:
+        df_weekly_stats (pd.DataFrame): Weekly stats with `player_name`
+            and `fantasy_points_ppr`.
+
+    Returns:
+        counts (pd.DataFrame): Indexed by `player_name` in order of first
+            appearance, with `games`, `good_<pos>` for each position in
+            `GOOD_GAME_THRESHOLDS`, and `scored`, `ppr_mean` and `ppr_m2`
+            over the games with a score.
+
+    """
+
+    names = df_weekly_stats["player_name"]
+    points = df_weekly_stats["fantasy_points_ppr"]
+    grouped = points.groupby(names, sort=False)
+
+    counts = pd.DataFrame({"games": grouped.size()})
+    for pos, threshold in GOOD_GAME_THRESHOLDS.items():
+        counts["good_" + pos] = (points > threshold).groupby(names, sort=False).sum()
+    counts["scored"] = grouped.count()
+    counts["ppr_mean"] = grouped.mean().fillna(0.0)
+    counts["ppr_m2"] = (grouped.var(ddof=0) * counts["scored"]).fillna(0.0)
+    counts.index.name = "player_name"
+
+    return counts
+
+
+def merge_counts(counts, later):
+    """Adds the aggregates of later weeks to running aggregates.
+
+    Counts add up; means and squared deviations are combined with the
+    parallel form of Welford's update (Chan et al.). New players are
+    appended, so the order still matches first appearance.
+
+    Args:
+        counts (pd.DataFrame): Aggregates so far, from `good_game_counts`.
+        later (pd.DataFrame): `good_game_counts` of the new weeks only.
+
+    Returns:
+        counts (pd.DataFrame): Aggregates over all the weeks.
+
+    """
+
+    index = counts.index.append(later.index.difference(counts.index, sort=False))
+    a = counts.reindex(index, fill_value=0)
+    b = later.reindex(index, fill_value=0)
+
+    merged = a + b
+    n = merged["scored"].where(merged["scored"] > 0)
+    delta = b["ppr_mean"] - a["ppr_mean"]
+    merged["ppr_mean"] = (a["ppr_mean"] + delta * b["scored"] / n).fillna(0.0)
+    merged["ppr_m2"] = (a["ppr_m2"] + b["ppr_m2"] + delta ** 2 * a["scored"] * b["scored"] / n).fillna(0.0)
+
+    return merged
+
+
+def grade_counts(counts, df_official_player_stats, df_roster):
+    """Grades every player from their running aggregates.
+
+    Args:
+        counts (pd.DataFrame): Output of `good_game_counts` or `merge_counts`.
+        df_official_player_stats (pd.DataFrame): Season totals with
+            `player_name` and `player_id`.
+        df_roster (pd.DataFrame): Roster with `gsis_id` and `position`.
+
+    Returns:
+        df (pd.DataFrame): Copy of the season totals with `pos`,
+            `consistency_grade` and `ppr_sd`, the standard deviation of
+            the player's weekly scores.
+
+    """
+
+    df = df_official_player_stats.copy()
+
+    ## name -> id and id -> position, last occurrence wins
+    name_to_id = (df.drop_duplicates("player_name", keep="last")
+                    .set_index("player_name")["player_id"])
+    id_to_pos = (df_roster.drop_duplicates("gsis_id", keep="last")
+                          .set_index("gsis_id")["position"])
+
+    ids = df["player_name"].map(name_to_id)
+    df["pos"] = ids.map(id_to_pos).where(ids.isin(id_to_pos.index), "NA")
+
+    ## players with more than one game, in order of first appearance
+    graded_counts = counts[counts["games"] > 1]
+    graded = graded_counts.index
+
+    ## Players whose position can't be looked up reuse the position of the
+    ## previously graded player. This is how the original loop behaved and
+    ## is kept so the grades don't change.
+    graded_ids = pd.Series(graded, index=graded).map(name_to_id)
+    known = graded_ids.isin(id_to_pos.index)
+    positions = graded_ids.map(id_to_pos).fillna("").where(known).ffill().to_numpy()
+
+    ## good games against the resolved position's threshold; none without one
+    good_games = np.zeros(len(graded), dtype=int)
+    for pos in GOOD_GAME_THRESHOLDS:
+        at_pos = positions == pos
+        good_games[at_pos] = graded_counts["good_" + pos].to_numpy()[at_pos]
+
+    grades = pd.Series(grade_good_games(good_games), index=graded)
+    df["consistency_grade"] = df["player_name"].map(grades).fillna("F")
+
+    sd = np.sqrt(counts["ppr_m2"] / counts["scored"].where(counts["scored"] > 0))
+    df["ppr_sd"] = df["player_name"].map(sd)
+
+    return df
+
+
+def grade_consistency(df_weekly_stats, df_official_player_stats, df_roster):
+    """Grades every player on how many good fantasy games they had.
+
+    Weekly scores are grouped by player name. Players with more than one
+    weekly row are counted against their position's good-game threshold
+    and graded; everybody else gets an "F".
+
+    Args:
+        df_weekly_stats (pd.DataFrame): Weekly stats with `player_name`
+            and `fantasy_points_ppr`.
+        df_official_player_stats (pd.DataFrame): Season totals with
+            `player_name` and `player_id`.
+        df_roster (pd.DataFrame): Roster with `gsis_id` and `position`.
+
+    Returns:
+        df (pd.DataFrame): Copy of the season totals with `pos`,
+            `consistency_grade` and `ppr_sd` columns added.
+
+    """
 
+    return grade_counts(good_game_counts(df_weekly_stats), df_official_player_stats, df_roster)
@@ -1,15 +1,9 @@
-import rpy2.robjects as ro
 import pandas as pd
 import json
 
-r = ro.r
-r['source']('ParseNFLPlayers.R')
+from providers import provider
 
-parse_nfl_player_r = ro.globalenv['get_player_data']
-
-fake_json = parse_nfl_player_r("Patrick Mahomes")
-
-real_json = fake_json[0]
+real_json = provider.get_player_data("Patrick Mahomes")
 
 ## let's do some work to just parse the fake json. Pandas is being the worst
 parsed = json.loads(json_df)
@@ -4,82 +4,69 @@
 # In[23]
 
 
-import warnings
-warnings.filterwarnings("ignore")
-
-
-import rpy2.robjects as ro
 import pandas as pd
-import json
-
-r = ro.r
-r['source']('ParseNFLPlayers.R')
+import numpy as np
 
-parse_nfl_player_r = ro.globalenv['get_player_data']
-parse_position_players_r = ro.globalenv['get_position_players']
+## weights on (percent_rec_yards, percent_rec_tds, target_share)
+REC_SHARE_WEIGHTS = (1/4, 1/2, 1/4)
 
 
-from rpy2.robjects import pandas2ri
-from rpy2.robjects.conversion import localconverter
+## team totals the shares are relative to
+TEAM_TOTAL_COLUMNS = ["passing_tds", "passing_yards"]
 
-# This is an R "tibble" of the data
-# We load this object from the R script we used earlier
-player_stats_r = ro.globalenv['player_stats']
-team_data_r = ro.globalenv['team_data']
-player_stats_kicker_r = ro.globalenv['player_stats_kicker']
-roster_r = ro.globalenv['roster']
-official_player_stats_r = ro.globalenv['official_player_stats_total']
-weekly_stats = ro.globalenv['official_player_stats']
 
-# Convert the tibble to a pandas data frame
-with localconverter(ro.default_converter + pandas2ri.converter):
-    df_player_stats = ro.conversion.rpy2py(player_stats_r)
-    df_team_data = ro.conversion.rpy2py(player_stats_r)
-    df_player_stats_kicker = ro.conversion.rpy2py(player_stats_kicker_r)
-    df_roster = ro.conversion.rpy2py(roster_r)
-    df_official_player_stats = ro.conversion.rpy2py(official_player_stats_r)
-    df_weekly_stats = ro.conversion.rpy2py(weekly_stats)
+def team_passing_totals(df_official_player_stats):
+    """Sums the passing stats of each team's players.
 
-team_passing_tds = {}
-for index, recent_team in df_official_player_stats.iterrows():
-    if(df_official_player_stats["recent_team"][index] not in team_passing_tds.keys()):
-        team_passing_tds[df_official_player_stats["recent_team"][index]] = 0
-    team_passing_tds[df_official_player_stats["recent_team"][index]] += df_official_player_stats["passing_tds"][index]
+    Args:
+        df_official_player_stats (pd.DataFrame): Season totals with
+            `recent_team`, `passing_tds` and `passing_yards`.
 
+    Returns:
+        totals (pd.DataFrame): `passing_tds` and `passing_yards`, indexed
+            by `recent_team`.
 
-team_passing_yards = {}
-for index, recent_team in df_official_player_stats.iterrows():
-    if(df_official_player_stats["recent_team"][index] not in team_passing_yards.keys()):
-        team_passing_yards[df_official_player_stats["recent_team"][index]] = 0
-    team_passing_yards[df_official_player_stats["recent_team"][index]] += df_official_player_stats["passing_yards"][index]
+    """
 
+    return df_official_player_stats.groupby("recent_team", sort=False, dropna=False)[TEAM_TOTAL_COLUMNS].sum()
 
-df_official_player_stats["percent_rec_tds"] = 0
-for index, receving_tds in df_official_player_stats.iterrows():
-    team = str(df_official_player_stats["recent_team"][index])
-    df_official_player_stats["percent_rec_tds"][index] = df_official_player_stats["receiving_tds"][index] / team_passing_tds[team]
 
-df_official_player_stats["percent_rec_yards"] = 0
-for index, receving_yards in df_official_player_stats.iterrows():
-    team = str(df_official_player_stats["recent_team"][index])
-    df_official_player_stats["percent_rec_yards"][index] = df_official_player_stats["receiving_yards"][index] / team_passing_yards[team]
+def compute_share_metrics(df_official_player_stats, weights=REC_SHARE_WEIGHTS, team_totals=None):
+    """Computes each player's share of their team's passing game.
 
-df_official_player_stats.sort_values(by='receiving_yards', ascending=False)
+    Team passing totals are summed over `recent_team`. Teams with no
+    passing yards or touchdowns get NaN shares instead of dividing by zero.
 
+    Args:
+        df_official_player_stats (pd.DataFrame): Season totals with
+            `recent_team`, passing and receiving yards and touchdowns, and
+            `target_share`.
+        weights (tuple[float]): Weights on the yards, touchdown and target
+            shares for `rec_share`. `rec_dom` always weighs them equally.
+        team_totals (pd.DataFrame): Running team totals, as returned by
+            `team_passing_totals`, to use instead of summing them here.
 
-df_official_player_stats["rec_dom"] = 0
-for index, receving_yards in df_official_player_stats.iterrows():
-    df_official_player_stats["rec_dom"][index] = (1/3)*(df_official_player_stats["percent_rec_yards"][index] + df_official_player_stats["percent_rec_tds"][index] + df_official_player_stats["target_share"][index])
+    Returns:
+        df (pd.DataFrame): Copy of the season totals with `percent_rec_tds`,
+            `percent_rec_yards`, `rec_dom`, `rec_share` and `rec_share_%`.
 
-df_official_player_stats["rec_share"] = 0
-df_official_player_stats["rec_share_%"] = 0
-for index, receving_yards in df_official_player_stats.iterrows():
-    df_official_player_stats["rec_share"][index] = (1/4)*(df_official_player_stats["percent_rec_yards"][index]) + (1/2)*(df_official_player_stats["percent_rec_tds"][index]) + (1/4)*(df_official_player_stats["target_share"][index])
-    df_official_player_stats["rec_share_%"][index] = "{:.0%}".format(df_official_player_stats["rec_share"][index])
+    """
 
+    df = df_official_player_stats.copy()
 
-df_official_player_stats.sort_values(by='rec_share', ascending=False)
+    if team_totals is None:
+        team = df.groupby("recent_team", sort=False, dropna=False)
+        team_totals = team[TEAM_TOTAL_COLUMNS].transform("sum")
+    else:
+        team_totals = team_totals.reindex(df["recent_team"]).set_axis(df.index)
+    team_totals = team_totals.where(team_totals != 0)
 
-df_sorted_rec_share = df_official_player_stats.sort_values(by='rec_share', ascending=False)
+    df["percent_rec_tds"] = df["receiving_tds"] / team_totals["passing_tds"]
+    df["percent_rec_yards"] = df["receiving_yards"] / team_totals["passing_yards"]
 
+    shares = (df["percent_rec_yards"], df["percent_rec_tds"], df["target_share"])
+    df["rec_dom"] = (1/3)*(shares[0] + shares[1] + shares[2])
+    df["rec_share"] = sum(w * s for w, s in zip(weights, shares))
+    df["rec_share_%"] = ["{:.0%}".format(x) for x in df["rec_share"].to_numpy()]
 
+    return df
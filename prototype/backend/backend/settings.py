@@ -27,6 +27,9 @@ DEBUG = True
 
 ALLOWED_HOSTS = []
 
+# Addresses allowed to read /api/_stats/ when DEBUG is off, besides staff users
+INTERNAL_IPS = ['127.0.0.1']
+
 
 # Application definition
 
@@ -43,7 +46,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'fantasyPlayerPortal.middleware.TimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'fantasyPlayerPortal.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -129,3 +134,29 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CORS_ORIGIN_WHITELIST = [
         'http://localhost:3000'
 ]
+
+## lets the frontend read how many records a paged list request matched
+CORS_EXPOSE_HEADERS = ['X-Total-Count']
+
+# Logging
+# Reports how long each stage of loading the player data takes
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'data_provider': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+        'providers': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
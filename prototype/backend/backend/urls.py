@@ -21,6 +21,15 @@ from fantasyPlayerPortal import views
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/player/<str:name>/', views.nfl_player),
+    path('api/players/', views.nfl_players),
+    path('api/trends/<str:name>/', views.player_trends),
     path('api/position/<str:pos>/', views.position_players),
     path('api/metrics/', views.advanced_metrics),
+    path('api/search/', views.search_players),
+    path('api/leaders/<str:stat>/', views.stat_leaders),
+    path('api/graph/', views.player_graph),
+    path('api/export/', views.export_players),
+    path('api/db/players/', views.table_players),
+    path('api/db/weeks/', views.table_player_weeks),
+    path('api/_stats/', views.server_stats),
 ]
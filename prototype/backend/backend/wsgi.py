@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+## PYBALL_PRELOAD=1 loads the data with the app, for gunicorn --preload
+if os.environ.get('PYBALL_PRELOAD') == '1':
+    from providers import preload
+    preload()
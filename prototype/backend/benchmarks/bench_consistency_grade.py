@@ -0,0 +1,130 @@
+"""Benchmark for the consistency grades.
+
+Times `ConsistencyGrade.grade_consistency` against the original
+row-by-row loops on synthetic weekly tables of growing size, and checks
+that both produce the same grades.
+
+Run from `prototype/backend`:
+
+    python -m benchmarks.bench_consistency_grade --seasons 1 5 10 20
+"""
+
+import argparse
+import time
+
+from benchmarks.synthetic import make_dataset
+from ConsistencyGrade import grade_consistency
+
+
+def legacy_grade_consistency(df_weekly_stats, df_official_player_stats, df_roster):
+    """The original iterrows() implementation, kept as a reference.
+
+    Chained `df[col][index] =` writes are replaced with `.loc` so the
+    reference still works on copy-on-write pandas.
+    """
+
+    df_official_player_stats = df_official_player_stats.copy()
+
+    player_scores = {"" : []}
+    for index, player_name in df_weekly_stats.iterrows():
+        name = df_weekly_stats["player_name"][index]
+        if(name not in player_scores.keys()):
+            player_scores[name] = []
+        player_scores[name].append(df_weekly_stats["fantasy_points_ppr"][index])
+
+    player_name_id = {"" : ""}
+    for index, player_name in df_official_player_stats.iterrows():
+        name = df_official_player_stats["player_name"][index]
+        player_name_id[name] = df_official_player_stats["player_id"][index]
+
+    idpos = {"":""}
+    for index, gsis_id in df_roster.iterrows():
+        idpos[df_roster["gsis_id"][index]] = df_roster["position"][index]
+
+    df_official_player_stats["pos"] = "NA"
+    for index, player_name in df_official_player_stats.iterrows():
+        id1 = player_name_id[df_official_player_stats["player_name"][index]]
+        if(idpos.__contains__(id1)):
+            df_official_player_stats.loc[index, "pos"] = idpos[id1]
+
+    thresholds = {"QB": 19.2, "RB": 14.8, "WR": 14.2, "TE": 10.4}
+    player_gg = {"" : 0}
+    pos2 = None
+    for x in player_scores:
+        if(len(player_scores[x]) > 1):
+            if(player_name_id.__contains__(x) and idpos.__contains__(player_name_id[x])):
+                pos2 = idpos[player_name_id[x]]
+            player_gg[x] = sum(1 for y in player_scores[x] if pos2 in thresholds and y > thresholds[pos2])
+
+    player_grade = {"" : "F"}
+    for x in player_gg:
+        score1 = player_gg[x]
+        if(score1 >= 14):
+            player_grade[x] = "A+"
+        elif(score1 >= 12):
+            player_grade[x] = "A"
+        elif(score1 >= 10):
+            player_grade[x] = "A-"
+        elif(score1 >= 9):
+            player_grade[x] = "B+"
+        elif(score1 >= 7):
+            player_grade[x] = "B"
+        elif(score1 == 6):
+            player_grade[x] = "B-"
+        elif(score1 == 5):
+            player_grade[x] = "C+"
+        elif(score1 < 4 and score1 > 2):
+            player_grade[x] = "C"
+        else:
+            player_grade[x] = "D"
+
+    df_official_player_stats["consistency_grade"] = "F"
+    for index, player_name in df_official_player_stats.iterrows():
+        pname = df_official_player_stats["player_name"][index]
+        if(player_scores.__contains__(pname)):
+            if (len(player_scores[pname]) > 1):
+                df_official_player_stats.loc[index, "consistency_grade"] = player_grade[pname]
+
+    return df_official_player_stats
+
+
+def best_of(func, repeat):
+    """Returns the fastest of `repeat` calls to `func`, in seconds."""
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seasons", type=int, nargs="+", default=[1, 5, 10, 20])
+    parser.add_argument("--players", type=int, default=600)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--legacy-max-rows", type=int, default=60000,
+                        help="skip the slow reference above this many weekly rows")
+    args = parser.parse_args()
+
+    print("%8s %10s %12s %12s %9s" % ("seasons", "rows", "vectorized", "legacy", "speedup"))
+    for seasons in args.seasons:
+        data = make_dataset(seasons=seasons, players=args.players)
+        weekly, totals, roster = data["weekly"], data["totals"], data["roster"]
+
+        fast = best_of(lambda: grade_consistency(weekly, totals, roster), args.repeat)
+        if len(weekly) <= args.legacy_max_rows:
+            expected = legacy_grade_consistency(weekly, totals, roster)
+            slow = best_of(lambda: legacy_grade_consistency(weekly, totals, roster), 1)
+            result = grade_consistency(weekly, totals, roster)
+            assert (result["consistency_grade"] == expected["consistency_grade"]).all()
+            assert (result["pos"] == expected["pos"]).all()
+            print("%8d %10d %11.1fms %11.1fms %8.0fx"
+                  % (seasons, len(weekly), fast * 1e3, slow * 1e3, slow / fast))
+        else:
+            print("%8d %10d %11.1fms %12s %9s" % (seasons, len(weekly), fast * 1e3, "-", "-"))
+
+
+if __name__ == "__main__":
+    main()
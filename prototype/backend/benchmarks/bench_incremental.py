@@ -0,0 +1,125 @@
+"""Benchmark for folding a new week into a snapshot.
+
+Splits the last week off a synthetic dataset, exports the rest as the
+base snapshot, and times `incremental.refresh_snapshot` adding the week
+back against a full export of every week. Checks that both snapshots
+serve the same totals, grades, shares and player data.
+
+Run from `prototype/backend`:
+
+    python -m benchmarks.bench_incremental --seasons 1 5 20
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import encoded
+import incremental
+import snapshot
+from benchmarks.synthetic import SyntheticProvider, make_all_data, make_dataset, make_season_totals
+from snapshot_provider import SnapshotProvider
+
+
+def split_last_week(data, seed=0):
+    """Splits a dataset into everything before its last week, and that week.
+
+    Returns:
+        base (dict[str, pd.DataFrame]): Dataset without the last week.
+        weekly (pd.DataFrame): The last week's weekly rows.
+        all_data (pd.DataFrame): The last week's `all_data` rows.
+
+    """
+
+    weekly = data["weekly"]
+    ## weeks are numbered across seasons so the last one is the max
+    order = weekly["season"] * 100 + weekly["week"]
+    last = order == order.max()
+    before = weekly[~last].reset_index(drop=True)
+    week = weekly[last].reset_index(drop=True)
+
+    base = {
+        "weekly": before,
+        "totals": make_season_totals(before),
+        "roster": data["roster"],
+        "all_data": make_all_data(before, data["roster"], seed=seed),
+    }
+    return base, week, make_all_data(week, data["roster"], seed=seed)
+
+
+def check_same(full, refreshed, names):
+    """Asserts two snapshots serve the same data.
+
+    Args:
+        full (str): Snapshot exported from every week.
+        refreshed (str): Snapshot refreshed with the last week.
+        names (iterable[str]): Normalized names of the players in that week.
+
+    """
+
+    expected, actual = SnapshotProvider(full), SnapshotProvider(refreshed)
+
+    pd.testing.assert_frame_equal(actual.frame("official_player_stats"), expected.frame("official_player_stats"),
+                                  check_exact=False, rtol=1e-9)
+
+    grades = actual.consistency_grades().set_index("player_id")
+    reference = expected.consistency_grades().set_index("player_id")
+    assert (grades["consistency_grade"] == reference["consistency_grade"]).all()
+    np.testing.assert_allclose(grades["ppr_sd"], reference["ppr_sd"], rtol=1e-9)
+
+    shares = actual.receiver_share().set_index("player_id").loc[reference.index]
+    reference_shares = expected.receiver_share().set_index("player_id").loc[reference.index]
+    for col in ("rec_dom", "rec_share"):
+        np.testing.assert_allclose(shares[col], reference_shares[col], rtol=1e-9)
+
+    pd.testing.assert_frame_equal(actual.weekly_trends().to_pandas(), expected.weekly_trends().to_pandas(),
+                                  check_exact=False, rtol=1e-9)
+
+    index, reference_index = actual.player_index(), expected.player_index()
+    season = expected.seasons()[-1]
+    assert actual.seasons() == expected.seasons()
+    for name in names:
+        assert index.lookup(name) == reference_index.lookup(name), name
+        assert actual.player_data(name, [season]) == expected.player_data(name, [season]), name
+
+    for pos, payload in actual.position_json().items():
+        assert encoded.loads(payload) == encoded.loads(expected.position_json()[pos]), pos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seasons", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--players", type=int, default=2000)
+    args = parser.parse_args()
+
+    print("%8s %10s %10s %12s %12s" % ("seasons", "rows", "new rows", "full export", "incremental"))
+    for seasons in args.seasons:
+        data = make_dataset(seasons=seasons, players=args.players)
+        base, week, week_all_data = split_last_week(data)
+
+        with tempfile.TemporaryDirectory() as path:
+            full, base_path, refreshed = (os.path.join(path, name) for name in ("full", "base", "refreshed"))
+            snapshot.export_snapshot(SyntheticProvider(base), base_path)
+
+            start = time.perf_counter()
+            snapshot.export_snapshot(SyntheticProvider(data), full)
+            full_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            timings = incremental.refresh_snapshot(base_path, refreshed, week, week_all_data)
+            incremental_seconds = time.perf_counter() - start
+
+            check_same(full, refreshed, week_all_data["name"].unique())
+
+        print("%8d %10d %10d %10.1fms %10.1fms" % (seasons, len(data["weekly"]), len(week),
+                                                  full_seconds * 1e3, incremental_seconds * 1e3))
+        for stage, seconds in timings.items():
+            print("  %-28s %10.1fms" % (stage, seconds * 1e3))
+
+
+if __name__ == "__main__":
+    main()
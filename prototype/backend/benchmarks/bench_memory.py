@@ -0,0 +1,134 @@
+"""Benchmark for the memory workers use with compaction and preloading.
+
+Exports a synthetic snapshot twice, once with `all_data` as `pandas2ri`
+leaves it and once compacted (see compact.py), and forks worker
+processes the way `gunicorn --preload` does: with the data loaded and
+warmed in the parent first, or loaded by each worker itself. Every
+worker looks some players up, then reports its RSS, PSS and private
+memory (see memory.py).
+
+Linux only, for PSS and `os.fork`. Run from `prototype/backend`:
+
+    python -m benchmarks.bench_memory --seasons 5 --workers 4
+"""
+
+import argparse
+import gc
+import json
+import os
+import tempfile
+
+import pyarrow as pa
+
+import snapshot
+from benchmarks.synthetic import SyntheticProvider, make_dataset
+from snapshot_provider import SnapshotProvider
+from memory import process_memory
+
+MB = 1024 * 1024
+
+
+def export_plain(provider, path):
+    """Exports a snapshot, then puts back the uncompacted `all_data`."""
+
+    snapshot.export_snapshot(provider, path)
+    table = pa.Table.from_pandas(snapshot.group_player_rows(provider.frame("all_data")), preserve_index=False)
+    snapshot.write_table(path, "all_data", table)
+    for season, part in snapshot.split_partitions(table).items():
+        snapshot.write_table(path, snapshot.partition_name("all_data", season), part)
+    return table
+
+
+def serve(provider, names):
+    """Does what a worker does: loads everything, then looks players up."""
+
+    provider.warm()
+    for name in names:
+        provider.player_data(name)
+
+
+def fork_workers(path, workers, names, preload):
+    """Forks workers serving a snapshot and collects their memory use.
+
+    Args:
+        path (str): Snapshot directory.
+        workers (int): Number of workers.
+        names (list[str]): Players each worker looks up.
+        preload (bool): Load and warm the data before forking.
+
+    Returns:
+        memory (list[dict[str, int]]): `process_memory` of each worker.
+
+    """
+
+    provider = SnapshotProvider(path)
+    if preload:
+        provider.warm()
+        gc.collect()
+        gc.freeze()
+
+    ## workers stay alive until every one has reported, so shared pages stay shared
+    release, hold = os.pipe()
+    pipes = []
+    for _ in range(workers):
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read)
+            os.close(hold)
+            serve(provider, names)
+            os.write(write, json.dumps(process_memory()).encode())
+            os.close(write)
+            os.read(release, 1)
+            os._exit(0)
+        os.close(write)
+        pipes.append((pid, read))
+
+    results = []
+    for _, read in pipes:
+        with os.fdopen(read) as f:
+            results.append(json.loads(f.read()))
+    os.close(hold)
+    os.close(release)
+    for pid, _ in pipes:
+        os.waitpid(pid, 0)
+
+    if preload:
+        gc.unfreeze()
+    provider.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seasons", type=int, default=5)
+    parser.add_argument("--players", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    data = make_dataset(seasons=args.seasons, players=args.players)
+    names = list(data["all_data"]["full_name"].drop_duplicates()[:args.lookups])
+
+    with tempfile.TemporaryDirectory() as path:
+        plain, compact = os.path.join(path, "plain"), os.path.join(path, "compact")
+        provider = SyntheticProvider(data)
+        before = export_plain(provider, plain)
+        snapshot.export_snapshot(SyntheticProvider(data), compact)
+        after = snapshot.read_table(compact, "all_data")
+        print("all_data: %d rows, %.1fMB plain, %.1fMB compacted" % (before.num_rows, before.nbytes / MB,
+                                                                     after.nbytes / MB))
+
+        print("%-10s %-10s %12s %12s %12s %12s" % ("all_data", "preload", "RSS/worker", "PSS/worker",
+                                                   "private", "total PSS"))
+        for label, snapshot_path in (("plain", plain), ("compacted", compact)):
+            for preload in (False, True):
+                workers = fork_workers(snapshot_path, args.workers, names, preload)
+                mean = {key: sum(w[key] for w in workers) / len(workers) / MB for key in ("rss", "pss", "private")}
+                print("%-10s %-10s %10.1fMB %10.1fMB %10.1fMB %10.1fMB" % (
+                    label, "yes" if preload else "no", mean["rss"], mean["pss"], mean["private"],
+                    sum(w["pss"] for w in workers) / MB))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Benchmark for player lookups by name.
+
+Compares p50/p99 latency of `PlayerIndex.lookup` with a full filter over
+`all_data` on every request, which is what `get_player_data` does in R.
+Offline the filter is an Arrow scan over a synthetic `all_data`; with
+`--r` it calls the real R function on APIData.Rdata instead.
+
+Run from `prototype/backend`:
+
+    python -m benchmarks.bench_player_lookup --seasons 1 5
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pyarrow as pa
+
+import snapshot
+from benchmarks.synthetic import make_dataset
+from player_index import PlayerIndex
+
+
+def latencies(func, queries):
+    """Times `func` on every query, returning the latencies in seconds."""
+
+    times = np.empty(len(queries))
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        func(query)
+        times[i] = time.perf_counter() - start
+    return times
+
+
+def report(label, times):
+    print("%-24s p50 %9.1fus   p99 %9.1fus"
+          % (label, np.percentile(times, 50) * 1e6, np.percentile(times, 99) * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seasons", type=int, nargs="+", default=[1, 5])
+    parser.add_argument("--players", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--r", action="store_true",
+                        help="also time the R get_player_data on APIData.Rdata")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for seasons in args.seasons:
+        all_data = snapshot.group_player_rows(make_dataset(seasons=seasons, players=args.players)["all_data"])
+        table = pa.Table.from_pandas(all_data, preserve_index=False)
+
+        start = time.perf_counter()
+        index = PlayerIndex(table)
+        built = time.perf_counter() - start
+
+        ## mostly real names in mixed case, plus typos that miss
+        names = rng.choice(all_data["full_name"].unique(), args.queries)
+        queries = [n.upper() if i % 3 == 0 else n for i, n in enumerate(names)]
+        queries[::10] = ["%s x" % q for q in queries[::10]]
+
+        for query in queries[:50]:
+            assert index.lookup(query) == snapshot.find_player(table, query), query
+
+        print("%d season(s), %d rows, %d players, index built in %.2fs"
+              % (seasons, table.num_rows, len(index), built))
+        report("full scan (Arrow)", latencies(lambda q: snapshot.find_player(table, q), queries))
+        report("index", latencies(index.lookup, queries))
+
+    if args.r:
+        from r_provider import RDataProvider
+
+        provider = RDataProvider()
+        index = provider.player_index()
+        names = rng.choice(provider.frame("all_data")["full_name"].astype(str).unique(), args.queries)
+        print("APIData.Rdata, %d players" % len(index))
+        report("R get_player_data", latencies(provider.get_player_data, list(names)))
+        report("index", latencies(index.lookup, list(names)))
+
+
+if __name__ == "__main__":
+    main()
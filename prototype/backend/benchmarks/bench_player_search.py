@@ -0,0 +1,54 @@
+"""Benchmark for the autocomplete search.
+
+Replays every prefix of a sample of names, as if typed one keystroke at
+a time, plus misspelled names, and reports p50/p99 latency of
+`PlayerSearch.search`.
+
+Run from `prototype/backend`:
+
+    python -m benchmarks.bench_player_search --players 3000
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pyarrow as pa
+
+import snapshot
+from benchmarks.bench_player_lookup import latencies, report
+from benchmarks.synthetic import make_dataset
+from player_index import PlayerIndex
+from player_search import PlayerSearch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=3000)
+    parser.add_argument("--seasons", type=int, default=1)
+    parser.add_argument("--names", type=int, default=200)
+    args = parser.parse_args()
+
+    all_data = snapshot.group_player_rows(make_dataset(seasons=args.seasons, players=args.players)["all_data"])
+    index = PlayerIndex(pa.Table.from_pandas(all_data, preserve_index=False))
+
+    start = time.perf_counter()
+    search = PlayerSearch(index)
+    built = time.perf_counter() - start
+
+    rng = np.random.default_rng(0)
+    names = rng.choice(all_data["full_name"].unique(), args.names)
+    keystrokes = [name[:i] for name in names for i in range(1, len(name) + 1)]
+    ## drop one letter from the middle of each name
+    typos = [name[:len(name) // 2] + name[len(name) // 2 + 1:] for name in names]
+
+    for name in names[:20]:
+        assert search.search(name)[0]["name"] == name
+
+    print("%d players, search built in %.2fs" % (len(index), built))
+    report("keystrokes", latencies(search.search, keystrokes))
+    report("misspelled names", latencies(search.search, typos))
+
+
+if __name__ == "__main__":
+    main()
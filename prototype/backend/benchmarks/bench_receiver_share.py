@@ -0,0 +1,89 @@
+"""Benchmark for the receiver share metrics.
+
+Times `ReceiverShare.compute_share_metrics` against the original
+row-by-row loops, checks both give the same numbers, and times a sweep
+over alternative `rec_share` weightings.
+
+Run from `prototype/backend`:
+
+    python -m benchmarks.bench_receiver_share --players 600 2000 10000
+"""
+
+import argparse
+import itertools
+
+import numpy as np
+
+from benchmarks.bench_consistency_grade import best_of
+from benchmarks.synthetic import make_dataset
+from ReceiverShare import compute_share_metrics
+
+
+def legacy_share_metrics(df_official_player_stats):
+    """The original iterrows() implementation, kept as a reference.
+
+    Chained `df[col][index] =` writes are replaced with `.loc` so the
+    reference still works on copy-on-write pandas.
+    """
+
+    df = df_official_player_stats.copy()
+
+    team_passing_tds = {}
+    team_passing_yards = {}
+    for index, recent_team in df.iterrows():
+        team = df["recent_team"][index]
+        team_passing_tds[team] = team_passing_tds.get(team, 0) + df["passing_tds"][index]
+        team_passing_yards[team] = team_passing_yards.get(team, 0) + df["passing_yards"][index]
+
+    df["percent_rec_tds"] = 0.0
+    df["percent_rec_yards"] = 0.0
+    df["rec_dom"] = 0.0
+    df["rec_share"] = 0.0
+    df["rec_share_%"] = ""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for index, row in df.iterrows():
+            team = df["recent_team"][index]
+            df.loc[index, "percent_rec_tds"] = np.float64(df["receiving_tds"][index]) / team_passing_tds[team]
+            df.loc[index, "percent_rec_yards"] = np.float64(df["receiving_yards"][index]) / team_passing_yards[team]
+        for index, row in df.iterrows():
+            yards, tds = df["percent_rec_yards"][index], df["percent_rec_tds"][index]
+            df.loc[index, "rec_dom"] = (1/3)*(yards + tds + df["target_share"][index])
+            rec_share = (1/4)*(yards) + (1/2)*(tds) + (1/4)*(df["target_share"][index])
+            df.loc[index, "rec_share"] = rec_share
+            df.loc[index, "rec_share_%"] = "{:.0%}".format(rec_share)
+
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, nargs="+", default=[600, 2000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    ## 66 weightings of (yards, tds, targets) in steps of 0.1
+    steps = np.round(np.arange(0, 1.01, 0.1), 1)
+    sweep = [(a, b, round(1 - a - b, 1)) for a, b in itertools.product(steps, steps) if a + b <= 1]
+
+    print("%8s %12s %12s %16s" % ("players", "vectorized", "legacy", "weight sweep"))
+    for players in args.players:
+        totals = make_dataset(players=players)["totals"]
+
+        fast = best_of(lambda: compute_share_metrics(totals), args.repeat)
+        slow = best_of(lambda: legacy_share_metrics(totals), 1)
+
+        result = compute_share_metrics(totals)
+        expected = legacy_share_metrics(totals)
+        for col in ("percent_rec_tds", "percent_rec_yards", "rec_dom", "rec_share"):
+            np.testing.assert_array_equal(
+                result[col].replace([np.inf, -np.inf], np.nan).to_numpy(),
+                expected[col].replace([np.inf, -np.inf], np.nan).to_numpy())
+        assert (result["rec_share_%"] == expected["rec_share_%"])[result["rec_share"].notna()].all()
+
+        swept = best_of(lambda: [compute_share_metrics(totals, w) for w in sweep], 1)
+        print("%8d %11.2fms %11.1fms %11.1fms/%d"
+              % (len(totals), fast * 1e3, slow * 1e3, swept * 1e3, len(sweep)))
+
+
+if __name__ == "__main__":
+    main()
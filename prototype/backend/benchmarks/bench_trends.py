@@ -0,0 +1,68 @@
+"""Benchmark for the weekly trends.
+
+Times `trends.weekly_trends` against the same windows computed with
+pandas' `groupby().rolling()` and `groupby().ewm()` on synthetic weekly
+tables of growing size, and checks that both produce the same trends.
+
+Run from `prototype/backend`:
+
+    python -m benchmarks.bench_trends --seasons 1 5 10 20
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_consistency_grade import best_of
+from benchmarks.synthetic import make_dataset
+from trends import GAME_COLUMNS, TREND_DECIMALS, TREND_STATS, TREND_WINDOWS, trend_columns, weekly_trends
+
+
+def grouped_weekly_trends(df_weekly_stats, stats=TREND_STATS, windows=TREND_WINDOWS):
+    """The trends with pandas' grouped windows, kept as a reference."""
+
+    stats = [stat for stat in stats if stat in df_weekly_stats.columns]
+    df = df_weekly_stats.sort_values(GAME_COLUMNS, kind="stable", ignore_index=True)
+    grouped = df[stats].astype(float).groupby(df["player_id"], sort=False)
+
+    result = df[GAME_COLUMNS].copy()
+    for window in windows:
+        computed = {
+            "mean": grouped.rolling(window, min_periods=1).mean(),
+            "sd": grouped.rolling(window, min_periods=2).std(),
+            "ewma": grouped.ewm(span=window).mean(),
+        }
+        for kind, frame in computed.items():
+            frame = frame.droplevel(0).round(TREND_DECIMALS)
+            for stat in stats:
+                result["%s_%s_%d" % (stat, kind, window)] = frame[stat]
+    return result[GAME_COLUMNS + trend_columns(stats, windows)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seasons", type=int, nargs="+", default=[1, 5, 10, 20])
+    parser.add_argument("--players", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print("%8s %10s %12s %12s %9s" % ("seasons", "rows", "vectorized", "grouped", "speedup"))
+    for seasons in args.seasons:
+        weekly = make_dataset(seasons=seasons, players=args.players)["weekly"]
+
+        fast = best_of(lambda: weekly_trends(weekly), args.repeat)
+        slow = best_of(lambda: grouped_weekly_trends(weekly), 1)
+
+        ## rounding can land either side of a half, so allow one unit in the last place
+        result, expected = weekly_trends(weekly), grouped_weekly_trends(weekly)
+        pd.testing.assert_frame_equal(result[GAME_COLUMNS], expected[GAME_COLUMNS])
+        np.testing.assert_allclose(result.drop(columns=GAME_COLUMNS), expected.drop(columns=GAME_COLUMNS),
+                                   rtol=0, atol=1.01 * 10 ** -TREND_DECIMALS)
+
+        print("%8d %10d %11.1fms %11.1fms %8.0fx"
+              % (seasons, len(weekly), fast * 1e3, slow * 1e3, slow / fast))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""Benchmark suite for the data pipeline and the API endpoints.
+
+For each scale, generates a synthetic dataset (see synthetic.py), times
+every pipeline stage from the raw frames to the encoded payloads,
+exports the data to a snapshot and times each endpoint through the
+Django test client, served from that snapshot. Runs offline: no R and no
+nflverse downloads.
+
+Results are written as JSON so runs can be compared across commits.
+Run from `prototype/backend`:
+
+    python -m benchmarks.run --seasons 1 5 20 --out bench.json
+    python -m benchmarks.run --compare before.json after.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import snapshot
+from benchmarks.bench_consistency_grade import best_of
+from benchmarks.synthetic import SyntheticProvider, make_dataset
+from ConsistencyGrade import grade_consistency
+from encoded import EncodedPayload
+from player_index import PlayerIndex
+from player_search import PlayerSearch
+from ReceiverShare import compute_share_metrics
+from trends import weekly_trends
+
+
+def time_pipeline(data, repeat):
+    """Times each stage of turning the raw frames into what the API serves.
+
+    Args:
+        data (dict[str, pd.DataFrame]): Output of `make_dataset`.
+        repeat (int): Runs per stage; the fastest counts.
+
+    Returns:
+        stages (dict[str, float]): Stage -> seconds.
+
+    """
+
+    weekly, totals, roster = data["weekly"], data["totals"], data["roster"]
+    grouped = snapshot.group_player_rows(data["all_data"])
+    table = pa.Table.from_pandas(grouped, preserve_index=False)
+    index = PlayerIndex(table)
+    provider = SyntheticProvider(data)
+
+    stages = {
+        "consistency_grade": best_of(lambda: grade_consistency(weekly, totals, roster), repeat),
+        "receiver_share": best_of(lambda: compute_share_metrics(totals), repeat),
+        "weekly_trends": best_of(lambda: weekly_trends(weekly), repeat),
+        "group_player_rows": best_of(lambda: snapshot.group_player_rows(data["all_data"]), repeat),
+        "all_data_table": best_of(lambda: pa.Table.from_pandas(grouped, preserve_index=False), repeat),
+        "player_index": best_of(lambda: PlayerIndex(table), repeat),
+        "player_search": best_of(lambda: PlayerSearch(index), repeat),
+    }
+
+    start = time.perf_counter()
+    positions = provider.position_json()
+    stages["position_json"] = time.perf_counter() - start
+    stages["position_payloads"] = best_of(lambda: [EncodedPayload.from_json(payload)
+                                                   for payload in positions.values()], 1)
+    return stages
+
+
+def endpoint_urls(names, players):
+    """Returns the requests to time, by endpoint, cycled through in order."""
+
+    stars = list(names[:players])
+    return {
+        "player": ["/api/player/%s/" % name for name in stars],
+        "player_repeat": ["/api/player/%s/" % stars[0]],
+        "player_missing": ["/api/player/nobody %d/" % i for i in range(len(stars))],
+        "players_batch": ["/api/players/?names=%s" % ",".join(stars[i:i + 10])
+                          for i in range(0, len(stars), 10)],
+        "position": ["/api/position/WR/"],
+        "position_query": ["/api/position/WR/?fields=full_name,fantasy_points_ppr"
+                           "&sort=-fantasy_points_ppr&limit=25"],
+        "metrics": ["/api/metrics/"],
+        "metrics_query": ["/api/metrics/?sort=-rec_share&limit=25"],
+        "search": ["/api/search/?q=%s" % name[:3] for name in stars],
+        "trends": ["/api/trends/%s/" % name for name in stars],
+        "leaders": ["/api/leaders/fantasy_points_ppr/?pos=WR&k=25"],
+    }
+
+
+def time_endpoints(path, requests):
+    """Times the endpoints against a snapshot, in this process.
+
+    Must run in a fresh process started with `PYBALL_DATA_BACKEND=snapshot`
+    and `PYBALL_SNAPSHOT_DIR` pointing at `path`: the backend picks its
+    data source from the environment when it is first imported.
+
+    Args:
+        path (str): Snapshot directory.
+        requests (int): Requests timed per endpoint, after a first one
+            that includes any lazy loading.
+
+    Returns:
+        results (dict): `endpoints` -> name -> latency summary, and the
+            provider's `load` stage timings.
+
+    """
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+
+    import django
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+
+    django.setup()
+    setup_test_environment()
+
+    from providers import provider
+
+    client = Client(HTTP_ACCEPT_ENCODING="gzip, br")
+    names = pd.unique(snapshot.read_table(path, "all_data").column("full_name").to_numpy(zero_copy_only=False))
+
+    endpoints = {}
+    for endpoint, urls in endpoint_urls(names, requests).items():
+        start = time.perf_counter()
+        response = client.get(urls[0])
+        first = time.perf_counter() - start
+        assert response.status_code == 200, (urls[0], response.status_code)
+
+        times = np.empty(requests)
+        for i in range(requests):
+            url = urls[i % len(urls)]
+            start = time.perf_counter()
+            response = client.get(url)
+            times[i] = time.perf_counter() - start
+
+        endpoints[endpoint] = {
+            "first_ms": first * 1e3,
+            "p50_ms": np.percentile(times, 50) * 1e3,
+            "p90_ms": np.percentile(times, 90) * 1e3,
+            "p99_ms": np.percentile(times, 99) * 1e3,
+            "mean_ms": times.mean() * 1e3,
+            "bytes": len(response.content),
+        }
+    return {"endpoints": endpoints, "load": provider.timings}
+
+
+def run_scale(seasons, players, requests, repeat):
+    """Benchmarks one dataset size.
+
+    Returns:
+        result (dict): Sizes, `stages`, `load` and `endpoints`.
+
+    """
+
+    data = make_dataset(seasons=seasons, players=players)
+    result = {
+        "seasons": seasons,
+        "players": players,
+        "weekly_rows": len(data["weekly"]),
+        "all_data_rows": len(data["all_data"]),
+        "stages": time_pipeline(data, repeat),
+    }
+
+    with tempfile.TemporaryDirectory() as path:
+        start = time.perf_counter()
+        snapshot.export_snapshot(SyntheticProvider(data), path)
+        result["stages"]["export_snapshot"] = time.perf_counter() - start
+
+        ## a fresh interpreter, so the views load this snapshot
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.run", "--endpoints", path, "--requests", str(requests)],
+            check=True, stdout=subprocess.PIPE, text=True,
+            env=dict(os.environ, PYBALL_DATA_BACKEND="snapshot", PYBALL_SNAPSHOT_DIR=path),
+        ).stdout
+        result.update(json.loads(output.strip().splitlines()[-1]))
+    return result
+
+
+def metadata():
+    """Describes the code and machine the results come from."""
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], check=True, text=True,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "pyarrow": pa.__version__,
+        "machine": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def flatten(results):
+    """Maps (seasons, players, section, name) to the number to compare."""
+
+    flat = {}
+    for result in results["results"]:
+        key = result["seasons"], result["players"]
+        for section in ("stages", "load"):
+            for name, seconds in result.get(section, {}).items():
+                flat[key + (section, name)] = seconds * 1e3
+        for name, summary in result.get("endpoints", {}).items():
+            flat[key + ("endpoints", name)] = summary["p50_ms"]
+    return flat
+
+
+def compare(before, after):
+    """Prints how every timing changed between two result files."""
+
+    with open(before) as f:
+        old = flatten(json.load(f))
+    with open(after) as f:
+        new = flatten(json.load(f))
+
+    print("%7s %7s  %-32s %11s %11s %7s" % ("seasons", "players", "stage / endpoint (p50)", "before", "after", "ratio"))
+    for key in sorted(old.keys() & new.keys()):
+        seasons, players, section, name = key
+        print("%7d %7d  %-32s %9.2fms %9.2fms %6.2fx"
+              % (seasons, players, "%s:%s" % (section, name), old[key], new[key], new[key] / old[key] if old[key] else float("nan")))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seasons", type=int, nargs="+", default=[1, 5])
+    parser.add_argument("--players", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=200, help="requests timed per endpoint")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per pipeline stage")
+    parser.add_argument("--out", default="bench.json", help="results file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="compare two results files instead of running")
+    parser.add_argument("--endpoints", metavar="SNAPSHOT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.endpoints:
+        print(json.dumps(time_endpoints(args.endpoints, args.requests)))
+        return
+
+    results = {"meta": metadata(), "results": []}
+    for seasons in args.seasons:
+        result = run_scale(seasons, args.players, args.requests, args.repeat)
+        results["results"].append(result)
+
+        print("%d season(s), %d players, %d weekly rows, %d all_data rows"
+              % (seasons, args.players, result["weekly_rows"], result["all_data_rows"]))
+        for stage, seconds in result["stages"].items():
+            print("  %-28s %10.1fms" % (stage, seconds * 1e3))
+        for endpoint, summary in result["endpoints"].items():
+            print("  %-28s p50 %8.2fms   p99 %8.2fms   first %8.1fms   %9d bytes"
+                  % (endpoint, summary["p50_ms"], summary["p99_ms"], summary["first_ms"], summary["bytes"]))
+
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=4)
+    print("wrote", args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""Synthetic nflverse-shaped tables for benchmarking without R.
+
+The frames mimic the columns the backend reads from `APIData.Rdata`
+(`official_player_stats`, `official_player_stats_total`, `roster` and
+`all_data`) so the pipeline code can be timed offline at any scale.
+`SyntheticProvider` serves them in place of R, e.g. to export a
+snapshot, and `synthetic_worker` in place of an R worker process.
+"""
+
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_provider import DataProvider
+from r_provider import R_FRAMES
+
+POSITIONS = np.array(["QB", "RB", "WR", "TE", "K"])
+POSITION_WEIGHTS = np.array([0.12, 0.25, 0.38, 0.18, 0.07])
+
+## mean weekly PPR points by position, roughly matching real data
+POSITION_MEAN_POINTS = {"QB": 16.0, "RB": 10.0, "WR": 9.5, "TE": 6.5, "K": 7.5}
+
+TEAMS = np.array([
+    "ARI", "ATL", "BAL", "BUF", "CAR", "CHI", "CIN", "CLE", "DAL", "DEN",
+    "DET", "GB", "HOU", "IND", "JAX", "KC", "LA", "LAC", "LV", "MIA",
+    "MIN", "NE", "NO", "NYG", "NYJ", "PHI", "PIT", "SEA", "SF", "TB",
+    "TEN", "WAS",
+])
+
+WEEKS_PER_SEASON = 17
+FIRST_SEASON = 2022
+
+
+def make_players(n_players, seed=0):
+    """Creates the player pool shared by every synthetic table.
+
+    Args:
+        n_players (int): Number of players.
+        seed (int): Random seed.
+
+    Returns:
+        df (pd.DataFrame): One row per player with id, names, position and team.
+
+    """
+
+    rng = np.random.default_rng(seed)
+    ids = np.array(["00-%07d" % i for i in range(n_players)])
+    first = np.array(["%s%d" % (chr(65 + i % 26), i) for i in range(n_players)], dtype="U32")
+    last = np.array(["Player%d" % i for i in range(n_players)], dtype="U32")
+
+    ## a handful of shared names, like the two Mike Williamses
+    dupes = rng.choice(n_players, size=max(2, n_players // 200), replace=False)
+    first[dupes] = "Mike"
+    last[dupes] = "Williams"
+
+    return pd.DataFrame({
+        "gsis_id": ids,
+        "first_name": first,
+        "last_name": last,
+        "full_name": np.char.add(np.char.add(first, " "), last),
+        "player_name": np.char.add(np.char.add(first.astype("U1"), "."), last),
+        "position": rng.choice(POSITIONS, size=n_players, p=POSITION_WEIGHTS),
+        "team": rng.choice(TEAMS, size=n_players),
+    })
+
+
+def make_weekly_stats(players, seasons=1, seed=0, first_season=FIRST_SEASON):
+    """Creates a table shaped like `official_player_stats`.
+
+    Every player appears in a random subset of the weeks of each season,
+    so some players only have a single game.
+
+    Args:
+        players (pd.DataFrame): Output of `make_players`.
+        seasons (int): Number of seasons to generate.
+        seed (int): Random seed.
+        first_season (int): Year of the first season.
+
+    Returns:
+        df (pd.DataFrame): One row per player-week.
+
+    """
+
+    rng = np.random.default_rng(seed + 1)
+    n_players = len(players)
+    n_slots = n_players * seasons * WEEKS_PER_SEASON
+
+    player_idx = np.repeat(np.arange(n_players), seasons * WEEKS_PER_SEASON)
+    season = np.tile(np.repeat(np.arange(seasons) + first_season, WEEKS_PER_SEASON), n_players)
+    week = np.tile(np.arange(1, WEEKS_PER_SEASON + 1), n_players * seasons)
+
+    ## each player has a per-season availability, so game counts vary
+    availability = rng.uniform(0.05, 1.0, size=n_players * seasons)
+    played = rng.uniform(size=n_slots) < np.repeat(availability, WEEKS_PER_SEASON)
+
+    player_idx, season, week = player_idx[played], season[played], week[played]
+    n = len(player_idx)
+    position = players["position"].to_numpy()[player_idx]
+    mean_points = pd.Series(position).map(POSITION_MEAN_POINTS).to_numpy()
+
+    is_qb = position == "QB"
+    is_rusher = np.isin(position, ["QB", "RB"])
+    is_receiver = np.isin(position, ["RB", "WR", "TE"])
+
+    attempts = np.where(is_qb, rng.poisson(33, n), 0)
+    completions = np.floor(attempts * rng.uniform(0.55, 0.72, n)).astype(int)
+    carries = np.where(is_rusher, rng.poisson(np.where(is_qb, 4, 12)), 0)
+    targets = np.where(is_receiver, rng.poisson(np.where(position == "RB", 3, 6)), 0)
+    receptions = np.floor(targets * rng.uniform(0.5, 0.8, n)).astype(int)
+
+    df = pd.DataFrame({
+        "player_id": players["gsis_id"].to_numpy()[player_idx],
+        "player_name": players["player_name"].to_numpy()[player_idx],
+        "recent_team": players["team"].to_numpy()[player_idx],
+        "season": season,
+        "week": week,
+        "season_type": "REG",
+        "completions": completions,
+        "attempts": attempts,
+        "passing_yards": np.round(completions * rng.uniform(8, 14, n)),
+        "passing_tds": np.where(is_qb, rng.poisson(1.6, n), 0),
+        "interceptions": np.where(is_qb, rng.poisson(0.8, n), 0),
+        "carries": carries,
+        "rushing_yards": np.round(carries * rng.uniform(2.5, 5.5, n)),
+        "rushing_tds": np.where(is_rusher, rng.poisson(0.3, n), 0),
+        "receptions": receptions,
+        "targets": targets,
+        "receiving_yards": np.round(receptions * rng.uniform(7, 14, n)),
+        "receiving_tds": np.where(is_receiver, rng.poisson(0.3, n), 0),
+        "target_share": np.where(is_receiver, targets / 35.0, np.nan),
+        "fantasy_points": np.round(rng.gamma(2.0, mean_points / 2.0), 2),
+    })
+    df["fantasy_points_ppr"] = df["fantasy_points"] + df["receptions"]
+
+    return df.sort_values(["season", "week"], kind="stable", ignore_index=True)
+
+
+def make_season_totals(df_weekly_stats):
+    """Creates a table shaped like `official_player_stats_total`.
+
+    Args:
+        df_weekly_stats (pd.DataFrame): Output of `make_weekly_stats`.
+
+    Returns:
+        df (pd.DataFrame): One row per player with summed stats.
+
+    """
+
+    summed = [c for c in df_weekly_stats.columns
+              if c not in ("player_id", "player_name", "recent_team", "season",
+                           "week", "season_type", "target_share")]
+    grouped = df_weekly_stats.groupby("player_id", sort=False)
+    df = grouped[summed].sum()
+    df.insert(0, "player_name", grouped["player_name"].last())
+    df.insert(1, "recent_team", grouped["recent_team"].last())
+    df.insert(2, "games", grouped.size())
+    df["target_share"] = grouped["target_share"].mean()
+
+    return df.reset_index()
+
+
+def make_roster(players, coverage=0.95, seed=0):
+    """Creates a table shaped like `roster`.
+
+    Args:
+        players (pd.DataFrame): Output of `make_players`.
+        coverage (float): Fraction of players present on the roster. The
+            rest only show up in the stats, like released players.
+        seed (int): Random seed.
+
+    Returns:
+        df (pd.DataFrame): One row per rostered player.
+
+    """
+
+    rng = np.random.default_rng(seed + 2)
+    on_roster = rng.uniform(size=len(players)) < coverage
+    df = players.loc[on_roster, ["gsis_id", "full_name", "first_name", "last_name",
+                                 "position", "team"]].copy()
+    df["depth_chart_position"] = df["position"]
+    df["status"] = "ACT"
+
+    return df.reset_index(drop=True)
+
+
+def make_all_data(weekly, roster, seed=0):
+    """Creates a table shaped like `all_data`.
+
+    Like ReloadData.R, the roster is full-joined to the weekly stats, so
+    rostered players have one row per game and the per-player columns
+    repeat on every row.
+
+    Args:
+        weekly (pd.DataFrame): Output of `make_weekly_stats`.
+        roster (pd.DataFrame): Output of `make_roster`.
+        seed (int): Random seed.
+
+    Returns:
+        df (pd.DataFrame): One row per player-week, with `name` added.
+
+    """
+
+    rng = np.random.default_rng(seed + 3)
+    bio = roster.assign(
+        height=rng.integers(68, 80, len(roster)),
+        weight=rng.integers(175, 330, len(roster)),
+        college=rng.choice(["Alabama", "Ohio State", "LSU", "Georgia", "USC"], len(roster)),
+        years_exp=rng.integers(0, 15, len(roster)),
+        draft_number=np.where(rng.uniform(size=len(roster)) < 0.8,
+                              rng.integers(1, 260, len(roster)), np.nan),
+    )
+    df = bio.merge(weekly.drop(columns=["player_name"]), left_on="gsis_id",
+                   right_on="player_id", how="inner").drop(columns=["player_id"])
+    df["name"] = df["full_name"].str.lower().str.replace(".", "", regex=False)
+
+    return df
+
+
+def make_dataset(seasons=1, players=600, seed=0):
+    """Creates a full set of synthetic tables.
+
+    Args:
+        seasons (int): Number of seasons of weekly stats.
+        players (int): Number of players.
+        seed (int): Random seed.
+
+    Returns:
+        tables (dict[str, pd.DataFrame]): `weekly`, `totals`, `roster`
+            and `all_data`.
+
+    """
+
+    pool = make_players(players, seed=seed)
+    weekly = make_weekly_stats(pool, seasons=seasons, seed=seed)
+    roster = make_roster(pool, seed=seed)
+
+    return {
+        "weekly": weekly,
+        "totals": make_season_totals(weekly),
+        "roster": roster,
+        "all_data": make_all_data(weekly, roster, seed=seed),
+    }
+
+
+class SyntheticProvider(DataProvider):
+    """Serves a synthetic dataset as if R had loaded it.
+
+    Stands in for the R-backed provider when exporting a snapshot offline.
+    Position JSON is built like `update_position_players` in ReloadData.R:
+    every rostered player at the position, by full name.
+
+    Args:
+        dataset (dict[str, pd.DataFrame]): Output of `make_dataset`.
+        precompress (bool): Keep compressed copies of each encoded payload.
+
+    """
+
+    ## R_FRAMES name -> synthetic table
+    FRAMES = {
+        "player_stats": "totals",
+        "team_data": "totals",
+        "player_stats_kicker": "totals",
+        "roster": "roster",
+        "official_player_stats": "totals",
+        "weekly_stats": "weekly",
+        "all_data": "all_data",
+    }
+
+    def __init__(self, dataset, precompress=True):
+        super().__init__(precompress=precompress)
+        self.dataset = dataset
+
+    def frame(self, name):
+        return self.dataset[self.FRAMES[name]]
+
+    def version(self):
+        return "synthetic", 0.0
+
+    def get_player_data(self, name):
+        return json.dumps(self.player_data(name))
+
+    def get_position_players(self, pos):
+        roster = self.frame("roster")
+        names = roster.loc[(roster["position"] == pos) | (roster["depth_chart_position"] == pos), "full_name"]
+        if names.empty:
+            return "Enter a valid position name"
+        index = self.player_index()
+        return json.dumps({name: index.lookup(name) for name in names})
+
+
+def synthetic_worker(conn, script):
+    """Stands in for an R worker process (see `r_pool._worker_main`).
+
+    Answers the same messages from a synthetic dataset, so an
+    `RDataProvider` can run without R: pass it as the pool's `target`.
+
+    Args:
+        conn (multiprocessing.connection.Connection): Pipe to the pool.
+        script (str): JSON file of `make_dataset` arguments, plus an
+            optional `delay` in seconds added to every function call.
+            Read once on start, like the R script.
+
+    """
+
+    with open(script) as f:
+        options = json.load(f)
+    delay = options.pop("delay", 0)
+    provider = SyntheticProvider(make_dataset(**options))
+    frames = {r_name: name for name, r_name in R_FRAMES.items()}
+
+    conn.send(("ready", None))
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        kind, name, args = message
+        try:
+            if kind == "frame":
+                result = provider.frame(frames[name])
+            else:
+                time.sleep(delay)
+                result = getattr(provider, name)(*args)
+            conn.send(("ok", result))
+        except Exception as e:
+            conn.send(("error", repr(e)))
@@ -0,0 +1,70 @@
+"""Renders player comparison charts with matplotlib's headless Agg backend.
+
+Kept apart from grapher.py, which collects the data: rendering runs in
+worker processes (see `fantasyPlayerPortal.offload.renders`), which only
+need matplotlib and the few numbers being drawn, not the loaded data.
+Figures are created directly rather than through pyplot, so no global
+figure state is shared between renders.
+"""
+
+import io
+
+import matplotlib
+
+matplotlib.use("Agg")
+## SVG element ids from a fixed salt rather than at random, so the same
+## chart always has the same bytes
+matplotlib.rcParams["svg.hashsalt"] = "pyball"
+
+from matplotlib.figure import Figure
+
+## image format -> Content-Type
+FORMATS = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+## most game labels along the x axis
+MAX_TICKS = 12
+
+
+def render_comparison(players, stats, format="png"):
+    """Draws each stat game by game, one panel per stat, one line per player.
+
+    Args:
+        players (list[tuple[str, list[tuple[int, int]], dict[str, list[float]]]]):
+            (name, (season, week) of each game, stat -> value in each
+            game) per player, from `grapher.comparison_data`.
+        stats (list[str]): Stats to draw, top to bottom.
+        format (str): A key of `FORMATS`.
+
+    Returns:
+        image (bytes): The rendered chart.
+
+    """
+
+    games = sorted({game for _, player_games, _ in players for game in player_games})
+    position = {game: i for i, game in enumerate(games)}
+    seasons = {season for season, _ in games}
+
+    figure = Figure(figsize=(8, 1.2 + 2.4 * len(stats)), dpi=100)
+    axes = figure.subplots(len(stats), 1, sharex=True, squeeze=False)[:, 0]
+    for axis, stat in zip(axes, stats):
+        for name, player_games, values in players:
+            axis.plot([position[game] for game in player_games], values[stat],
+                      marker="o", markersize=3, linewidth=1.5, label=name)
+        axis.set_ylabel(stat.replace("_", " "))
+        axis.grid(True, alpha=0.3)
+    axes[0].legend(loc="upper left", fontsize="small")
+
+    step = max(1, -(-len(games) // MAX_TICKS))
+    ticks = list(range(0, len(games), step))
+    axes[-1].set_xticks(ticks)
+    axes[-1].set_xticklabels(["Wk %d" % games[i][1] if len(seasons) == 1 else "%d Wk %d" % games[i]
+                              for i in ticks], rotation=30, ha="right", fontsize="small")
+    figure.tight_layout()
+
+    buffer = io.BytesIO()
+    ## without a timestamp, for the same reason
+    figure.savefig(buffer, format=format, metadata={"Date": None} if format == "svg" else None)
+    return buffer.getvalue()
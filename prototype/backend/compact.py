@@ -0,0 +1,143 @@
+"""Compact in-memory representation of `all_data`.
+
+`all_data` joins the roster, stats, team, combine, injury, next-gen and
+snap count tables, so it is very wide. After `pandas2ri` every string is
+a Python object and every number a float64. `compact_table` stores the
+same values in far less memory:
+
+- repetitive strings (teams, positions, statuses) are dictionary encoded
+- whole numbers stored as floats become the smallest integer type that
+  holds them, and floats that survive float32 exactly become float32
+- columns with no values at all become Arrow's null type, which takes
+  no memory; field metadata records how jsonlite printed their NAs
+
+Payloads built from the compacted table are identical to those built
+from the original one.
+"""
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+## players are looked up by these, so they are kept as plain strings
+KEY_COLUMNS = {"gsis_id", "name", "full_name"}
+
+## strings are dictionary encoded if at most this share of them is distinct
+DICTIONARY_RATIO = 0.5
+
+## field metadata key: what a missing value of an all-NA column prints as
+MISSING_KEY = b"pyball.missing"
+
+_INTEGER_TYPES = [pa.int8(), pa.int16(), pa.int32(), pa.int64()]
+
+
+def _smallest_integer(low, high):
+    for kind in _INTEGER_TYPES:
+        info = np.iinfo(kind.to_pandas_dtype())
+        if info.min <= low and high <= info.max:
+            return kind
+    return None
+
+
+def compact_column(column, field, dictionary_ratio=DICTIONARY_RATIO):
+    """Picks the most compact representation of one column.
+
+    Args:
+        column (pa.ChunkedArray): The column's values.
+        field (pa.Field): Its field.
+        dictionary_ratio (float): See `DICTIONARY_RATIO`.
+
+    Returns:
+        column (pa.ChunkedArray | pa.Array): The same values, maybe cast.
+        field (pa.Field): The matching field.
+
+    """
+
+    kind = field.type
+    numeric = pa.types.is_integer(kind) or pa.types.is_floating(kind)
+    if len(column) and pc.all(pc.is_null(column, nan_is_null=True)).as_py():
+        ## jsonlite prints missing numbers as "NA" and other missing values as null
+        metadata = {MISSING_KEY: b"NA" if numeric else b"null"}
+        return pa.nulls(len(column)), pa.field(field.name, pa.null(), metadata=metadata)
+
+    if pa.types.is_floating(kind):
+        values = column.to_numpy()
+        present = values[~np.isnan(values)]
+        if len(present) and np.array_equal(present, np.round(present)):
+            integer = _smallest_integer(present.min(), present.max())
+            if integer is not None:
+                ## NaN is missing in R, so it becomes null
+                column = pc.cast(pc.if_else(pc.is_nan(column), None, column), integer)
+                return column, pa.field(field.name, integer)
+        if kind == pa.float64() and np.array_equal(present.astype(np.float32).astype(np.float64), present):
+            return pc.cast(column, pa.float32()), pa.field(field.name, pa.float32())
+        return column, field
+
+    if pa.types.is_integer(kind) and len(column) - column.null_count:
+        integer = _smallest_integer(pc.min(column).as_py(), pc.max(column).as_py())
+        if integer is not None and integer.bit_width < kind.bit_width:
+            return pc.cast(column, integer), pa.field(field.name, integer)
+        return column, field
+
+    if (pa.types.is_string(kind) or pa.types.is_large_string(kind)) and field.name not in KEY_COLUMNS:
+        distinct = pc.count_distinct(column).as_py()
+        if distinct <= dictionary_ratio * len(column):
+            ## with the narrowest indices that can address the dictionary
+            kind = pa.dictionary(_smallest_integer(0, distinct), kind)
+            return pc.dictionary_encode(column).cast(kind), pa.field(field.name, kind)
+
+    return column, pa.field(field.name, kind)
+
+
+def compact_table(table, dictionary_ratio=DICTIONARY_RATIO):
+    """Stores a table's values in the least memory.
+
+    Args:
+        table (pa.Table): Table to compact.
+        dictionary_ratio (float): See `DICTIONARY_RATIO`.
+
+    Returns:
+        table (pa.Table): Same rows, columns and values, compactly typed.
+
+    """
+
+    columns, fields = [], []
+    for column, field in zip(table.columns, table.schema):
+        column, field = compact_column(column, field, dictionary_ratio)
+        columns.append(column)
+        fields.append(field)
+    ## without the pandas metadata, which describes the old types
+    return pa.Table.from_arrays(columns, schema=pa.schema(fields))
+
+
+def concat_compact(tables):
+    """Concatenates tables that may have been compacted differently.
+
+    Dictionaries are decoded and types widened as needed (a column that
+    was all NA in one table takes the other's type), then the result is
+    compacted again.
+
+    Args:
+        tables (list[pa.Table]): Tables with the same columns.
+
+    Returns:
+        table (pa.Table): Their rows, compacted.
+
+    """
+
+    plain = []
+    for table in tables:
+        fields = [pa.field(field.name, field.type.value_type, metadata=field.metadata)
+                  if pa.types.is_dictionary(field.type) else field for field in table.schema]
+        plain.append(table.cast(pa.schema(fields)))
+    return compact_table(pa.concat_tables(plain, promote_options="permissive"))
+
+
+def missing_value(field):
+    """Returns what a missing value in a column prints as in JSON.
+
+    Only decided by the field for all-NA columns compacted to the null
+    type; see `snapshot.json_values` for the rest.
+    """
+
+    return "NA" if (field.metadata or {}).get(MISSING_KEY) == b"NA" else None
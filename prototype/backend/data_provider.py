@@ -0,0 +1,440 @@
+"""What every data backend serves, built once from its frames.
+
+A provider hands out the tables the player data is kept in as pandas
+frames, and builds everything the API serves from them on first use:
+the compacted `all_data` table, the player index and search, the metric
+tables, the trends and the encoded position payloads. Player lookups go
+through a `PlayerIndex` built from `all_data`. Each load stage is timed;
+see `DataProvider.timings`.
+
+`DataProvider` leaves where the frames come from to its backends:
+`RDataProvider` (r_provider.py) loads `APIData.Rdata` through R, and
+`SnapshotProvider` (snapshot_provider.py) maps the Arrow snapshot written
+by snapshot.py. providers.py picks one and keeps the active one.
+
+Position JSON is encoded to compact (and compressed) bytes once per load;
+see encoded.py. Snapshots store it encoded, so that backend reads it as is. `version()` identifies the loaded data for HTTP caching.
+A provider never changes its data once loaded.
+"""
+
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import pyarrow as pa
+
+import snapshot
+import timing
+from compact import compact_table
+import encoded
+from encoded import EncodedPayload
+from leaders import Leaderboards
+from player_index import PlayerIndex, lookup_across
+from player_search import PlayerSearch
+from query import records_frame
+from ConsistencyGrade import grade_consistency
+from ReceiverShare import compute_share_metrics
+from trends import PlayerTrends, weekly_trends
+
+logger = logging.getLogger(__name__)
+
+
+class DataProvider:
+    """Hands out the player data and the metrics derived from it.
+
+    Subclasses load the frames; see `frame`, `version` and
+    `get_position_players`.
+
+    Args:
+        precompress (bool): Keep compressed copies of each encoded payload.
+
+    """
+
+    def __init__(self, precompress=True):
+        self.precompress = precompress
+        self._lock = threading.RLock()
+        self._timings = {}
+        self._version = None
+        self._frames = {}
+        self._derived_tables = {}
+
+    @contextmanager
+    def _stage(self, name):
+        start = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - start
+        self._timings[name] = elapsed
+        ## also counts toward the request that triggered the load, if any
+        timing.record(name, elapsed)
+        logger.info("%s took %.3fs", name, elapsed)
+
+    @property
+    def timings(self):
+        """dict[str, float]: Seconds spent in each load stage so far."""
+        return dict(self._timings)
+
+    def version(self):
+        """Identifies the loaded data, for HTTP caching.
+
+        Loads the data if it hasn't been yet, so the version always
+        describes what is being served.
+
+        Returns:
+            version (tuple[str, float]): Opaque version token, and the time
+                the data was last modified as a Unix timestamp.
+
+        """
+
+        raise NotImplementedError
+
+    def loaded(self):
+        """Returns whether the data has been loaded, without loading it."""
+        return self._version is not None
+
+    def source_version(self):
+        """Returns the version the data would have if it were loaded now.
+
+        Cheap enough to poll: never loads the data.
+
+        Returns:
+            version (str | None): Version token, or None if there is
+                nothing to go by.
+
+        """
+
+        return None
+
+    def warm(self):
+        """Loads the data and builds everything the API serves from it.
+
+        Run on a provider before it starts serving, so no request waits
+        for a derived table or payload to be built.
+        """
+
+        with self._stage("warm"):
+            self.version()
+            self.player_index()
+            self.player_search()
+            self.metrics_payloads()
+            self._player_trends()
+            for pos in self.position_payloads():
+                self.position_frame(pos)
+            self.leaderboards()
+
+    def close(self):
+        """Releases what the provider holds outside Python, e.g. R workers."""
+
+    def frame(self, name):
+        """Returns one of the source tables as a pandas DataFrame.
+
+        Args:
+            name (str): A key of `r_provider.R_FRAMES`.
+
+        Returns:
+            df (pd.DataFrame): The frame. Treat it as read-only, it is
+                shared by every caller.
+
+        """
+
+        raise NotImplementedError
+
+    def _derived(self, name, compute):
+        with self._lock:
+            if name not in self._derived_tables:
+                with self._stage(name):
+                    self._derived_tables[name] = compute()
+            return self._derived_tables[name]
+
+    def ready(self, name):
+        """Returns a derived table if it has been built already, else None.
+
+        Never builds it or waits for the lock, so it is safe to call on
+        an event loop.
+        """
+
+        return self._derived_tables.get(name)
+
+    def all_data_table(self):
+        """Returns `all_data` as a compacted Arrow table, grouped by player.
+
+        See compact.py. The converted pandas frame is let go once the
+        table is built; `frame("all_data")` converts it again if needed.
+        """
+
+        def build():
+            table = compact_table(pa.Table.from_pandas(
+                snapshot.group_player_rows(self.frame("all_data")), preserve_index=False))
+            self._frames.pop("all_data", None)
+            return table
+
+        return self._derived("all_data_table", build)
+
+    def player_index(self):
+        """Returns the `PlayerIndex` over `all_data`, building it on first use."""
+        return self._derived("player_index", lambda: PlayerIndex(self.all_data_table()))
+
+    def player_search(self):
+        """Returns the `PlayerSearch` for autocomplete, building it on first use."""
+        return self._derived("player_search", lambda: PlayerSearch(self.player_index()))
+
+    def _season_tables(self):
+        return self._derived("all_data_seasons", lambda: snapshot.split_partitions(self.all_data_table()))
+
+    def seasons(self):
+        """Returns the seasons `all_data` has rows for, earliest first."""
+        return sorted(self._season_tables())
+
+    def season_table(self, season):
+        """Returns one season's rows of `all_data`, grouped by player."""
+        return self._season_tables()[season]
+
+    def season_index(self, season):
+        """Returns the `PlayerIndex` over one season's rows, building it on first use."""
+        return self._derived("player_index:%d" % season, lambda: PlayerIndex(self.season_table(season)))
+
+    def _season_indexes(self, seasons):
+        return [self.season_index(season) for season in self.seasons() if season in seasons]
+
+    def consistency_grades(self):
+        """Returns the season totals with `pos` and `consistency_grade`."""
+        return self._derived("consistency_grade", lambda: grade_consistency(
+            self.frame("weekly_stats"),
+            self.frame("official_player_stats"),
+            self.frame("roster"),
+        ))
+
+    def receiver_share(self):
+        """Returns the season totals with the share metrics, best `rec_share` first."""
+        return self._derived("receiver_share", lambda: compute_share_metrics(
+            self.frame("official_player_stats"),
+        ).sort_values(by="rec_share", ascending=False))
+
+    def advanced_metrics(self):
+        """Returns the receiver share metrics and consistency grade of each player.
+
+        Returns:
+            df (pd.DataFrame): `rec_dom`, `rec_share`, `rec_share_%` and
+                `consistency_grade`, indexed by `player_id`, best
+                `rec_share` first.
+
+        """
+
+        def join():
+            df = self.receiver_share()[["player_id", "rec_dom", "rec_share", "rec_share_%"]]
+            grades = self.consistency_grades()[["player_id", "consistency_grade"]]
+            return df.set_index("player_id").join(grades.set_index("player_id"), on="player_id", lsuffix="", rsuffix="")
+
+        return self._derived("advanced_metrics", join)
+
+    def weekly_trends(self):
+        """Returns every player's rolling trends after each game; see trends.py.
+
+        Returns:
+            table (pa.Table): `trends.weekly_trends` of the weekly stats.
+
+        """
+
+        return self._derived("weekly_trends", lambda: pa.Table.from_pandas(
+            weekly_trends(self.frame("weekly_stats")), preserve_index=False))
+
+    def _player_trends(self):
+        return self._derived("player_trends", lambda: PlayerTrends(self.weekly_trends()))
+
+    def player_trends(self, name, seasons=None):
+        """Returns a player's rolling trends, game by game.
+
+        Args:
+            name (str): Player's name. Like `player_data`, a shared name
+                resolves to whoever appears first.
+            seasons (iterable[int]): Only these seasons' games, if given.
+
+        Returns:
+            trends (dict[str, list] | list): Column of `weekly_trends` ->
+                one value per game, or an empty list if nobody has that name.
+
+        """
+
+        index = self.player_index()
+        trends = self._player_trends()
+        with timing.stage("lookup"):
+            players = index.players(name)
+            if not players:
+                return []
+            return trends.player(index.gsis_ids[players[0]], seasons)
+
+    def metrics_payloads(self):
+        """Returns `advanced_metrics` encoded once, in each format.
+
+        Returns:
+            payloads (dict[str, EncodedPayload]): Format -> payload, for
+                each of `encoded.FRAME_FORMATS`: "records" (player id ->
+                metrics) and "columns" (one array per metric).
+
+        """
+
+        return self._derived("metrics_payloads", lambda: {
+            format: encoded.encode_frame(self.advanced_metrics(), format, self.precompress)
+            for format in encoded.FRAME_FORMATS
+        })
+
+    def get_player_data(self, name):
+        """Returns a player's data as JSON, like the R `get_player_data`.
+
+        Args:
+            name (str): Player's name.
+
+        Returns:
+            json (str): Player's data as JSON.
+
+        """
+
+        return json.dumps(self.player_data(name))
+
+    def get_position_players(self, pos):
+        """Returns every player at a position as JSON, like the R `get_position_players`.
+
+        Args:
+            pos (str): Position abbreviation.
+
+        Returns:
+            json (str): Data on every player at the position as JSON, or
+                an error message for positions without data.
+
+        """
+
+        raise NotImplementedError
+
+    def player_data(self, name, seasons=None):
+        """Returns a player's data, or an empty list if there is none.
+
+        Args:
+            name (str): Player's name.
+            seasons (iterable[int]): Only these seasons' rows, if given.
+                Only those seasons are loaded and indexed.
+
+        Returns:
+            data (dict | list): The player's data in the `get_player_data`
+                shape, looked up in the player index.
+
+        """
+
+        return self.players_data([name], seasons)[name]
+
+    def players_data(self, names, seasons=None):
+        """Looks several players up at once.
+
+        Args:
+            names (list[str]): Players' names.
+            seasons (iterable[int]): Only these seasons' rows, if given.
+
+        Returns:
+            data (dict[str, dict | list]): Each requested name -> what
+                `player_data` returns for it.
+
+        """
+
+        if seasons is None:
+            index = self.player_index()
+            with timing.stage("lookup"):
+                return {name: index.lookup(name) for name in names}
+
+        indexes = self._season_indexes(set(seasons))
+        with timing.stage("lookup"):
+            return {name: lookup_across(indexes, name) for name in names}
+
+    def position_json(self):
+        """Returns the JSON precomputed for each position.
+
+        Returns:
+            json (dict[str, str]): Position abbreviation -> JSON, for every
+                position in `snapshot.POSITIONS` that there is data for.
+
+        """
+
+        return self._valid_positions([self.get_position_players(pos) for pos in snapshot.POSITIONS])
+
+    @staticmethod
+    def _valid_positions(payloads):
+        ## payloads are in the order of snapshot.POSITIONS
+        positions = {}
+        for pos, payload in zip(snapshot.POSITIONS, payloads):
+            try:
+                json.loads(payload)
+            except ValueError:
+                ## R returns a plain error message for positions it has no data for
+                continue
+            positions[pos] = payload
+        return positions
+
+    def position_payloads(self):
+        """Returns every position's JSON as compact bytes, encoded once.
+
+        Returns:
+            payloads (dict[str, EncodedPayload]): Position abbreviation ->
+                payload.
+
+        """
+
+        return self._derived("position_payloads", lambda: {
+            pos: EncodedPayload.from_json(payload, self.precompress)
+            for pos, payload in self.position_json().items()
+        })
+
+    def position_payload(self, pos):
+        """Returns one position's encoded JSON, or None for unknown positions."""
+        return self.position_payloads().get(pos.upper())
+
+    def position_records(self, pos):
+        """Returns one position's parsed JSON, parsed once.
+
+        Returns:
+            records (dict | None): Player -> their data, or None for
+                unknown positions.
+
+        """
+
+        pos = pos.upper()
+        payload = self.position_payload(pos)
+        if payload is None:
+            return None
+        return self._derived("position_records:" + pos, lambda: encoded.loads(payload.body))
+
+    def position_frame(self, pos):
+        """Returns one position's players as a frame to query, built once.
+
+        Returns:
+            frame (pd.DataFrame | None): See `query.records_frame`, or None
+                for unknown positions.
+
+        """
+
+        pos = pos.upper()
+        records = self.position_records(pos)
+        if records is None:
+            return None
+        return self._derived("position_frame:" + pos, lambda: records_frame(records))
+
+    def leaderboards(self):
+        """Returns the players ranked on each of `leaders.LEADER_STATS`, ranked once."""
+        return self._derived("leaderboards", lambda: Leaderboards(
+            [(pos, self.position_frame(pos)) for pos in self.position_payloads()],
+            self.advanced_metrics(),
+        ))
+
+    def position_players(self, pos):
+        """Returns the data on every player at a position.
+
+        Args:
+            pos (str): Position abbreviation.
+
+        Returns:
+            data (dict | list): Parsed position JSON, or an empty list for
+                unknown positions.
+
+        """
+
+        payload = self.position_payload(pos)
+        return [] if payload is None else json.loads(payload.body)
+
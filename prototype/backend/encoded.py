@@ -0,0 +1,152 @@
+"""Response bodies encoded once and served many times.
+
+Payloads that only change when the data does (the position JSON, for
+one) are compacted to bytes, and optionally gzipped and brotli
+compressed, when the data is loaded. Views write those bytes straight
+into the response instead of parsing and re-serializing them on every
+request.
+
+brotli is optional; without it only gzip is offered. orjson, if
+installed, encodes several times faster than the json module.
+"""
+
+import gzip
+import json
+
+import numpy as np
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+## encodings we can produce, most preferred first
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+## levels for precompressed payloads; they are built once, so favor size
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+
+def dumps(obj):
+    """Encodes an object as compact JSON bytes, with orjson if it's installed."""
+
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def loads(body):
+    """Decodes JSON text or bytes, with orjson if it's installed."""
+
+    return orjson.loads(body) if orjson is not None else json.loads(body)
+
+
+def compress(body, encoding, precompressed=False):
+    """Compresses a body for a `Content-Encoding`.
+
+    Args:
+        body (bytes): Data to compress.
+        encoding (str): "gzip" or "br".
+        precompressed (bool): Spend more time for a smaller result, for
+            bodies that are compressed once and served many times.
+
+    Returns:
+        body (bytes): The compressed data.
+
+    """
+
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY if precompressed else 4)
+    return gzip.compress(body, GZIP_LEVEL if precompressed else 6, mtime=0)
+
+
+class EncodedPayload:
+    """A JSON body kept as compact bytes, plus its compressed forms.
+
+    Args:
+        body (bytes): Compact JSON.
+        precompress (bool): Also keep gzipped and brotli copies of the body.
+
+    """
+
+    __slots__ = ("body", "compressed")
+
+    def __init__(self, body, precompress=True):
+        self.body = body
+        ## Content-Encoding -> compressed body
+        self.compressed = {}
+        if precompress:
+            self.compressed["gzip"] = compress(body, "gzip", precompressed=True)
+            if brotli is not None:
+                self.compressed["br"] = compress(body, "br", precompressed=True)
+
+    @classmethod
+    def from_object(cls, obj, precompress=True):
+        """Encodes a JSON-serializable object."""
+
+        return cls(dumps(obj), precompress)
+
+    @classmethod
+    def from_json(cls, text, precompress=True):
+        """Re-encodes a JSON string, dropping its whitespace."""
+
+        return cls.from_object(loads(text), precompress)
+
+    @classmethod
+    def from_encoded(cls, body, compressed=None):
+        """Wraps a body, and compressed copies of it, that were encoded earlier.
+
+        Args:
+            body (bytes): Compact JSON.
+            compressed (dict[str, bytes]): `Content-Encoding` -> the body
+                compressed with it.
+
+        """
+
+        payload = cls(body, precompress=False)
+        payload.compressed.update(compressed or {})
+        return payload
+
+
+def _column_values(column, decimals):
+    values = column.to_numpy()
+    if values.dtype.kind == "f":
+        ## like DataFrame.to_json: rounded, with NaN as null
+        values = np.round(values, decimals)
+        return [None if v != v else v for v in values.tolist()]
+    return [None if v is None or v != v else v for v in values.tolist()]
+
+
+## formats a table can be sent in; the first is the default
+FRAME_FORMATS = ("records", "columns")
+
+
+def encode_frame(df, format="records", precompress=True, decimals=10):
+    """Encodes a DataFrame for a list endpoint.
+
+    Args:
+        df (pd.DataFrame): Table to encode, indexed by the record key.
+        format (str): "records", the shape of `df.to_json(orient="index")`
+            (key -> column -> value), or "columns", one array per column
+            with the keys under the index's name. Much smaller for wide
+            tables.
+        precompress (bool): Also keep compressed copies.
+        decimals (int): Decimal places kept of float columns.
+
+    Returns:
+        payload (EncodedPayload): The encoded table.
+
+    """
+
+    keys = df.index.tolist()
+    columns = {name: _column_values(df[name], decimals) for name in df.columns}
+    if format == "columns":
+        return EncodedPayload.from_object({df.index.name or "index": keys, **columns}, precompress)
+    records = {key: dict(zip(columns, row)) for key, row in zip(keys, zip(*columns.values()))}
+    return EncodedPayload.from_object(records, precompress)
@@ -0,0 +1,130 @@
+"""Player rows as CSV or NDJSON, produced a chunk at a time.
+
+The spreadsheet fetches each position's JSON and `/api/metrics/` and
+joins them in the browser. `/api/export/` sends the same players as flat
+rows instead, one per player with their totals and per-game averages
+(see `query.records_frame`), optionally joined with their metrics. Rows are
+formatted a chunk at a time from the frames already in memory, so the
+response streams out as it is produced and nothing the size of the
+whole export is ever built.
+"""
+
+import csv
+import io
+import math
+
+import numpy as np
+
+import encoded
+from query import LATEST_COLUMNS, QueryError
+
+## format -> Content-Type
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+## columns of `DataProvider.advanced_metrics` joined on by gsis_id
+METRIC_COLUMNS = ["rec_share", "rec_dom", "consistency_grade"]
+
+## columns that describe one game rather than the player, left out of the rows
+GAME_COLUMNS = LATEST_COLUMNS
+
+## column holding the position group a row was exported under; the
+## player's own `position` is sent as it is in the data
+GROUP_COLUMN = "group"
+
+## rows formatted at a time
+CHUNK_ROWS = 500
+
+
+def _cell(value):
+    """Converts a frame value for printing: whole numbers lose the ".0", like in the JSON."""
+
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def export_columns(frames, fields=None, metrics=None):
+    """Works out the columns of an export.
+
+    Args:
+        frames (list[tuple[str, pd.DataFrame]]): (position, frame) pairs.
+        fields (list[str] | None): Columns to send, all of them if None.
+        metrics (pd.DataFrame | None): Metrics to join, indexed by gsis_id.
+
+    Returns:
+        columns (list[str]): `GROUP_COLUMN`, then every column of the
+            frames but `GAME_COLUMNS` in order of first appearance, then
+            the metrics.
+
+    Raises:
+        QueryError: If a field isn't one of those columns.
+
+    """
+
+    columns = [GROUP_COLUMN]
+    for _, frame in frames:
+        columns.extend(name for name in frame.columns if name not in columns and name not in GAME_COLUMNS)
+    if metrics is not None:
+        columns.extend(name for name in METRIC_COLUMNS if name not in columns)
+    if fields is None:
+        return columns
+    for name in fields:
+        if name not in columns:
+            raise QueryError("Unknown field '%s'" % name)
+    return list(dict.fromkeys(fields))
+
+
+def export_chunks(frames, columns, format, metrics=None, chunk_rows=CHUNK_ROWS):
+    """Yields an export a chunk of rows at a time.
+
+    Args:
+        frames (list[tuple[str, pd.DataFrame]]): (position, frame) pairs.
+        columns (list[str]): From `export_columns`.
+        format (str): A key of `FORMATS`.
+        metrics (pd.DataFrame | None): Metrics to join, indexed by gsis_id.
+        chunk_rows (int): Rows per chunk.
+
+    Yields:
+        chunk (bytes): CSV lines, the header first, or JSON lines.
+
+    """
+
+    if format == "csv":
+        yield _csv_lines([columns])
+
+    for pos, frame in frames:
+        for start in range(0, len(frame), chunk_rows):
+            chunk = frame.iloc[start:start + chunk_rows]
+            joined = None
+            if metrics is not None and "gsis_id" in chunk.columns:
+                joined = metrics.reindex(chunk["gsis_id"].to_numpy())
+
+            values = []
+            for name in columns:
+                if name == GROUP_COLUMN:
+                    values.append([pos] * len(chunk))
+                elif name in chunk.columns:
+                    values.append(chunk[name].tolist())
+                elif joined is not None and name in joined.columns:
+                    values.append(joined[name].tolist())
+                else:
+                    values.append([None] * len(chunk))
+            rows = [[_cell(value) for value in row] for row in zip(*values)]
+
+            if format == "csv":
+                yield _csv_lines(rows)
+            else:
+                yield b"".join(encoded.dumps(dict(zip(columns, row))) + b"\n" for row in rows)
+
+
+def _csv_lines(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)
+    return buffer.getvalue().encode()
@@ -1,8 +1,14 @@
 from django.contrib import admin
-from .models import NFLPlayer
+from .models import NFLPlayer, Player
 # Register your models here.
 
 class FantasyPlayerPortalAdmin(admin.ModelAdmin):
     list_display = ('name', 'position', 'number')
 
+class PlayerAdmin(admin.ModelAdmin):
+    list_display = ('full_name', 'position', 'team', 'gsis_id')
+    list_filter = ('position', 'team')
+    search_fields = ('name', 'gsis_id')
+
 admin.site.register(NFLPlayer, FantasyPlayerPortalAdmin)
+admin.site.register(Player, PlayerAdmin)
@@ -0,0 +1,201 @@
+"""Fills the player tables in models.py from the loaded data.
+
+The API serves player data straight from the snapshot (see
+snapshot_provider.py). The same data in normalized, indexed tables lets
+list queries such as "WRs on KC by target share" run as index lookups
+in the database instead of scans over whole frames.
+
+`load_tables` replaces the tables' contents in a single transaction, so
+readers see either the old data or the new data. Rows are built and
+inserted in chunks with `bulk_create`, so memory stays bounded however
+many player-weeks there are.
+"""
+
+import itertools
+import time
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+
+from snapshot import normalize_name
+from .models import Player, PlayerMetrics, PlayerWeek
+
+## rows built and inserted at a time
+CHUNK_SIZE = 2000
+
+## stat columns copied as they are, to `PlayerWeek` from `weekly_stats`
+## and to `PlayerMetrics` from `official_player_stats`
+WEEK_STATS = [
+    'completions', 'attempts', 'passing_yards', 'passing_tds', 'interceptions',
+    'carries', 'rushing_yards', 'rushing_tds', 'receptions', 'targets',
+    'receiving_yards', 'receiving_tds', 'target_share', 'fantasy_points', 'fantasy_points_ppr',
+]
+TOTAL_STATS = [
+    'games', 'passing_yards', 'passing_tds', 'rushing_yards', 'rushing_tds',
+    'receptions', 'targets', 'receiving_yards', 'receiving_tds', 'target_share',
+    'fantasy_points', 'fantasy_points_ppr',
+]
+
+
+def _value(value):
+    """Converts a pandas cell to what the database stores, NaN and NA to None."""
+
+    if value is None or pd.isna(value):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _text(value):
+    value = _value(value)
+    return '' if value is None else str(value)
+
+
+def _number(value):
+    value = _value(value)
+    try:
+        return None if value is None else float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _player(gsis, full_name, position, team, status=None):
+    full_name = _text(full_name)
+    return Player(gsis_id=gsis, name=normalize_name(full_name), full_name=full_name,
+                  position=_text(position), team=_text(team), status=_text(status))
+
+
+def _rows(df, columns):
+    """Yields each row of a frame as a dict of the columns it has."""
+
+    present = [c for c in columns if c in df.columns]
+    for values in zip(*(df[c] for c in present)):
+        yield dict(zip(present, values))
+
+
+def player_rows(roster, weekly):
+    """Builds one `Player` per gsis id.
+
+    Roster rows come first, the latest season's winning. Players with
+    stats but no roster row are added from their latest week.
+
+    Args:
+        roster (pd.DataFrame): The `roster` frame.
+        weekly (pd.DataFrame): The `weekly_stats` frame.
+
+    Returns:
+        players (dict[str, Player]): gsis id -> unsaved player.
+
+    """
+
+    players = {}
+    if 'season' in roster.columns:
+        roster = roster.sort_values('season', kind='stable')
+    for row in _rows(roster, ['gsis_id', 'full_name', 'position', 'team', 'status']):
+        gsis = _value(row['gsis_id'])
+        if gsis is not None:
+            players[gsis] = _player(gsis, row.get('full_name'), row.get('position'), row.get('team'),
+                                    row.get('status'))
+
+    ## nflverse spells the name out in player_display_name, if it is there
+    name_column = 'player_display_name' if 'player_display_name' in weekly.columns else 'player_name'
+    unrostered = {}
+    for row in _rows(weekly.sort_values(['season', 'week'], kind='stable'),
+                     ['player_id', name_column, 'position', 'recent_team']):
+        gsis = _value(row['player_id'])
+        if gsis is not None and gsis not in players:
+            unrostered[gsis] = _player(gsis, row.get(name_column), row.get('position'), row.get('recent_team'))
+    players.update(unrostered)
+    return players
+
+
+def week_rows(weekly, players):
+    """Yields one `PlayerWeek` per player, season and week.
+
+    Args:
+        weekly (pd.DataFrame): The `weekly_stats` frame.
+        players (set[str]): gsis ids of the players being loaded.
+
+    """
+
+    weekly = weekly.drop_duplicates(['player_id', 'season', 'week'], keep='last')
+    for row in _rows(weekly, ['player_id', 'season', 'week', 'recent_team'] + WEEK_STATS):
+        gsis, season, week = _value(row['player_id']), _number(row['season']), _number(row['week'])
+        if gsis not in players or season is None or week is None:
+            continue
+        yield PlayerWeek(player_id=gsis, season=int(season), week=int(week), team=_text(row.get('recent_team')),
+                         **{stat: _number(row.get(stat)) for stat in WEEK_STATS})
+
+
+def metric_rows(totals, metrics, players):
+    """Yields one `PlayerMetrics` per player with season totals.
+
+    Totals covering several seasons have a row per player and season;
+    a player's metrics then come from their latest season.
+
+    Args:
+        totals (pd.DataFrame): The `official_player_stats` frame.
+        metrics (dict[str, dict]): gsis id -> `DataProvider.advanced_metrics()` row.
+        players (set[str]): gsis ids of the players being loaded.
+
+    """
+
+    if 'season' in totals.columns:
+        totals = totals.sort_values('season', kind='stable')
+    totals = totals.drop_duplicates('player_id', keep='last')
+    for row in _rows(totals, ['player_id'] + TOTAL_STATS):
+        gsis = _value(row['player_id'])
+        if gsis not in players:
+            continue
+        derived = metrics.get(gsis, {})
+        yield PlayerMetrics(player_id=gsis, rec_dom=_number(derived.get('rec_dom')),
+                            rec_share=_number(derived.get('rec_share')),
+                            consistency_grade=_text(derived.get('consistency_grade')),
+                            **{stat: _number(row.get(stat)) for stat in TOTAL_STATS})
+
+
+def _bulk_create(model, objects, chunk_size):
+    count = 0
+    objects = iter(objects)
+    while True:
+        chunk = list(itertools.islice(objects, chunk_size))
+        if not chunk:
+            return count
+        model.objects.bulk_create(chunk)
+        count += len(chunk)
+
+
+def load_tables(provider, chunk_size=CHUNK_SIZE):
+    """Replaces the player tables with the provider's data.
+
+    Args:
+        provider (DataProvider): Where the data comes from.
+        chunk_size (int): Rows built and inserted at a time.
+
+    Returns:
+        loaded (dict[str, tuple[int, float]]): Table -> rows inserted and
+            seconds taken.
+
+    """
+
+    weekly = provider.frame('weekly_stats')
+    players = player_rows(provider.frame('roster'), weekly)
+    metrics = provider.advanced_metrics()
+    metrics = metrics[~metrics.index.duplicated(keep='first')].to_dict('index')
+
+    loaded = {}
+    with transaction.atomic():
+        PlayerWeek.objects.all().delete()
+        PlayerMetrics.objects.all().delete()
+        Player.objects.all().delete()
+
+        for name, model, rows in (
+            ('players', Player, players.values()),
+            ('player_weeks', PlayerWeek, week_rows(weekly, players.keys())),
+            ('player_metrics', PlayerMetrics, metric_rows(provider.frame('official_player_stats'), metrics,
+                                                          players.keys())),
+        ):
+            start = time.perf_counter()
+            count = _bulk_create(model, rows, chunk_size)
+            loaded[name] = (count, time.perf_counter() - start)
+    return loaded
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from fantasyPlayerPortal.loader import CHUNK_SIZE, load_tables
+
+
+class Command(BaseCommand):
+    help = 'Replaces the player tables with the data the API serves, or with a snapshot\'s'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--snapshot', help='snapshot directory to load instead of the configured data')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='rows inserted at a time')
+
+    def handle(self, *args, **options):
+        if options['snapshot']:
+            from snapshot_provider import SnapshotProvider
+            provider = SnapshotProvider(options['snapshot'])
+        else:
+            from providers import provider
+
+        for table, (rows, seconds) in load_tables(provider, options['chunk_size']).items():
+            self.stdout.write('%-16s %8d rows %8.1fms' % (table, rows, seconds * 1e3))
@@ -0,0 +1,77 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+import timing
+from encoded import compress
+from .responses import negotiate_encoding
+
+## bodies smaller than this aren't worth compressing
+MIN_COMPRESS_LENGTH = 200
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Compresses JSON responses with brotli or gzip, whichever the client prefers.
+
+    Responses that already carry a Content-Encoding (the precompressed
+    payloads) are left alone. Works under both WSGI and ASGI, so async
+    views stay async.
+    """
+
+    def process_response(self, request, response):
+        if (response.streaming
+                or response.has_header('Content-Encoding')
+                or not response.get('Content-Type', '').startswith('application/json')
+                or len(response.content) < MIN_COMPRESS_LENGTH):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate_encoding(request)
+        if encoding is None:
+            return response
+
+        with timing.stage('compress'):
+            response.content = compress(response.content, encoding)
+        response['Content-Encoding'] = encoding
+        response['Content-Length'] = str(len(response.content))
+        return response
+
+class TimingMiddleware:
+    """Times each request and the stages recorded with `timing.stage`.
+
+    Adds a `Server-Timing` header, e.g. `lookup;dur=0.41, total;dur=0.93`,
+    and feeds `timing.request_stats`, keyed by URL pattern.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        recorder, token = timing.begin()
+        try:
+            response = self.get_response(request)
+        finally:
+            timing.end(token)
+        return self._finish(request, response, recorder)
+
+    async def __acall__(self, request):
+        recorder, token = timing.begin()
+        try:
+            response = await self.get_response(request)
+        finally:
+            timing.end(token)
+        return self._finish(request, response, recorder)
+
+    def _finish(self, request, response, recorder):
+        total = recorder.total()
+        match = request.resolver_match
+        timing.request_stats.add(match.route if match is not None else 'unmatched', recorder, total)
+        response['Server-Timing'] = timing.server_timing(recorder, total)
+        return response
@@ -0,0 +1,87 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fantasyPlayerPortal', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Player',
+            fields=[
+                ('gsis_id', models.CharField(max_length=16, primary_key=True, serialize=False)),
+                ('name', models.CharField(db_index=True, max_length=120)),
+                ('full_name', models.CharField(max_length=120)),
+                ('position', models.CharField(blank=True, db_index=True, max_length=5)),
+                ('team', models.CharField(blank=True, db_index=True, max_length=5)),
+                ('status', models.CharField(blank=True, max_length=5)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PlayerWeek',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('season', models.IntegerField()),
+                ('week', models.IntegerField()),
+                ('team', models.CharField(blank=True, db_index=True, max_length=5)),
+                ('completions', models.FloatField(null=True)),
+                ('attempts', models.FloatField(null=True)),
+                ('passing_yards', models.FloatField(null=True)),
+                ('passing_tds', models.FloatField(null=True)),
+                ('interceptions', models.FloatField(null=True)),
+                ('carries', models.FloatField(null=True)),
+                ('rushing_yards', models.FloatField(null=True)),
+                ('rushing_tds', models.FloatField(null=True)),
+                ('receptions', models.FloatField(null=True)),
+                ('targets', models.FloatField(null=True)),
+                ('receiving_yards', models.FloatField(null=True)),
+                ('receiving_tds', models.FloatField(null=True)),
+                ('target_share', models.FloatField(null=True)),
+                ('fantasy_points', models.FloatField(null=True)),
+                ('fantasy_points_ppr', models.FloatField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PlayerMetrics',
+            fields=[
+                ('player', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='metrics', serialize=False, to='fantasyPlayerPortal.player')),
+                ('games', models.FloatField(null=True)),
+                ('passing_yards', models.FloatField(null=True)),
+                ('passing_tds', models.FloatField(null=True)),
+                ('rushing_yards', models.FloatField(null=True)),
+                ('rushing_tds', models.FloatField(null=True)),
+                ('receptions', models.FloatField(null=True)),
+                ('targets', models.FloatField(null=True)),
+                ('receiving_yards', models.FloatField(null=True)),
+                ('receiving_tds', models.FloatField(null=True)),
+                ('target_share', models.FloatField(null=True)),
+                ('fantasy_points', models.FloatField(null=True)),
+                ('fantasy_points_ppr', models.FloatField(null=True)),
+                ('rec_dom', models.FloatField(null=True)),
+                ('rec_share', models.FloatField(null=True)),
+                ('consistency_grade', models.CharField(blank=True, max_length=2)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['position', 'team'], name='player_position_team'),
+        ),
+        migrations.AddField(
+            model_name='playerweek',
+            name='player',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weeks', to='fantasyPlayerPortal.player'),
+        ),
+        migrations.AddIndex(
+            model_name='playerweek',
+            index=models.Index(fields=['season', 'week'], name='player_week_season_week'),
+        ),
+        migrations.AddConstraint(
+            model_name='playerweek',
+            constraint=models.UniqueConstraint(fields=('player', 'season', 'week'), name='unique_player_week'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fantasyPlayerPortal', '0002_player_tables'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='player',
+            name='position',
+            field=models.CharField(blank=True, max_length=5),
+        ),
+    ]
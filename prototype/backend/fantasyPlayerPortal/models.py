@@ -12,3 +12,74 @@ class NFLPlayer(models.Model):
     def _str_(self):
         toString = str(self.title) + " #" + str(self.number)
         return toString
+
+
+## The snapshot's tables, normalized; see loader.py for how they are filled
+
+class Player(models.Model):
+    gsis_id = models.CharField(max_length=16, primary_key=True)
+    ## normalized like the player lookups, see snapshot.normalize_name
+    name = models.CharField(max_length=120, db_index=True)
+    full_name = models.CharField(max_length=120)
+    position = models.CharField(max_length=5, blank=True)
+    team = models.CharField(max_length=5, blank=True, db_index=True)
+    status = models.CharField(max_length=5, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['position', 'team'], name='player_position_team')]
+
+    def __str__(self):
+        return '%s (%s)' % (self.full_name, self.gsis_id)
+
+
+class PlayerWeek(models.Model):
+    player = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='weeks')
+    season = models.IntegerField()
+    week = models.IntegerField()
+    ## the player's team that week, `recent_team` in nflverse
+    team = models.CharField(max_length=5, blank=True, db_index=True)
+    completions = models.FloatField(null=True)
+    attempts = models.FloatField(null=True)
+    passing_yards = models.FloatField(null=True)
+    passing_tds = models.FloatField(null=True)
+    interceptions = models.FloatField(null=True)
+    carries = models.FloatField(null=True)
+    rushing_yards = models.FloatField(null=True)
+    rushing_tds = models.FloatField(null=True)
+    receptions = models.FloatField(null=True)
+    targets = models.FloatField(null=True)
+    receiving_yards = models.FloatField(null=True)
+    receiving_tds = models.FloatField(null=True)
+    target_share = models.FloatField(null=True)
+    fantasy_points = models.FloatField(null=True)
+    fantasy_points_ppr = models.FloatField(null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['season', 'week'], name='player_week_season_week')]
+        constraints = [models.UniqueConstraint(fields=['player', 'season', 'week'], name='unique_player_week')]
+
+    def __str__(self):
+        return '%s %d week %d' % (self.player_id, self.season, self.week)
+
+
+class PlayerMetrics(models.Model):
+    ## season totals from `official_player_stats` and the derived metrics
+    player = models.OneToOneField(Player, on_delete=models.CASCADE, primary_key=True, related_name='metrics')
+    games = models.FloatField(null=True)
+    passing_yards = models.FloatField(null=True)
+    passing_tds = models.FloatField(null=True)
+    rushing_yards = models.FloatField(null=True)
+    rushing_tds = models.FloatField(null=True)
+    receptions = models.FloatField(null=True)
+    targets = models.FloatField(null=True)
+    receiving_yards = models.FloatField(null=True)
+    receiving_tds = models.FloatField(null=True)
+    target_share = models.FloatField(null=True)
+    fantasy_points = models.FloatField(null=True)
+    fantasy_points_ppr = models.FloatField(null=True)
+    rec_dom = models.FloatField(null=True)
+    rec_share = models.FloatField(null=True)
+    consistency_grade = models.CharField(max_length=2, blank=True)
+
+    def __str__(self):
+        return 'Metrics of %s' % self.player_id
@@ -0,0 +1,157 @@
+"""Runs the blocking parts of the async views off the event loop.
+
+Lookups, calls to the R workers and JSON encoding block, so the async views hand them
+to a bounded thread pool. Identical requests that arrive while one is
+already running wait for its result instead of starting their own
+(single-flight): a burst of users opening the same player page costs
+one lookup. Charts are rendered in a pool of processes instead (see
+`renders`), since drawing holds the GIL for most of its time.
+"""
+
+import asyncio
+import contextvars
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+## most blocking calls running at once; the rest wait in the executor's queue
+MAX_WORKERS = int(os.environ.get('PYBALL_EXECUTOR_WORKERS', 8))
+
+## processes rendering charts
+RENDER_WORKERS = int(os.environ.get('PYBALL_RENDER_WORKERS', 2))
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one.
+
+    Calls are tracked across threads, so requests served by different
+    event loops (or by WSGI workers calling `run_sync`) share a flight
+    too.
+
+    Args:
+        executor (Executor): Runs the calls.
+        in_context (bool): Run calls in the caller's context, so their
+            stages are timed for its request. Only for thread pools:
+            contexts don't cross into other processes.
+
+    """
+
+    def __init__(self, executor, in_context=True):
+        self.executor = executor
+        self.in_context = in_context
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def submit(self, key, func, *args):
+        """Starts `func(*args)`, or joins the call already running for `key`.
+
+        Args:
+            key (hashable): Identifies the result; equal keys share a call.
+            func (callable): Blocking function to run in the executor.
+            *args: Its arguments.
+
+        Returns:
+            future (concurrent.futures.Future): The call's result.
+
+        """
+
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future
+            self.calls += 1
+            if self.in_context:
+                future = self.executor.submit(contextvars.copy_context().run, func, *args)
+            else:
+                future = self.executor.submit(func, *args)
+            self._flights[key] = future
+        future.add_done_callback(lambda _: self._land(key, future))
+        return future
+
+    def _land(self, key, future):
+        with self._lock:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+
+    async def run(self, key, func, *args):
+        """Awaits `func(*args)` in the executor, sharing it with identical calls.
+
+        A cancelled request stops waiting, but the call carries on for
+        whoever else is waiting on it.
+        """
+
+        return await asyncio.shield(asyncio.wrap_future(self.submit(key, func, *args)))
+
+    def stats(self):
+        """Returns how many calls ran, and how many joined one already running."""
+
+        with self._lock:
+            return {'calls': self.calls, 'coalesced': self.coalesced, 'in_flight': len(self._flights)}
+
+
+class ProcessFlight(SingleFlight):
+    """A `SingleFlight` over a process pool that is rebuilt when it breaks.
+
+    A worker process that dies (killed for using too much memory, say)
+    leaves a `ProcessPoolExecutor` broken for good, failing every later
+    call. A call that fails on a broken pool replaces it and is retried
+    once.
+
+    Args:
+        make_executor (callable): Returns a new process pool.
+
+    """
+
+    def __init__(self, make_executor):
+        super().__init__(make_executor(), in_context=False)
+        self.make_executor = make_executor
+        self.rebuilds = 0
+
+    def _rebuild(self, broken):
+        with self._lock:
+            ## calls that failed together rebuild the pool once
+            if self.executor is not broken:
+                return
+            self.executor = self.make_executor()
+            self.rebuilds += 1
+        broken.shutdown(wait=False)
+
+    async def run(self, key, func, *args):
+        executor = self.executor
+        try:
+            return await super().run(key, func, *args)
+        except BrokenProcessPool:
+            self._rebuild(executor)
+            return await super().run(key, func, *args)
+
+    def stats(self):
+        return dict(super().stats(), rebuilds=self.rebuilds)
+
+
+flights = SingleFlight(ThreadPoolExecutor(MAX_WORKERS, thread_name_prefix='pyball-views'))
+
+## processes start on the first render; spawned, not forked, since the
+## server's threads don't survive a fork
+renders = ProcessFlight(lambda: ProcessPoolExecutor(RENDER_WORKERS, mp_context=multiprocessing.get_context('spawn')))
+
+
+async def iterate(iterator):
+    """Yields from a blocking iterator, advancing it in the executor.
+
+    Under ASGI, Django reads a `StreamingHttpResponse` built on a plain
+    iterator whole before sending any of it; this lets it stream.
+    """
+
+    iterator = iter(iterator)
+    done = object()
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await loop.run_in_executor(flights.executor, next, iterator, done)
+        if item is done:
+            return
+        yield item
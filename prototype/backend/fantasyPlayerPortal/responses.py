@@ -0,0 +1,164 @@
+import datetime
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.http import HttpResponse
+from django.views.decorators.http import condition
+
+from providers import snapshots
+from encoded import ENCODINGS
+from .offload import flights
+
+def negotiate_encoding(request, available=ENCODINGS):
+    """Picks the best Content-Encoding the client accepts.
+
+    Args:
+        request (HttpRequest): The request being answered.
+        available (tuple[str]): Encodings on offer, most preferred first.
+
+    Returns:
+        encoding (str | None): The encoding to use, or None for identity.
+
+    """
+
+    accepted = {}
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for coding in available:
+        quality = accepted.get(coding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+def encoded_response(request, payload, status=200):
+    """Sends a pre-encoded JSON payload as is.
+
+    A precompressed copy is sent to clients that accept one, so neither
+    parsing, serializing nor compressing happens per request.
+
+    Args:
+        request (HttpRequest): The request being answered.
+        payload (EncodedPayload): The body to send.
+        status (int): HTTP status code.
+
+    Returns:
+        response (HttpResponse): Response with Content-Type and Content-Length set.
+
+    """
+
+    body = payload.body
+    response = HttpResponse(content_type='application/json', status=status)
+    if payload.compressed:
+        response['Vary'] = 'Accept-Encoding'
+        encoding = negotiate_encoding(request, tuple(payload.compressed))
+        if encoding is not None:
+            body = payload.compressed[encoding]
+            response['Content-Encoding'] = encoding
+    response.content = body
+    response['Content-Length'] = str(len(body))
+    return response
+
+def paged_response(request, payload, total):
+    """Sends one page of a list endpoint's records.
+
+    Args:
+        request (HttpRequest): The request being answered.
+        payload (EncodedPayload): The page.
+        total (int): Records matching the query across every page.
+
+    Returns:
+        response (HttpResponse): Response with the total in `X-Total-Count`.
+
+    """
+
+    response = encoded_response(request, payload)
+    response['X-Total-Count'] = str(total)
+    return response
+
+def request_provider(request):
+    """Returns the data provider a request is served from.
+
+    The active provider is pinned on the request the first time it is
+    asked for, so the ETag and the body come from the same data even if
+    a new snapshot is swapped in meanwhile.
+    """
+
+    provider = getattr(request, '_pyball_provider', None)
+    if provider is None:
+        provider = request._pyball_provider = snapshots.active()
+    return provider
+
+def _request_version(request):
+    version = getattr(request, '_pyball_version', None)
+    if version is None:
+        version = request._pyball_version = request_provider(request).version()
+    return version
+
+async def data_version(request):
+    """Returns the version of the data a request is served from.
+
+    Asking for the version loads the data if it hasn't been yet (reading
+    the snapshot manifest, or starting the R workers), so async views ask
+    for it here, in the executor, rather than on the event loop. The version is pinned on
+    the request like the provider.
+
+    Returns:
+        version (tuple[str, float]): See `DataProvider.version`.
+
+    """
+
+    version = getattr(request, '_pyball_version', None)
+    if version is None:
+        provider = request_provider(request)
+        version = request._pyball_version = await flights.run(('version', provider), provider.version)
+    return version
+
+def _data_etag(request, *args, **kwargs):
+    ## weak, since the same data is sent with different encodings
+    return 'W/"%s"' % _request_version(request)[0]
+
+def _data_last_modified(request, *args, **kwargs):
+    return datetime.datetime.fromtimestamp(_request_version(request)[1], tz=datetime.timezone.utc)
+
+_data_condition = condition(etag_func=_data_etag, last_modified_func=_data_last_modified)
+
+def _untag_errors(response):
+    ## an error isn't the data the version names, so it mustn't be
+    ## revalidated or cached as if it were
+    if response.status_code not in (200, 304):
+        del response['ETag']
+        del response['Last-Modified']
+    return response
+
+def conditional_on_data(view):
+    """Tags responses with the loaded data's version and answers matching
+    If-None-Match / If-Modified-Since requests with 304 Not Modified.
+
+    Only for views whose response depends on nothing but the URL and the
+    data. Error responses aren't tagged. `condition` computes the ETag
+    synchronously, so for async views the version is looked up off the
+    event loop first (see `data_version`).
+    """
+
+    conditional = _data_condition(view)
+    if not iscoroutinefunction(view):
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            return _untag_errors(conditional(request, *args, **kwargs))
+        return inner
+
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        await data_version(request)
+        return _untag_errors(await conditional(request, *args, **kwargs))
+    return inner
@@ -1,7 +1,37 @@
 from rest_framework import serializers
-from .models import NFLPlayer
+from .models import NFLPlayer, Player, PlayerMetrics, PlayerWeek
 
 class FantasyPlayerPortalSerializer(serializers.ModelSerializer):
+    ## ?fields= picks which of the fields to send, all of them by default
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     class Meta:
         model = NFLPlayer
         fields = ('id', 'name', 'position', 'number')
+
+## season totals and derived metrics, sent along with each player
+METRIC_FIELDS = tuple(f.name for f in PlayerMetrics._meta.get_fields() if f.name != 'player')
+
+class PlayerSerializer(FantasyPlayerPortalSerializer):
+    class Meta:
+        model = Player
+        fields = ('gsis_id', 'name', 'full_name', 'position', 'team', 'status') + METRIC_FIELDS
+
+    def build_unknown_field(self, field_name, model_class):
+        if field_name in METRIC_FIELDS:
+            return serializers.ReadOnlyField, {'source': 'metrics.' + field_name}
+        return super().build_unknown_field(field_name, model_class)
+
+class PlayerWeekSerializer(FantasyPlayerPortalSerializer):
+    gsis_id = serializers.CharField(source='player_id')
+    full_name = serializers.CharField(source='player.full_name')
+    position = serializers.CharField(source='player.position')
+
+    class Meta:
+        model = PlayerWeek
+        fields = ('gsis_id', 'full_name', 'position', 'team', 'season', 'week') + tuple(
+            f.name for f in PlayerWeek._meta.get_fields() if f.get_internal_type() == 'FloatField')
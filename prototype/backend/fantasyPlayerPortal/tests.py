@@ -1,3 +1,1185 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from benchmarks.bench_consistency_grade import legacy_grade_consistency
+from benchmarks.bench_receiver_share import legacy_share_metrics
+import encoded
+import snapshot
+from benchmarks.synthetic import SyntheticProvider, make_dataset, synthetic_worker
+from ConsistencyGrade import GRADE_EDGES, grade_consistency, good_game_counts, grade_good_games, merge_counts
+from export import export_chunks, export_columns
+from incremental import update_positions, update_season_totals, update_team_totals
+from leaders import Leaderboards, rank_order, top_rows
+from player_index import PlayerIndex, lookup_across
+from player_search import PlayerSearch
+from response_cache import ResponseCache
+from query import QueryError, TableQuery
+from r_pool import RWorkerError, RWorkerPool, RWorkerTimeout
+from r_provider import RDataProvider
+from ReceiverShare import compute_share_metrics, team_passing_totals
+from snapshot import normalize_name, split_partitions
+from snapshot_manager import SnapshotManager
+from snapshot_provider import SnapshotProvider
+from trends import GAME_COLUMNS, LastGames, TREND_STATS, TREND_WINDOWS, group_ewma, trend_columns, weekly_trends
+from . import views
+from .loader import load_tables
+from .models import Player, PlayerMetrics, PlayerWeek
+from .offload import ProcessFlight, SingleFlight
+from .responses import request_provider
+
+
+def _season(players):
+    """Builds the weekly stats, season totals and roster for a few players.
+
+    Args:
+        players (list[tuple[str, str, str | None, list[float]]]): (name,
+            gsis id, roster position or None for no roster row, weekly
+            scores), in the order their weeks appear.
+
+    """
+
+    weekly = pd.DataFrame([(name, points) for name, _, _, scores in players for points in scores],
+                          columns=['player_name', 'fantasy_points_ppr'])
+    totals = pd.DataFrame([(name, gsis) for name, gsis, _, _ in players], columns=['player_name', 'player_id'])
+    roster = pd.DataFrame([(gsis, pos) for _, gsis, pos, _ in players if pos is not None],
+                          columns=['gsis_id', 'position'])
+    return weekly, totals, roster
+
+
+class ConsistencyGradeTests(SimpleTestCase):
+
+    def assertMatchesLegacy(self, weekly, totals, roster):
+        result = grade_consistency(weekly, totals, roster)
+        expected = legacy_grade_consistency(weekly, totals, roster)
+        self.assertEqual(result['consistency_grade'].tolist(), expected['consistency_grade'].tolist())
+        self.assertEqual(result['pos'].tolist(), expected['pos'].tolist())
+        return result
+
+    def test_matches_legacy(self):
+        weekly, totals, roster = _season([
+            ('Quarter Back', '00-01', 'QB', [25.0, 19.2, 30.1, 8.0]),
+            ('Running Back', '00-02', 'RB', [14.9, 14.8, 20.0]),
+            ('Tight End', '00-03', 'TE', [11.0, 10.5, 12.0, 9.0, 10.4, 15.0]),
+            ('One Game', '00-04', 'WR', [40.0]),
+            ('Kicker', '00-05', 'K', [12.0, 9.0]),
+        ])
+        ## on the roster, but no weekly rows
+        totals.loc[len(totals)] = ['No Games', '00-06']
+        roster.loc[len(roster)] = ['00-06', 'WR']
+
+        result = self.assertMatchesLegacy(weekly, totals, roster)
+        grades = dict(zip(result['player_name'], result['consistency_grade']))
+        self.assertEqual(grades['One Game'], 'F')
+        self.assertEqual(grades['No Games'], 'F')
+
+    def test_unknown_position_reuses_previous_players(self):
+        ## the mystery player has no roster row, so they are graded as a WR
+        ## like the player before them: three games over 14.2, a "C"
+        weekly, totals, roster = _season([
+            ('Wide Receiver', '00-01', 'WR', [20.0, 3.0]),
+            ('Mystery Player', '00-02', None, [15.0, 15.0, 15.0]),
+        ])
+
+        result = self.assertMatchesLegacy(weekly, totals, roster)
+        mystery = result.set_index('player_name').loc['Mystery Player']
+        self.assertEqual(mystery['pos'], 'NA')
+        self.assertEqual(mystery['consistency_grade'], 'C')
+
+    def test_grade_boundaries(self):
+        ## a WR at, and either side of, every edge of the good-game bins
+        counts = sorted({c for edge in GRADE_EDGES for c in (edge - 1, edge, edge + 1)} | {0})
+        weekly, totals, roster = _season([
+            ('Receiver %d' % count, '00-%02d' % count, 'WR', [20.0] * count + [0.0] * max(2 - count, 0))
+            for count in counts
+        ])
+
+        result = self.assertMatchesLegacy(weekly, totals, roster)
+        self.assertEqual(result['consistency_grade'].tolist(), grade_good_games(counts).tolist())
+        self.assertEqual(grade_good_games(GRADE_EDGES).tolist(), ['C', 'D', 'C+', 'B-', 'B', 'B+', 'A-', 'A', 'A+'])
+
+
+def _totals(rows):
+    return pd.DataFrame(rows, columns=['player_name', 'recent_team', 'passing_yards', 'passing_tds',
+                                       'receiving_yards', 'receiving_tds', 'target_share'])
+
+
+class ReceiverShareTests(SimpleTestCase):
+
+    def test_matches_legacy(self):
+        totals = _totals([
+            ('KC QB', 'KC', 4800, 38, 0, 0, 0.0),
+            ('KC TE', 'KC', 0, 0, 1300, 12, 0.27),
+            ('KC WR', 'KC', 0, 0, 900, 6, 0.2),
+            ('BUF QB', 'BUF', 4300, 35, 10, 1, 0.01),
+            ('BUF WR', 'BUF', 0, 0, 1400, 10, 0.29),
+            ('BUF backup QB', 'BUF', 120, 0, 0, 0, 0.0),
+        ])
+
+        result = compute_share_metrics(totals)
+        expected = legacy_share_metrics(totals)
+        for column in ('percent_rec_tds', 'percent_rec_yards', 'rec_dom', 'rec_share'):
+            np.testing.assert_allclose(result[column].to_numpy(dtype=float), expected[column].to_numpy(dtype=float),
+                                       rtol=1e-12, err_msg=column)
+        self.assertEqual(result['rec_share_%'].tolist(), expected['rec_share_%'].tolist())
+
+    def test_team_without_passing_gets_nan(self):
+        totals = _totals([
+            ('KC QB', 'KC', 4800, 38, 0, 0, 0.0),
+            ('KC WR', 'KC', 0, 0, 900, 6, 0.2),
+            ('XYZ WR', 'XYZ', 0, 0, 50, 1, 0.1),
+            ('XYZ TE', 'XYZ', 0, 0, 0, 0, 0.0),
+        ])
+
+        result = compute_share_metrics(totals).set_index('player_name')
+        for column in ('percent_rec_tds', 'percent_rec_yards', 'rec_dom', 'rec_share'):
+            self.assertTrue(result.loc[['XYZ WR', 'XYZ TE'], column].isna().all(), column)
+        self.assertFalse(result.loc[['KC QB', 'KC WR'], 'rec_share'].isna().any())
+
+
+def _weeks(rows):
+    return pd.DataFrame(rows, columns=['player_id', 'player_name', 'week', 'recent_team', 'passing_yards',
+                                       'passing_tds', 'receiving_yards', 'fantasy_points_ppr', 'target_share', 'wopr'])
+
+
+## weeks 1 and 2, then week 3: one player returns, one sits out and one is new
+EARLIER_WEEKS = _weeks([
+    ('00-01', 'Ann', 1, 'KC', 300, 2, 0, 22.5, 0.0, np.nan),
+    ('00-02', 'Bob', 1, 'KC', 0, 0, 85, 14.5, 0.25, 0.5),
+    ('00-01', 'Ann', 2, 'KC', 250, 1, 0, 18.1, 0.0, np.nan),
+    ('00-02', 'Bob', 2, 'KC', 0, 0, 40, np.nan, 0.125, 0.75),
+])
+LATER_WEEKS = _weeks([
+    ('00-01', 'Ann', 3, 'BUF', 310, 3, 0, 25.0, np.nan, 0.25),
+    ('00-03', 'Cal', 3, 'BUF', 0, 0, 120, 21.0, 0.3, np.nan),
+])
+
+
+def _season_totals(weekly):
+    ## what the totals would be if recomputed from every week
+    grouped = weekly.groupby('player_id', sort=False)
+    totals = pd.DataFrame({'recent_team': grouped['recent_team'].last(), 'games': grouped.size()})
+    for column in ('passing_yards', 'passing_tds', 'receiving_yards', 'fantasy_points_ppr'):
+        totals[column] = grouped[column].sum()
+    for column in ('target_share', 'wopr'):
+        totals[column] = grouped[column].mean()
+    return totals.reset_index()
+
+
+class IncrementalTests(SimpleTestCase):
+
+    def test_merged_counts_match_counting_every_week(self):
+        merged = merge_counts(good_game_counts(EARLIER_WEEKS), good_game_counts(LATER_WEEKS))
+        expected = good_game_counts(pd.concat([EARLIER_WEEKS, LATER_WEEKS], ignore_index=True))
+        pd.testing.assert_frame_equal(merged, expected, check_dtype=False, check_exact=False, rtol=1e-12)
+
+    def test_updated_totals_match_recomputing_them(self):
+        updated = update_season_totals(_season_totals(EARLIER_WEEKS), LATER_WEEKS)
+        expected = _season_totals(pd.concat([EARLIER_WEEKS, LATER_WEEKS], ignore_index=True))
+        pd.testing.assert_frame_equal(updated, expected, check_exact=False, rtol=1e-12)
+
+    def test_team_totals_round_trip(self):
+        totals = _season_totals(EARLIER_WEEKS)
+        team_totals = team_passing_totals(totals)
+        players = totals.iloc[:1]
+        moved = players.assign(recent_team='BUF', passing_yards=players['passing_yards'] + 310)
+
+        ## taking players out and putting them back
+        removed = update_team_totals(team_totals, players, players.iloc[:0])
+        pd.testing.assert_frame_equal(update_team_totals(removed, players.iloc[:0], players), team_totals)
+
+        ## moving players to a new team and back
+        there = update_team_totals(team_totals, players, moved)
+        pd.testing.assert_frame_equal(there, team_passing_totals(pd.concat([moved, totals.iloc[1:]])).loc[there.index])
+        back = update_team_totals(there, moved, players)
+        pd.testing.assert_frame_equal(back.loc[team_totals.index], team_totals)
+        self.assertEqual(back.loc['BUF'].tolist(), [0, 0])
+
+
+def _write_dataset(path, **options):
+    ## what synthetic_worker loads in place of APIData.Rdata
+    with open(path, 'w') as f:
+        json.dump(dict(players=40, **options), f)
+
+
+def _r_provider(script):
+    return RDataProvider(script, rdata=script, pool=RWorkerPool(script, workers=1, target=synthetic_worker))
+
+
+class RHotSwapTests(SimpleTestCase):
+
+    def test_swap_keeps_lookups_on_their_version(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            script = os.path.join(tmp, 'APIData.json')
+            _write_dataset(script, seed=1, delay=3)
+            manager = SnapshotManager(lambda: _r_provider(script))
+            old = manager.active()
+            old_version = old.version()
+            ## its worker has loaded the first data once it hands out a frame
+            name = old.frame('roster')['full_name'].iloc[0]
+
+            with ThreadPoolExecutor(1) as executor:
+                in_flight = executor.submit(old.get_player_data, name)
+                _write_dataset(script, seed=12345)
+                manager.refresh(wait=True)
+                new = manager.active()
+                try:
+                    self.assertIsNot(new, old)
+                    self.assertNotEqual(new.version(), old_version)
+                    before = SyntheticProvider(make_dataset(players=40, seed=1)).get_player_data(name)
+                    after = SyntheticProvider(make_dataset(players=40, seed=12345)).get_player_data(name)
+                    self.assertNotEqual(before, after)
+
+                    self.assertEqual(in_flight.result(), before)
+                    ## converted after the swap, still from the data of the old version
+                    self.assertEqual(json.dumps(old.player_data(name)), before)
+                    self.assertEqual(old.version(), old_version)
+                    self.assertEqual(json.dumps(new.player_data(name)), after)
+                finally:
+                    old.close()
+                    new.close()
+
+
+class _StubProvider:
+    """Just enough of a provider for `SnapshotManager`."""
+
+    def __init__(self, version, fail=False):
+        self.token = self.source = version
+        self.fail = fail
+        self.closed = threading.Event()
+
+    def version(self):
+        return self.token, 0.0
+
+    def loaded(self):
+        return True
+
+    def source_version(self):
+        return self.source
+
+    def warm(self):
+        if self.fail:
+            raise RuntimeError('unreadable data')
+
+    def close(self):
+        self.closed.set()
+
+
+def _manager(*providers, **kwargs):
+    ## builds the given providers in order, the first one on creation
+    return SnapshotManager(iter(providers).__next__, **kwargs)
+
+
+class SnapshotManagerTests(SimpleTestCase):
+
+    def test_failed_build_keeps_the_old_provider(self):
+        old = _StubProvider('v1')
+        manager = _manager(old, _StubProvider('v2', fail=True))
+        with self.assertLogs('snapshot_manager', 'ERROR'):
+            manager.refresh(wait=True)
+
+        self.assertIs(manager.active(), old)
+        stats = manager.stats()
+        self.assertEqual((stats['swaps'], stats['failures'], stats['version']), (0, 1, 'v1'))
+        self.assertIn('unreadable data', stats['last_error'])
+        self.assertFalse(old.closed.is_set())
+
+    def test_stale_source_is_swapped_in(self):
+        old, new = _StubProvider('v1'), _StubProvider('v2')
+        manager = _manager(old, new, interval=0.01)
+        self.assertFalse(manager.stale())
+
+        old.source = new.source = 'v2'
+        self.assertTrue(manager.stale())
+        ## active() starts the watcher, which finds the new data
+        deadline = time.monotonic() + 5
+        while manager.active() is old and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.assertIs(manager.active(), new)
+        self.assertFalse(manager.stale())
+        self.assertEqual(manager.stats()['swaps'], 1)
+
+    def test_old_provider_is_closed_after_the_grace_period(self):
+        old, new = _StubProvider('v1'), _StubProvider('v2')
+        manager = _manager(old, new, grace=0.2)
+        manager.refresh(wait=True)
+
+        self.assertIs(manager.active(), new)
+        self.assertFalse(old.closed.is_set())
+        self.assertTrue(old.closed.wait(5))
+        self.assertFalse(new.closed.is_set())
+
+    def test_request_keeps_its_provider_across_a_swap(self):
+        old, new = _StubProvider('v1'), _StubProvider('v2')
+        manager = _manager(old, new)
+        factory = RequestFactory()
+        with mock.patch('fantasyPlayerPortal.responses.snapshots', manager):
+            request = factory.get('/api/metrics/')
+            self.assertIs(request_provider(request), old)
+            manager.refresh(wait=True)
+
+            self.assertIs(request_provider(request), old)
+            self.assertIs(request_provider(factory.get('/api/metrics/')), new)
+
+
+async def _run_together(flight, calls, release):
+    ## every call is in flight before the first one may finish
+    tasks = [asyncio.ensure_future(flight.run(key, func)) for key, func in calls]
+    await asyncio.sleep(0)
+    release.set()
+    return await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class _BrokenPool:
+    """A process pool whose workers have died."""
+
+    def __init__(self):
+        self.shut_down = False
+
+    def submit(self, func, *args):
+        future = Future()
+        future.set_exception(BrokenProcessPool('a worker died'))
+        return future
+
+    def shutdown(self, wait=True):
+        self.shut_down = True
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(4)
+        self.addCleanup(self.executor.shutdown)
+        self.release = threading.Event()
+        self.ran = []
+
+    def blocking(self, result):
+        def call():
+            self.ran.append(result)
+            self.release.wait(5)
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return call
+
+    def test_concurrent_calls_run_once(self):
+        flight = SingleFlight(self.executor)
+        results = asyncio.run(_run_together(flight, [('key', self.blocking('data'))] * 5, self.release))
+
+        self.assertEqual(results, ['data'] * 5)
+        self.assertEqual(self.ran, ['data'])
+        self.assertEqual(flight.stats(), {'calls': 1, 'coalesced': 4, 'in_flight': 0})
+
+    def test_every_waiter_gets_the_exception(self):
+        flight = SingleFlight(self.executor)
+        error = ValueError('no such player')
+        results = asyncio.run(_run_together(flight, [('key', self.blocking(error))] * 3, self.release))
+
+        self.assertEqual(results, [error] * 3)
+        self.assertEqual(len(self.ran), 1)
+        self.assertEqual(flight.stats()['in_flight'], 0)
+
+    def test_different_keys_are_not_coalesced(self):
+        flight = SingleFlight(self.executor)
+        calls = [('a', self.blocking('a')), ('b', self.blocking('b')), ('a', self.blocking('a'))]
+        results = asyncio.run(_run_together(flight, calls, self.release))
+
+        self.assertEqual(results, ['a', 'b', 'a'])
+        self.assertEqual(sorted(self.ran), ['a', 'b'])
+        self.assertEqual(flight.stats(), {'calls': 2, 'coalesced': 1, 'in_flight': 0})
+
+    def test_broken_pool_is_rebuilt_and_retried_once(self):
+        broken = _BrokenPool()
+        flight = ProcessFlight(iter([broken, self.executor]).__next__)
+
+        self.assertEqual(asyncio.run(flight.run('key', len, 'abc')), 3)
+        self.assertTrue(broken.shut_down)
+        self.assertIs(flight.executor, self.executor)
+        self.assertEqual(flight.stats()['rebuilds'], 1)
+
+    def test_pool_broken_again_is_not_retried_twice(self):
+        first, second = _BrokenPool(), _BrokenPool()
+        flight = ProcessFlight(iter([first, second, self.executor]).__next__)
+
+        with self.assertRaises(BrokenProcessPool):
+            asyncio.run(flight.run('key', len, 'abc'))
+        self.assertIs(flight.executor, second)
+        self.assertEqual(flight.stats()['rebuilds'], 1)
+
+
+class RWorkerPoolTests(SimpleTestCase):
+
+    def pool(self, delay=0.0, **kwargs):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        script = os.path.join(tmp.name, 'APIData.json')
+        _write_dataset(script, seed=1, delay=delay)
+        pool = RWorkerPool(script, target=synthetic_worker, **kwargs)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_calls_run_in_the_workers(self):
+        pool = self.pool(workers=1)
+        players = json.loads(pool.call('get_position_players', 'QB'))
+        self.assertTrue(players)
+        self.assertEqual(list(pool.frame('roster')['full_name']), list(make_dataset(players=40, seed=1)['roster']['full_name']))
+
+        with self.assertRaises(RWorkerError):
+            pool.call('no_such_function')
+        ## an R error leaves the worker in the pool
+        self.assertEqual(json.loads(pool.call('get_position_players', 'QB')), players)
+        stats = pool.stats()
+        self.assertEqual((stats['calls'], stats['errors'], stats['recycled'], stats['workers']), (3, 1, 0, 1))
+
+    def test_slow_call_replaces_its_worker(self):
+        pool = self.pool(delay=2.0, workers=1, timeout=0.5)
+        pool.start()
+        worker = next(iter(pool._all))
+        with self.assertRaisesRegex(RWorkerTimeout, "didn't return"), self.assertLogs('r_pool', 'WARNING'):
+            pool.call('get_player_data', 'A0 Player0')
+
+        self.assertFalse(worker.process.is_alive())
+        stats = pool.stats()
+        self.assertEqual((stats['timeouts'], stats['recycled'], stats['workers'], stats['idle']), (1, 1, 1, 1))
+        self.assertNotIn(worker, pool._all)
+
+    def test_waiting_for_a_busy_worker_times_out(self):
+        pool = self.pool(delay=1.0, workers=1)
+        pool.frame('roster')
+        with ThreadPoolExecutor(1) as executor:
+            busy = executor.submit(pool.call, 'get_player_data', 'A0 Player0')
+            while pool.stats()['idle']:
+                time.sleep(0.01)
+            with self.assertRaisesRegex(RWorkerTimeout, 'no R worker was free'):
+                pool.call('get_player_data', 'A0 Player0', timeout=0.1)
+            busy.result()
+        self.assertEqual(pool.stats()['timeouts'], 0)
+
+    def test_workers_are_recycled_after_max_calls(self):
+        pool = self.pool(workers=1, max_calls=2)
+        pool.start()
+        first = next(iter(pool._all))
+        for _ in range(3):
+            pool.frame('roster')
+
+        self.assertNotIn(first, pool._all)
+        stats = pool.stats()
+        self.assertEqual((stats['calls'], stats['recycled'], stats['workers']), (3, 1, 1))
+
+    def test_queue_depth_counts_waiting_calls(self):
+        pool = self.pool(delay=0.3, workers=1)
+        pool.frame('roster')
+        with ThreadPoolExecutor(3) as executor:
+            calls = [executor.submit(pool.call, 'get_player_data', 'A0 Player0') for _ in range(3)]
+            deadline = time.monotonic() + 5
+            while pool.queue_depth() < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(pool.queue_depth(), 2)
+            for call in calls:
+                call.result()
+
+        self.assertEqual(pool.queue_depth(), 0)
+        self.assertEqual(pool.stats()['max_queue_depth'], 2)
+
+    def test_worker_busy_at_close_stops_when_its_call_returns(self):
+        pool = self.pool(delay=0.5, workers=2)
+        pool.frame('roster')
+        workers = list(pool._all)
+        with ThreadPoolExecutor(1) as executor:
+            busy = executor.submit(pool.call, 'get_player_data', 'A0 Player0')
+            while pool.stats()['idle'] == 2:
+                time.sleep(0.01)
+            pool.close()
+            ## the idle worker stops right away, the busy one finishes first
+            self.assertEqual(sum(worker.process.is_alive() for worker in workers), 1)
+            self.assertTrue(json.loads(busy.result()))
+
+        for worker in workers:
+            worker.process.join(5)
+            self.assertFalse(worker.process.is_alive())
+        with self.assertRaisesRegex(RWorkerError, 'closed'):
+            pool.call('get_player_data', 'A0 Player0')
+
+
+class _VersionedProvider(SyntheticProvider):
+    """A synthetic dataset served under a version of its own."""
+
+    def __init__(self, token, seed):
+        super().__init__(make_dataset(players=40, seed=seed))
+        self.token = token
+
+    def version(self):
+        return self.token, 1700000000.0
+
+
+def _serving(*providers):
+    ## serves the first provider, and the next one on each refresh()
+    manager = _manager(*providers)
+    patcher = mock.patch('fantasyPlayerPortal.responses.snapshots', manager)
+    patcher.start()
+    return manager, patcher
+
+
+class ConditionalResponseTests(SimpleTestCase):
+
+    def setUp(self):
+        self.manager, patcher = _serving(_VersionedProvider('v1', 1), _VersionedProvider('v2', 2))
+        self.addCleanup(patcher.stop)
+
+    def test_not_modified_until_the_data_changes(self):
+        url = '/api/player/A0%20Player0/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], 'W/"v1"')
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='W/"v1"').status_code, 304)
+        self.assertEqual(self.client.get('/api/metrics/', HTTP_IF_NONE_MATCH='W/"v1"').status_code, 304)
+
+        self.manager.refresh(wait=True)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='W/"v1"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], 'W/"v2"')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='W/"v2"').status_code, 304)
+
+    def test_errors_are_not_tagged(self):
+        for response in (self.client.get('/api/player/A0%20Player0/', {'seasons': 'bad'}),
+                         self.client.get('/api/players/', {'names': ','.join('p%d' % i for i in range(101))})):
+            self.assertEqual(response.status_code, 400)
+            self.assertNotIn('ETag', response)
+            self.assertNotIn('Last-Modified', response)
+        self.assertIn('ETag', self.client.get('/api/players/', {'names': 'A0 Player0'}))
+
+
+TABLE = pd.DataFrame({
+    'team': ['KC', 'BUF', 'KC', 'MIA', None],
+    'targets': [120.0, 95.0, np.nan, 95.0, 40.0],
+    'grade': ['A', 'B', 'A+', 'C', 'F'],
+}, index=['p1', 'p2', 'p3', 'p4', 'p5'])
+
+
+def _select(params, exact=()):
+    return TableQuery.parse(params, TABLE.columns, exact).select(TABLE)
+
+
+class TableQueryTests(SimpleTestCase):
+
+    def test_no_parameters_select_everything(self):
+        query = TableQuery.parse({}, TABLE.columns)
+        self.assertFalse(query)
+        self.assertEqual(query.select(TABLE), (list(TABLE.index), 5))
+
+    def test_fields(self):
+        query = TableQuery.parse({'fields': 'grade, team,'}, TABLE.columns)
+        self.assertEqual(query.fields, ['grade', 'team'])
+
+    def test_sort(self):
+        ## missing values go last either way, ties keep their order
+        self.assertEqual(_select({'sort': 'targets'}), (['p5', 'p2', 'p4', 'p1', 'p3'], 5))
+        self.assertEqual(_select({'sort': '-targets'}), (['p1', 'p2', 'p4', 'p5', 'p3'], 5))
+        self.assertEqual(_select({'sort': '-targets,-grade'}), (['p1', 'p4', 'p2', 'p5', 'p3'], 5))
+
+    def test_limit_and_offset(self):
+        self.assertEqual(_select({'sort': '-targets', 'limit': '2'}), (['p1', 'p2'], 5))
+        self.assertEqual(_select({'sort': '-targets', 'limit': '2', 'offset': '3'}), (['p5', 'p3'], 5))
+        self.assertEqual(_select({'limit': '0'}), ([], 5))
+        self.assertEqual(_select({'offset': '10'}), ([], 5))
+        self.assertEqual(_select({'limit': '', 'offset': ''}), (list(TABLE.index), 5))
+
+    def test_range_filters(self):
+        self.assertEqual(_select({'targets__gte': '95'}), (['p1', 'p2', 'p4'], 3))
+        self.assertEqual(_select({'targets__gt': '95'}), (['p1'], 1))
+        self.assertEqual(_select({'targets__lt': '95', 'limit': '5'}), (['p5'], 1))
+        self.assertEqual(_select({'targets__gte': '40', 'targets__lte': '95.0', 'sort': 'targets'}), (['p5', 'p2', 'p4'], 3))
+
+    def test_exact_matches(self):
+        self.assertEqual(_select({'grade': 'A,A+'}, TABLE.columns), (['p1', 'p3'], 2))
+        self.assertEqual(_select({'team': 'KC', 'targets__gte': '100'}, TABLE.columns), (['p1'], 1))
+        self.assertEqual(_select({'targets': '95'}, TABLE.columns), (['p2', 'p4'], 2))
+
+    def test_bad_queries(self):
+        for params in ({'fields': 'targets,yards'}, {'sort': '-yards'}, {'yards__gte': '1'},
+                       {'grade': 'A'}, {'targets__near': '1'}, {'targets__gte': 'many'},
+                       {'limit': 'ten'}, {'limit': '-1'}, {'offset': '-5'}):
+            with self.subTest(params=params), self.assertRaises(QueryError):
+                _select(params)
+
+    def test_filtering_the_api(self):
+        _, patcher = _serving(_VersionedProvider('v1', 1))
+        self.addCleanup(patcher.stop)
+        metrics = _VersionedProvider('v1', 1).advanced_metrics()
+
+        graded_b = metrics.index[metrics['consistency_grade'].isin(['B', 'B-'])]
+        response = self.client.get('/api/metrics/', {'consistency_grade': 'B,B-', 'fields': 'consistency_grade'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(len(graded_b))
+        self.assertEqual(set(response.json()), set(graded_b))
+        self.assertEqual(int(response['X-Total-Count']), len(graded_b))
+
+        for params in ({'consistency_grade__gte': 'A'}, {'grade': 'A'}, {'limit': 'all'}):
+            response = self.client.get('/api/metrics/', params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('message', response.json())
+        self.assertEqual(self.client.get('/api/position/WR/', {'team__in': 'KC'}).status_code, 400)
+
+
+class PlayerCacheTests(SimpleTestCase):
+
+    def test_least_recently_used_goes_first(self):
+        cache = ResponseCache(3)
+        for key in 'abc':
+            cache.put('v1', key, key.upper())
+        self.assertEqual(cache.lookup('v1', 'a'), 'A')
+        ## the same key under another version is another entry
+        self.assertIsNone(cache.lookup('v2', 'a'))
+        cache.put('v2', 'a', 'new A')
+
+        self.assertIsNone(cache.lookup('v1', 'b'))
+        self.assertEqual([cache.lookup('v1', 'a'), cache.lookup('v1', 'c'), cache.lookup('v2', 'a')], ['A', 'C', 'new A'])
+        self.assertEqual(cache.stats(), {'size': 3, 'maxsize': 3, 'hits': 4, 'misses': 2, 'evictions': 1, 'hit_rate': 4 / 6})
+
+    def test_size_zero_caches_nothing(self):
+        cache = ResponseCache(0)
+        self.assertEqual(cache.get('v1', 'a', lambda: 'A'), 'A')
+        self.assertEqual(cache.get('v1', 'a', lambda: 'A again'), 'A again')
+        self.assertEqual(len(cache), 0)
+
+    def test_players_not_found_are_cached_per_version(self):
+        manager, patcher = _serving(_VersionedProvider('cache1', 1), _VersionedProvider('cache2', 2))
+        self.addCleanup(patcher.stop)
+        views.player_cache.clear()
+        url = '/api/player/No%20Such%20Player/'
+
+        with mock.patch.object(views, '_player_payload', wraps=views._player_payload) as build:
+            for _ in range(2):
+                response = self.client.get(url)
+                self.assertEqual(response.json(), {'message': views.NOT_FOUND_MESSAGE})
+            self.assertEqual(build.call_count, 1)
+            self.assertIsNotNone(views.player_cache.lookup('cache1', 'no such player'))
+
+            manager.refresh(wait=True)
+            self.assertEqual(self.client.get(url).json(), {'message': views.NOT_FOUND_MESSAGE})
+            self.assertEqual(build.call_count, 2)
+            self.assertIsNotNone(views.player_cache.lookup('cache2', 'no such player'))
+
+    def test_player_payloads_are_compressed_per_response(self):
+        _, patcher = _serving(_VersionedProvider('cache3', 3))
+        self.addCleanup(patcher.stop)
+        url = '/api/player/A0%20Player0/'
+
+        plain = self.client.get(url)
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual(views.player_cache.lookup('cache3', 'a0 player0').compressed, {})
+        compressed = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+
+
+def _all_data(rows):
+    frame = pd.DataFrame(rows, columns=['gsis_id', 'full_name', 'position', 'team', 'season', 'week', 'fantasy_points_ppr'])
+    frame['name'] = frame['full_name'].map(normalize_name)
+    return pa.Table.from_pandas(frame, preserve_index=False)
+
+
+## rows in game order, so each player's rows are spread out
+ALL_DATA = _all_data([
+    ('00-01', 'Patrick Mahomes', 'QB', 'KC', 2022, 1, 30.0),
+    ('00-02', 'Mike Williams', 'WR', 'LAC', 2022, 1, 12.0),
+    ('00-04', 'Mark Andrews', 'TE', 'BAL', 2022, 1, 15.0),
+    ('00-01', 'Patrick Mahomes', 'QB', 'KC', 2022, 2, 22.0),
+    ('00-05', 'Marc Andrews', 'WR', 'NE', 2022, 2, 3.0),
+    ('00-02', 'Mike Williams', 'WR', 'LAC', 2022, 2, 8.0),
+    ('00-01', 'Patrick Mahomes', 'QB', 'KC', 2023, 1, 25.0),
+    ('00-03', 'Mike Williams', 'WR', 'NYJ', 2023, 1, 4.0),
+    ('00-04', 'Mark Andrews', 'TE', 'BAL', 2023, 1, 9.0),
+])
+
+
+class PlayerIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        self.index = PlayerIndex(ALL_DATA)
+
+    def test_rows_are_contiguous(self):
+        self.assertEqual(len(self.index), 5)
+        self.assertEqual(self.index.starts.tolist(), np.r_[0, np.cumsum(self.index.lengths)[:-1]].tolist())
+        self.assertEqual(self.index.lengths.sum(), ALL_DATA.num_rows)
+        for player, gsis in enumerate(self.index.gsis_ids):
+            rows = self.index.rows(player)
+            self.assertEqual(set(rows.column('gsis_id').to_pylist()), {gsis})
+        mahomes = self.index.rows(self.index.players('Patrick Mahomes')[0])
+        self.assertEqual(mahomes.column('fantasy_points_ppr').to_pylist(), [30.0, 22.0, 25.0])
+
+    def test_shared_name_resolves_to_the_first_player(self):
+        players = self.index.players('mike williams')
+        self.assertEqual([self.index.gsis_ids[p] for p in players], ['00-02', '00-03'])
+        self.assertEqual(self.index.lookup('Mike Williams')['gsis_id'], ['00-02'])
+        self.assertEqual(self.index.lookup('Patrick Mahomes.')['week'], [1, 2, 1])
+        self.assertEqual(self.index.lookup('Nobody'), [])
+
+    def test_lookup_across_seasons(self):
+        seasons = split_partitions(ALL_DATA)
+        indexes = [PlayerIndex(seasons[season]) for season in sorted(seasons)]
+
+        self.assertEqual(lookup_across(indexes, 'Patrick Mahomes'), self.index.lookup('Patrick Mahomes'))
+        self.assertEqual(lookup_across(indexes[1:], 'Patrick Mahomes')['season'], [2023])
+        ## the first Mike Williams is only in 2022; the 2023 one isn't mixed in
+        self.assertEqual(lookup_across(indexes, 'Mike Williams'), self.index.lookup('Mike Williams'))
+        self.assertEqual(lookup_across(indexes[1:], 'Mike Williams')['gsis_id'], ['00-03'])
+        self.assertEqual(lookup_across(indexes, 'Nobody'), [])
+
+
+class PlayerSearchTests(SimpleTestCase):
+
+    def setUp(self):
+        self.search = PlayerSearch(PlayerIndex(ALL_DATA))
+
+    def names(self, query, limit=10):
+        return [player['name'] for player in self.search.search(query, limit)]
+
+    def test_prefixes_of_any_word(self):
+        self.assertEqual(self.names('mah'), ['Patrick Mahomes'])
+        self.assertEqual(self.names('Pat'), ['Patrick Mahomes'])
+        ## the higher scorer first
+        self.assertEqual(self.names('mar'), ['Mark Andrews', 'Marc Andrews'])
+        self.assertEqual(self.names('andrews', limit=1), ['Mark Andrews'])
+
+    def test_prefix_hits_come_before_fuzzy_matches(self):
+        ## "marc andrews" is a close misspelling, but the prefix matches first
+        self.assertEqual(self.names('mark andrews'), ['Mark Andrews'])
+        self.assertEqual(self.names('marc andrews'), ['Marc Andrews'])
+
+    def test_typos(self):
+        self.assertEqual(self.names('mahommes'), ['Patrick Mahomes'])
+        self.assertEqual(self.names('patrik mahomes'), ['Patrick Mahomes'])
+        self.assertEqual(self.names('mark andrew'), ['Mark Andrews'])
+        self.assertEqual(set(self.names('marq andrews')), {'Mark Andrews', 'Marc Andrews'})
+        self.assertEqual(self.names('zzzzzz'), [])
+
+    def test_short_queries(self):
+        self.assertEqual(self.names(''), [])
+        self.assertEqual(self.names('   '), [])
+        self.assertEqual(self.names('m'), ['Patrick Mahomes', 'Mark Andrews', 'Mike Williams', 'Mike Williams', 'Marc Andrews'])
+        ## too short to guess a typo from
+        self.assertEqual(self.names('q'), [])
+        self.assertEqual(self.names('m', limit=0), [])
+
+    def test_search_endpoint(self):
+        _, patcher = _serving(_VersionedProvider('search1', 1))
+        self.addCleanup(patcher.stop)
+
+        response = self.client.get('/api/search/', {'q': 'a0 pla', 'limit': 3})
+        self.assertEqual(response.status_code, 200)
+        players = response.json()
+        self.assertTrue(players)
+        for player in players:
+            self.assertEqual(set(player), {'name', 'position', 'team', 'gsis_id'})
+        self.assertEqual(players[0]['name'], 'A0 Player0')
+        self.assertEqual(self.client.get('/api/search/', {'q': ''}).json(), [])
+        self.assertEqual(self.client.get('/api/search/', {'q': 'a', 'limit': 'x'}).status_code, 400)
+
+
+def _position_frame(rows):
+    return pd.DataFrame(rows, columns=['gsis_id', 'full_name', 'team', 'season', 'receiving_yards', 'carries']).set_index('gsis_id', drop=False)
+
+
+class LeaderboardTests(SimpleTestCase):
+
+    def setUp(self):
+        self.boards = Leaderboards([
+            ('WR', _position_frame([
+                ('00-01', 'Wide One', 'KC', 2023, 1200.0, np.nan),
+                ('00-02', 'Wide Two', 'BUF', 2023, 900.0, 2.0),
+            ])),
+            ('RB', _position_frame([
+                ('00-03', 'Running One', 'SF', 2023, 500.0, 250.0),
+                ('00-04', 'Running Two', 'NYJ', 2023, 1300.0, 180.0),
+            ])),
+        ], stats=['receiving_yards'])
+
+    def test_top_rows_matches_a_full_sort(self):
+        rng = np.random.default_rng(0)
+        cases = [
+            np.array([5.0, np.nan, 3.0, 5.0, 1.0, 5.0, np.nan, 3.0]),
+            np.array([np.nan, np.nan]),
+            np.array([]),
+        ]
+        ## few distinct values, so the k-th value is usually tied
+        for _ in range(50):
+            values = rng.integers(0, 5, rng.integers(1, 40)).astype(float)
+            values[rng.uniform(size=len(values)) < 0.2] = np.nan
+            cases.append(values)
+
+        for values in cases:
+            for k in range(len(values) + 2):
+                with self.subTest(values=values.tolist(), k=k):
+                    self.assertEqual(top_rows(values, k).tolist(), rank_order(values)[:k].tolist())
+
+    def test_ties_at_the_kth_value_keep_row_order(self):
+        values = np.array([2.0, 7.0, 5.0, np.nan, 5.0, 5.0])
+        self.assertEqual(top_rows(values, 3).tolist(), [1, 2, 4])
+        self.assertEqual(rank_order(values).tolist(), [1, 2, 4, 5, 0])
+
+    def test_ranked_and_ad_hoc_stats(self):
+        boards = self.boards
+        self.assertEqual(boards.top('receiving_yards').tolist(), [3, 0, 1, 2])
+        self.assertEqual(boards.top('receiving_yards', 'RB', k=1).tolist(), [3])
+        ## carries isn't ranked up front
+        self.assertNotIn((None, 'carries'), boards._ranks)
+        self.assertEqual(boards.top('carries').tolist(), [2, 3, 1])
+        self.assertEqual(boards.top('carries', 'RB', k=1).tolist(), [2])
+        self.assertEqual([leader['full_name'] for leader in boards.leaders('carries', 'WR')], ['Wide Two'])
+        self.assertEqual(boards.leaders('receiving_yards', k=1),
+                         [{'rank': 1, 'gsis_id': '00-04', 'full_name': 'Running Two', 'team': 'NYJ', 'position': 'RB',
+                           'receiving_yards': 1300.0}])
+
+    def test_unknown_stat_or_position(self):
+        for stat, pos in (('tackles', None), ('season', None), ('full_name', None), ('receiving_yards', 'QB')):
+            with self.subTest(stat=stat, pos=pos), self.assertRaises(QueryError):
+                self.boards.top(stat, pos)
+
+
+def _export_frame(rows):
+    return pd.DataFrame(rows, columns=['gsis_id', 'full_name', 'position', 'season', 'week', 'receiving_yards', 'games'])
+
+
+EXPORT_FRAMES = [
+    ('WR', _export_frame([
+        ('00-01', 'Wide One', 'WR', 2023, 17, 1200.0, 17.0),
+        ## listed with the receivers by depth chart, but a tight end
+        ('00-02', 'Tight Wide', 'TE', 2023, 16, 640.5, 15.0),
+        ('00-03', 'Wide Three', 'WR', 2023, 9, np.nan, 3.0),
+    ])),
+    ('RB', _export_frame([
+        ('00-04', 'Running One', 'RB', 2023, 18, 310.0, 16.0),
+        ('00-05', 'Running Two', 'RB', 2022, 4, 12.0, 2.0),
+    ])),
+]
+EXPORT_METRICS = pd.DataFrame({
+    'rec_share': [0.31, 0.12, 0.02],
+    'rec_dom': [0.28, 0.1, np.nan],
+    'rec_share_%': ['31%', '12%', '2%'],
+    'consistency_grade': ['A', 'C', 'F'],
+}, index=pd.Index(['00-01', '00-02', '00-04'], name='player_id'))
+
+
+class ExportTests(SimpleTestCase):
+
+    def test_columns(self):
+        self.assertEqual(export_columns(EXPORT_FRAMES),
+                         ['group', 'gsis_id', 'full_name', 'position', 'receiving_yards', 'games'])
+        self.assertEqual(export_columns(EXPORT_FRAMES, metrics=EXPORT_METRICS)[-3:], ['rec_share', 'rec_dom', 'consistency_grade'])
+        self.assertEqual(export_columns(EXPORT_FRAMES, ['full_name', 'group', 'full_name']), ['full_name', 'group'])
+        for fields in (['week'], ['rec_share'], ['yards']):
+            with self.subTest(fields=fields), self.assertRaises(QueryError):
+                export_columns(EXPORT_FRAMES, fields)
+
+    def test_csv(self):
+        columns = export_columns(EXPORT_FRAMES, metrics=EXPORT_METRICS)
+        chunks = list(export_chunks(EXPORT_FRAMES, columns, 'csv', EXPORT_METRICS, chunk_rows=2))
+        ## the header, then two chunks of receivers and one of running backs
+        self.assertEqual(len(chunks), 4)
+        rows = list(csv.reader(io.StringIO(b''.join(chunks).decode())))
+
+        self.assertEqual(rows[0], columns)
+        self.assertNotIn(columns, rows[1:])
+        self.assertEqual(rows[1:], [
+            ['WR', '00-01', 'Wide One', 'WR', '1200', '17', '0.31', '0.28', 'A'],
+            ['WR', '00-02', 'Tight Wide', 'TE', '640.5', '15', '0.12', '0.1', 'C'],
+            ['WR', '00-03', 'Wide Three', 'WR', '', '3', '', '', ''],
+            ['RB', '00-04', 'Running One', 'RB', '310', '16', '0.02', '', 'F'],
+            ['RB', '00-05', 'Running Two', 'RB', '12', '2', '', '', ''],
+        ])
+
+    def test_ndjson(self):
+        columns = export_columns(EXPORT_FRAMES, ['full_name', 'group', 'position', 'consistency_grade'], EXPORT_METRICS)
+        chunks = list(export_chunks(EXPORT_FRAMES, columns, 'ndjson', EXPORT_METRICS, chunk_rows=2))
+        self.assertEqual(len(chunks), 3)
+        rows = [json.loads(line) for line in b''.join(chunks).decode().splitlines()]
+
+        self.assertEqual(rows, [
+            {'full_name': 'Wide One', 'group': 'WR', 'position': 'WR', 'consistency_grade': 'A'},
+            {'full_name': 'Tight Wide', 'group': 'WR', 'position': 'TE', 'consistency_grade': 'C'},
+            {'full_name': 'Wide Three', 'group': 'WR', 'position': 'WR', 'consistency_grade': None},
+            {'full_name': 'Running One', 'group': 'RB', 'position': 'RB', 'consistency_grade': 'F'},
+            {'full_name': 'Running Two', 'group': 'RB', 'position': 'RB', 'consistency_grade': None},
+        ])
+
+    def test_without_metrics(self):
+        columns = export_columns(EXPORT_FRAMES, ['gsis_id', 'rec_share'], EXPORT_METRICS)
+        rows = [json.loads(line) for chunk in export_chunks(EXPORT_FRAMES[1:], columns, 'ndjson') for line in chunk.splitlines()]
+        self.assertEqual(rows, [{'gsis_id': '00-04', 'rec_share': None}, {'gsis_id': '00-05', 'rec_share': None}])
+
+
+def _loader_dataset():
+    dataset = make_dataset(seasons=2, players=40, seed=4)
+    roster, weekly, totals = dataset['roster'], dataset['weekly'], dataset['totals']
+    ## every roster row again for the season before, on another team and
+    ## listed after the latest season's
+    dataset['roster'] = pd.concat([roster.assign(season=2023), roster.assign(season=2022, team='OLD', status='RET')],
+                                  ignore_index=True)
+    ## the last week sent twice, the correction last
+    dataset['weekly'] = pd.concat([weekly, weekly.tail(1).assign(fantasy_points_ppr=99.5)], ignore_index=True)
+    ## totals for an earlier, one-game season, listed after the latest
+    dataset['totals'] = pd.concat([totals.assign(season=2023), totals.assign(season=2022, games=1)], ignore_index=True)
+    return dataset
+
+
+class LoaderTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dataset = _loader_dataset()
+        cls.loaded = load_tables(SyntheticProvider(cls.dataset), chunk_size=50)
+
+    def _get(self, view, **params):
+        response = view(RequestFactory().get('/', params))
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content), int(response['X-Total-Count'])
+
+    def test_row_counts(self):
+        roster, weekly, totals = self.dataset['roster'], self.dataset['weekly'], self.dataset['totals']
+        players = len(set(roster['gsis_id']) | set(weekly['player_id']))
+        self.assertEqual(self.loaded['players'][0], players)
+        self.assertEqual(self.loaded['player_weeks'][0], len(weekly) - 1)
+        self.assertEqual(self.loaded['player_metrics'][0], totals['player_id'].nunique())
+        self.assertEqual((Player.objects.count(), PlayerWeek.objects.count(), PlayerMetrics.objects.count()),
+                         (players, len(weekly) - 1, totals['player_id'].nunique()))
+
+        ## loading again replaces the rows
+        load_tables(SyntheticProvider(self.dataset))
+        self.assertEqual(Player.objects.count(), players)
+        self.assertEqual(PlayerWeek.objects.count(), len(weekly) - 1)
+
+    def test_latest_season_wins(self):
+        self.assertFalse(Player.objects.filter(team='OLD').exists())
+        self.assertFalse(Player.objects.filter(status='RET').exists())
+        ## players with stats but no roster row come from their stats
+        unrostered = set(self.dataset['weekly']['player_id']) - set(self.dataset['roster']['gsis_id'])
+        self.assertEqual(set(Player.objects.filter(status='').values_list('gsis_id', flat=True)), unrostered)
+
+        self.assertFalse(PlayerMetrics.objects.filter(games=1).exists())
+        latest = self.dataset['totals'].drop_duplicates('player_id').set_index('player_id')['games']
+        for metrics in PlayerMetrics.objects.all():
+            self.assertEqual(metrics.games, latest[metrics.player_id])
+
+        corrected = self.dataset['weekly'].iloc[-1]
+        week = PlayerWeek.objects.get(player_id=corrected['player_id'], season=corrected['season'],
+                                      week=corrected['week'])
+        self.assertEqual(week.fantasy_points_ppr, 99.5)
+
+    def test_players_query(self):
+        roster = self.dataset['roster']
+        receivers = roster[(roster['season'] == 2023) & (roster['position'] == 'WR')]
+
+        page, total = self._get(views.table_players, position='WR', sort='-target_share',
+                                fields='gsis_id,position,target_share')
+        self.assertEqual(total, len(receivers))
+        self.assertEqual({row['gsis_id'] for row in page}, set(receivers['gsis_id']))
+        self.assertEqual(set(page[0]), {'gsis_id', 'position', 'target_share'})
+        shares = [row['target_share'] for row in page]
+        self.assertEqual(shares, sorted(shares, reverse=True))
+
+        team = receivers['team'].iloc[0]
+        page, total = self._get(views.table_players, position='WR', team=team)
+        self.assertEqual(total, (receivers['team'] == team).sum())
+        self.assertEqual({(row['position'], row['team']) for row in page}, {('WR', team)})
+
+        self.assertEqual(self._get(views.table_players, team='OLD'), ([], 0))
+
+    def test_weeks_query(self):
+        weekly, roster = self.dataset['weekly'], self.dataset['roster']
+        receivers = set(roster.loc[roster['position'] == 'WR', 'gsis_id'])
+        expected = weekly[(weekly['season'] == 2023) & (weekly['week'] == 5) & weekly['player_id'].isin(receivers)]
+
+        page, total = self._get(views.table_player_weeks, season=2023, week=5, position='WR',
+                                sort='-fantasy_points_ppr')
+        self.assertEqual(total, len(expected))
+        self.assertEqual({row['gsis_id'] for row in page}, set(expected['player_id']))
+        self.assertTrue(all((row['season'], row['week'], row['position']) == (2023, 5, 'WR') for row in page))
+        points = [row['fantasy_points_ppr'] for row in page]
+        self.assertEqual(points, sorted(points, reverse=True))
+
+        corrected = weekly.iloc[-1]
+        page, total = self._get(views.table_player_weeks, gsis_id=corrected['player_id'],
+                                season=int(corrected['season']), week=int(corrected['week']))
+        self.assertEqual(total, 1)
+        self.assertEqual(page[0]['fantasy_points_ppr'], 99.5)
+
+
+def _trend_weeks():
+    weekly = make_dataset(seasons=2, players=30, seed=5)['weekly']
+    ## games without a value, a player's first game among them
+    weekly.loc[weekly.index[::7], 'fantasy_points_ppr'] = np.nan
+    weekly.loc[weekly['player_id'] == weekly['player_id'].iloc[0], 'targets'] = np.nan
+    first = weekly.sort_values(GAME_COLUMNS).groupby('player_id').head(1).index
+    weekly.loc[first, 'carries'] = np.nan
+    ## players with a single game, with and without values
+    single = pd.DataFrame({'player_id': ['00-single1', '00-single2'], 'season': 2023, 'week': 9})
+    single[TREND_STATS] = [[12.34567, 7.0, 0.2, 5.0, 1.0, 0.0], [np.nan] * len(TREND_STATS)]
+    ## in no particular order: weekly_trends sorts the rows itself
+    return pd.concat([weekly, single]).sample(frac=1, random_state=0).reset_index(drop=True)
+
+
+def _reference_trends(weekly):
+    ## the straightforward one-player-at-a-time computation weekly_trends replaces
+    df = weekly.sort_values(GAME_COLUMNS, kind='stable', ignore_index=True)
+    grouped = df[TREND_STATS].astype(float).groupby(df['player_id'], sort=False)
+    result = {}
+    for window in TREND_WINDOWS:
+        computed = {
+            'mean': grouped.rolling(window, min_periods=1).mean(),
+            'sd': grouped.rolling(window, min_periods=2).std(),
+            'ewma': grouped.ewm(span=window).mean(),
+        }
+        for kind, frame in computed.items():
+            frame = frame.reset_index(level=0, drop=True).sort_index()
+            for stat in TREND_STATS:
+                result['%s_%s_%d' % (stat, kind, window)] = frame[stat].to_numpy()
+    return df[GAME_COLUMNS].assign(**{name: result[name] for name in trend_columns()})
+
+
+class TrendTests(SimpleTestCase):
+
+    def test_matches_groupby(self):
+        weekly = _trend_weeks()
+        trends = weekly_trends(weekly)
+        expected = _reference_trends(weekly)
+
+        self.assertEqual(list(trends.columns), list(expected.columns))
+        pd.testing.assert_frame_equal(trends[GAME_COLUMNS], expected[GAME_COLUMNS])
+        for column in expected.columns[len(GAME_COLUMNS):]:
+            with self.subTest(column=column):
+                np.testing.assert_allclose(trends[column], expected[column], rtol=0, atol=1e-4)
+
+    def test_single_game(self):
+        weekly = _trend_weeks()
+        trends = weekly_trends(weekly).set_index('player_id')
+        played = weekly.set_index('player_id').loc['00-single1']
+        for window in TREND_WINDOWS:
+            for stat in TREND_STATS:
+                self.assertEqual(trends.loc['00-single1', '%s_mean_%d' % (stat, window)], round(played[stat], 4))
+                self.assertEqual(trends.loc['00-single1', '%s_ewma_%d' % (stat, window)], round(played[stat], 4))
+                self.assertTrue(np.isnan(trends.loc['00-single1', '%s_sd_%d' % (stat, window)]))
+        self.assertTrue(trends.loc['00-single2'].iloc[2:].isna().all())
+
+    def test_last_games(self):
+        ## players of 3, 1 and 4 rows
+        first_rows = np.array([0, 0, 0, 3, 4, 4, 4, 4])
+        values = pd.Series([1.0, 2.0, np.nan, 4.0, 5.0, 6.0, 7.0, 8.0])
+        sums = values.rolling(LastGames(first_rows=first_rows, window_size=2), min_periods=1).sum()
+        np.testing.assert_array_equal(sums, [1.0, 3.0, 2.0, 4.0, 5.0, 11.0, 13.0, 15.0])
+        start, end = LastGames(first_rows=first_rows, window_size=3).get_window_bounds(len(values))
+        np.testing.assert_array_equal(start, [0, 0, 0, 3, 4, 4, 4, 5])
+        np.testing.assert_array_equal(end, np.arange(1, 9))
+
+    def test_group_ewma(self):
+        values = np.array([[np.nan, 1.0], [2.0, np.nan], [4.0, 3.0], [5.0, np.nan], [np.nan, np.nan], [1.0, 2.0]])
+        first_rows = np.array([0, 0, 0, 3, 3, 3])
+        players = pd.Series(first_rows)
+        for spans in ([3, 3], [2, 8]):
+            with self.subTest(spans=spans):
+                expected = np.column_stack([
+                    pd.Series(values[:, i]).groupby(players).ewm(span=span).mean().to_numpy()
+                    for i, span in enumerate(spans)
+                ])
+                np.testing.assert_allclose(group_ewma(values, first_rows, np.array(spans)), expected, rtol=1e-12)
+        self.assertEqual(group_ewma(np.empty((0, 2)), np.array([], dtype=int), np.array([3, 3])).shape, (0, 2))
+
+
+class StoredPositionTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.source = SyntheticProvider(make_dataset(players=40, seed=2))
+        snapshot.export_snapshot(cls.source, cls.directory.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def test_served_as_stored(self):
+        provider = SnapshotProvider(self.directory.name)
+        ## nothing is parsed or compressed on the way to a response
+        with mock.patch('encoded.compress', side_effect=AssertionError), \
+                mock.patch('encoded.loads', side_effect=AssertionError):
+            payloads = provider.position_payloads()
+
+        self.assertEqual(set(payloads), set(self.source.position_json()))
+        for pos, payload in payloads.items():
+            self.assertEqual(payload.body, encoded.dumps(json.loads(self.source.get_position_players(pos))))
+            self.assertEqual(set(payload.compressed), set(encoded.ENCODINGS))
+            self.assertEqual(gzip.decompress(payload.compressed['gzip']), payload.body)
+        self.assertEqual(provider.position_players('wr'), json.loads(self.source.get_position_players('WR')))
+
+    def test_without_precompress(self):
+        provider = SnapshotProvider(self.directory.name, precompress=False)
+        self.assertTrue(all(not payload.compressed for payload in provider.position_payloads().values()))
+
+    def test_json_text(self):
+        ## positions tables written before the payloads were stored encoded
+        table = pa.table({'position': ['WR'], 'payload': [self.source.get_position_players('WR')]})
+        payload = snapshot.read_positions(table)['WR']
+        self.assertEqual(payload.body, encoded.dumps(json.loads(self.source.get_position_players('WR'))))
+        self.assertEqual(gzip.decompress(payload.compressed['gzip']), payload.body)
+
+    def test_update_positions(self):
+        stored = SnapshotProvider(self.directory.name).position_payloads()
+        name = next(iter(json.loads(stored['WR'].body)))
+        updated = update_positions(stored, {normalize_name(name): {'full_name': [name], 'week': [18]}})
+
+        self.assertIs(updated['QB'], stored['QB'])
+        self.assertEqual(json.loads(updated['WR'].body)[name], {'full_name': [name], 'week': [18]})
+        self.assertEqual(gzip.decompress(updated['WR'].compressed['gzip']), updated['WR'].body)
+
+
+class ServerStatsTests(SimpleTestCase):
+
+    def _stats(self, provider, request=None):
+        with mock.patch('fantasyPlayerPortal.views.snapshots', _manager(provider)):
+            return views.server_stats(request or RequestFactory().get('/api/_stats/'))
+
+    def test_backends(self):
+        response = self._stats(_VersionedProvider('stats1', 1))
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(json.loads(response.content)['r_pool'])
+
+        with tempfile.TemporaryDirectory() as directory:
+            provider = _r_provider(os.path.join(directory, 'data.json'))
+            self.addCleanup(provider.close)
+            stats = json.loads(self._stats(provider).content)
+        self.assertEqual((stats['r_pool']['workers'], stats['r_pool']['calls']), (0, 0))
+
+    @override_settings(DEBUG=False, INTERNAL_IPS=['10.0.0.5'])
+    def test_internal_only(self):
+        provider = _VersionedProvider('stats2', 1)
+        outside = RequestFactory().get('/api/_stats/', REMOTE_ADDR='203.0.113.7')
+        response = self._stats(provider, outside)
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn(b'memory', response.content)
+
+        outside.user = mock.Mock(is_staff=False)
+        self.assertEqual(self._stats(provider, outside).status_code, 403)
+        outside.user = mock.Mock(is_staff=True)
+        self.assertEqual(self._stats(provider, outside).status_code, 200)
+
+        inside = RequestFactory().get('/api/_stats/', REMOTE_ADDR='10.0.0.5')
+        self.assertIn('memory', json.loads(self._stats(provider, inside).content))
+        with self.settings(DEBUG=True):
+            self.assertEqual(self._stats(provider, RequestFactory().get('/api/_stats/', REMOTE_ADDR='203.0.113.7')).status_code, 200)
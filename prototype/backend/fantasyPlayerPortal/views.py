@@ -1,75 +1,428 @@
 from django.shortcuts import render
 from rest_framework import viewsets
-from .serializers import FantasyPlayerPortalSerializer
-from .models import NFLPlayer
+from .serializers import METRIC_FIELDS, FantasyPlayerPortalSerializer, PlayerSerializer, PlayerWeekSerializer
+from .models import NFLPlayer, Player, PlayerWeek
+from .offload import flights, iterate, renders
+from .responses import conditional_on_data, data_version, encoded_response, paged_response, request_provider
 
-from django.http.response import JsonResponse
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http.response import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
 from rest_framework.parsers import JSONParser
 from rest_framework import status
 from rest_framework.decorators import api_view
 
-import rpy2.robjects as robjects
 import pandas as pd
+import asyncio
 import json
+import os
+import tempfile
 
-import ReceiverShare
-from ReceiverShare import df_sorted_rec_share
-import ConsistencyGrade
-from ConsistencyGrade import df_official_player_stats
+import memory
+import timing
+## the data is loaded on the first request, not at import; each request
+## is served from the snapshot active when it started
+from providers import snapshots
+from charts import FORMATS as CHART_FORMATS, render_comparison
+from encoded import FRAME_FORMATS, EncodedPayload, encode_frame
+from export import FORMATS as EXPORT_FORMATS, export_chunks, export_columns
+from query import QueryError, TableQuery, parse_seasons
+from grapher import PlayerNotFound, comparison_data
+from image_cache import ImageCache
+from response_cache import ResponseCache
+from snapshot import normalize_name
 
 # Create your views here.
 
-## load in the R function that parses players here
-r = robjects.r
-r['source']('ParseNFLPlayers.R')
+NOT_FOUND_MESSAGE = 'Our platform currently only supports offensive players and kickers. Try another search term.'
 
-## R function to get the data from a player based on name
-parse_nfl_player_r = robjects.globalenv['get_player_data']
+## most players a single /api/players/ request may ask for
+MAX_BATCH_PLAYERS = 100
 
-## R function to get the data based on position
-parse_position_players_r = robjects.globalenv['get_position_players']
+## encoded /api/player/ responses, found or not, by normalized name (and seasons)
+player_cache = ResponseCache(int(os.environ.get('PYBALL_PLAYER_CACHE_SIZE', 1024)))
 
-@api_view(['GET', 'POST', 'DELETE'])
-def nfl_player(request, name):
-    player_strvec = parse_nfl_player_r(name)
-    result = player_strvec[0]
-    parsed = json.loads(result)
+## rendered /api/graph/ images by players, stats, seasons and format,
+## in memory and on disk; see image_cache.py
+graph_cache = ImageCache(
+    os.environ.get('PYBALL_GRAPH_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'pyball-graphs')),
+    int(os.environ.get('PYBALL_GRAPH_CACHE_SIZE', 256)),
+    int(os.environ.get('PYBALL_GRAPH_CACHE_BYTES', 256 * 1024 * 1024)),
+)
+
+MAX_GRAPH_PLAYERS = 6
+MAX_GRAPH_STATS = 4
+
+## leaders sent when the request has no k=, and the most it may ask for
+LEADERS_K = 10
+MAX_LEADERS_K = 100
+
+def _player_payload(provider, name, seasons):
+    parsed = provider.player_data(name, seasons)
 
     if parsed == []:
-        parsed = {'message': 'Our platform currently only supports offensive players and kickers. Try another search term.'}
+        parsed = {'message': NOT_FOUND_MESSAGE}
 
-    if request.method == 'GET':
-        return JsonResponse(parsed, status=status.HTTP_200_OK, safe=False, json_dumps_params={"indent": 4})
+    ## built on a request, so compressed per response by CompressionMiddleware
+    ## at its quicker levels rather than precompressed at the slowest
+    with timing.stage('encode'):
+        return EncodedPayload.from_object(parsed, precompress=False)
+
+def _build_player_payload(provider, version, key, name, seasons):
+    return player_cache.put(version, key, _player_payload(provider, name, seasons))
+
+def _seasons(request):
+    ## ?seasons=2019-2021 only sends and loads those seasons' rows
+    seasons = request.GET.get('seasons')
+    return None if seasons is None else parse_seasons(seasons)
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST', 'DELETE'])
+@conditional_on_data
+async def nfl_player(request, name):
+    if request.method != 'GET':
+        return JsonResponse({'message': 'This operation is not supported'}, status=status.HTTP_204_NO_CONTENT)
+
+    ## cache hits are answered on the event loop; misses are looked up once
+    ## however many requests for the name arrive meanwhile
+    try:
+        seasons = _seasons(request)
+    except QueryError as e:
+        return JsonResponse({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    provider = request_provider(request)
+    version = (await data_version(request))[0]
+    key = normalize_name(name) if seasons is None else (normalize_name(name), seasons)
+    payload = player_cache.lookup(version, key)
+    if payload is None:
+        payload = await flights.run(('player', version, key), _build_player_payload, provider, version, key, name, seasons)
+    return encoded_response(request, payload)
+
+def _trends_payload(provider, name, seasons):
+    trends = provider.player_trends(name, seasons)
+
+    if trends == []:
+        trends = {'message': NOT_FOUND_MESSAGE}
+
+    with timing.stage('encode'):
+        return EncodedPayload.from_object(trends, precompress=False)
+
+@conditional_on_data
+async def player_trends(request, name):
+    ## GET /api/trends/<name>/?seasons=2023: the rolling means, standard deviations
+    ## and EWMAs of the player's scoring and usage after each game; see trends.py
+    if request.method != 'GET':
+        return JsonResponse({'message': 'This operation is not supported'}, status=status.HTTP_204_NO_CONTENT)
+
+    try:
+        seasons = _seasons(request)
+    except QueryError as e:
+        return JsonResponse({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    provider = request_provider(request)
+    version = (await data_version(request))[0]
+    payload = await flights.run(('trends', version, normalize_name(name), seasons), _trends_payload, provider, name, seasons)
+    return encoded_response(request, payload)
+
+@api_view(['GET', 'POST'])
+@conditional_on_data
+def nfl_players(request):
+    ## GET /api/players/?names=a,b,c or POST {"names": ["a", "b", "c"]}
+    if request.method == 'POST':
+        names = request.data.get('names') if isinstance(request.data, dict) else None
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            return JsonResponse({'message': 'names must be a list of player names'}, status=status.HTTP_400_BAD_REQUEST)
     else:
+        names = request.GET.get('names', '').split(',')
+
+    names = list(dict.fromkeys(name.strip() for name in names if name.strip()))
+    if len(names) > MAX_BATCH_PLAYERS:
+        return JsonResponse({'message': 'Ask for at most %d players at a time' % MAX_BATCH_PLAYERS}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        seasons = _seasons(request)
+    except QueryError as e:
+        return JsonResponse({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    players = request_provider(request).players_data(names, seasons)
+    for name, parsed in players.items():
+        if parsed == []:
+            players[name] = {'message': NOT_FOUND_MESSAGE}
+
+    with timing.stage('encode'):
+        return JsonResponse(players, status=status.HTTP_200_OK)
+
+@conditional_on_data
+async def position_players(request, pos):
+    if request.method != 'GET':
         return JsonResponse({'message': 'This operation is not supported'}, status=status.HTTP_204_NO_CONTENT)
 
-def position_players(request, pos):
-    position_strvec = parse_position_players_r(pos)
-    position_result = position_strvec[0]
-    parsed_position = json.loads(position_result)
+    ## the position JSON is encoded when the data is loaded and sent as is
+    provider = request_provider(request)
+    version = (await data_version(request))[0]
+    payloads = provider.ready('position_payloads') or await flights.run(('position_payloads', version), provider.position_payloads)
+    payload = payloads.get(pos.upper())
+    if payload is None:
+        return JsonResponse({'message': NOT_FOUND_MESSAGE}, status=status.HTTP_200_OK)
+
+    if not request.GET:
+        return encoded_response(request, payload)
+
+    ## ?fields=, sort=, limit=, offset=, range filters and exact matches; see query.py
+    key = ('position', version, pos.upper(), request.GET.urlencode())
+    try:
+        page, total = await flights.run(key, _position_page, provider, pos, request.GET)
+    except QueryError as e:
+        return JsonResponse({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return paged_response(request, page, total)
+
+def _position_page(provider, pos, params):
+    frame = provider.position_frame(pos)
+    records = provider.position_records(pos)
+    with timing.stage('query'):
+        query = TableQuery.parse(params, frame.columns, frame.columns)
+        keys, total = query.select(frame)
+
+    if query.fields is None:
+        page = {key: records[key] for key in keys}
+    else:
+        page = {key: {field: records[key][field] for field in query.fields if field in records[key]} for key in keys}
+    with timing.stage('encode'):
+        return EncodedPayload.from_object(page, precompress=False), total
 
-    if parsed_position == []:
-        parsed_position = {'message': 'Our platform currently only supports offensive players and kickers. Try another search term.'}
+@conditional_on_data
+def search_players(request):
+    query = request.GET.get('q', '')
+    try:
+        limit = int(request.GET.get('limit', 10))
+    except ValueError:
+        return JsonResponse({'message': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
 
     if request.method == 'GET':
-        return JsonResponse(parsed_position, status=status.HTTP_200_OK, safe=False, json_dumps_params={"indent": 4})
+        search = request_provider(request).player_search()
+        with timing.stage('search'):
+            players = search.search(query, limit)
+        return JsonResponse(players, status=status.HTTP_200_OK, safe=False)
     else:
         return JsonResponse({'message': 'This operation is not supported'}, status=status.HTTP_204_NO_CONTENT)
 
-def advanced_metrics(request):
-    df = df_sorted_rec_share
-    df2 = df_official_player_stats
-    df2 = df2[['player_id', 'consistency_grade']]
+def _metrics_page(provider, params, format):
+    metrics = provider.advanced_metrics()
+    with timing.stage('query'):
+        query = TableQuery.parse(params, metrics.columns, metrics.columns)
+        keys, total = query.select(metrics)
 
-    df = df[['player_id', 'rec_dom', 'rec_share', 'rec_share_%']]
+    with timing.stage('encode'):
+        page = metrics.loc[keys, query.fields if query.fields is not None else metrics.columns]
+        return encode_frame(page, format, precompress=False), total
 
-    dff = df.set_index('player_id').join(df2.set_index('player_id'), on='player_id', lsuffix='', rsuffix='')
+@conditional_on_data
+async def advanced_metrics(request):
+    if request.method != 'GET':
+        return JsonResponse({'message': 'This operation is not supported'}, status=status.HTTP_204_NO_CONTENT)
+
+    ## ?format=columns sends one array per metric instead of one object per player
+    format = request.GET.get('format', FRAME_FORMATS[0])
+    if format not in FRAME_FORMATS:
+        return JsonResponse({'message': 'format must be one of %s' % ', '.join(FRAME_FORMATS)}, status=status.HTTP_400_BAD_REQUEST)
+
+    provider = request_provider(request)
+    version = (await data_version(request))[0]
+    if set(request.GET) <= {'format'}:
+        ## built and encoded once per data load
+        payloads = provider.ready('metrics_payloads') or await flights.run(('metrics_payloads', version), provider.metrics_payloads)
+        return encoded_response(request, payloads[format])
+
+    ## ?fields=, sort=, limit=, offset=, range filters and exact matches; see query.py
+    key = ('metrics', version, request.GET.urlencode())
+    try:
+        page, total = await flights.run(key, _metrics_page, provider, request.GET, format)
+    except QueryError as e:
+        return JsonResponse({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return paged_response(request, page, total)
+
+@conditional_on_data
+async def stat_leaders(request, stat):
+    ## GET /api/leaders/fantasy_points_ppr/?pos=WR&k=25: the top k players in a stat,
+    ## from rankings built once per data load; see leaders.py
+    if request.method != 'GET':
+        return JsonResponse({'message': 'This operation is not supported'}, status=status.HTTP_204_NO_CONTENT)
+
+    try:
+        k = int(request.GET.get('k', LEADERS_K))
+    except ValueError:
+        return JsonResponse({'message': 'k must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= k <= MAX_LEADERS_K:
+        return JsonResponse({'message': 'k goes from 1 to %d' % MAX_LEADERS_K}, status=status.HTTP_400_BAD_REQUEST)
+    pos = request.GET.get('pos', '').strip().upper() or None
 
-    metrics = dff.to_json(orient='index')
-    metrics = json.loads(metrics)
+    provider = request_provider(request)
+    version = (await data_version(request))[0]
+    boards = provider.ready('leaderboards') or await flights.run(('leaderboards', version), provider.leaderboards)
+    try:
+        with timing.stage('query'):
+            leaders = boards.leaders(stat, pos, k)
+    except QueryError as e:
+        return JsonResponse({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    with timing.stage('encode'):
+        return JsonResponse({'stat': stat, 'position': pos, 'leaders': leaders}, status=status.HTTP_200_OK)
+
+def _graph_source(provider, version, key, names, stats, seasons):
+    ## the image from disk, or else the data to render it from
+    image = graph_cache.load(version, key)
+    if image is not None:
+        return image, None
+    with timing.stage('lookup'):
+        return None, comparison_data(names, stats, seasons, provider)
+
+@conditional_on_data
+async def player_graph(request):
+    ## GET /api/graph/?players=a,b&stats=receiving_yards,targets&format=png|svg&seasons=...
+    if request.method != 'GET':
+        return JsonResponse({'message': 'This operation is not supported'}, status=status.HTTP_204_NO_CONTENT)
+
+    names = list(dict.fromkeys(name.strip() for name in request.GET.get('players', '').split(',') if name.strip()))
+    stats = list(dict.fromkeys(stat.strip() for stat in request.GET.get('stats', '').split(',') if stat.strip()))
+    format = request.GET.get('format', 'png')
+    if not 2 <= len(names) <= MAX_GRAPH_PLAYERS:
+        return JsonResponse({'message': 'Compare 2 to %d players' % MAX_GRAPH_PLAYERS}, status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= len(stats) <= MAX_GRAPH_STATS:
+        return JsonResponse({'message': 'Graph 1 to %d stats' % MAX_GRAPH_STATS}, status=status.HTTP_400_BAD_REQUEST)
+    if format not in CHART_FORMATS:
+        return JsonResponse({'message': 'format must be one of %s' % ', '.join(CHART_FORMATS)}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        seasons = _seasons(request)
+    except QueryError as e:
+        return JsonResponse({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    provider = request_provider(request)
+    version = (await data_version(request))[0]
+    key = (tuple(normalize_name(name) for name in names), tuple(stats), seasons, format)
+    image = graph_cache.lookup(version, key)
+    if image is None:
+        ## rendering happens in another process, so neither the event loop
+        ## nor the view threads wait on it
+        try:
+            image, players = await flights.run(('graph', version, key), _graph_source, provider, version, key, names, stats, seasons)
+        except PlayerNotFound as e:
+            return JsonResponse({'message': 'No player named %s. %s' % (e, NOT_FOUND_MESSAGE)}, status=status.HTTP_404_NOT_FOUND)
+        except QueryError as e:
+            return JsonResponse({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if image is None:
+            with timing.stage('render'):
+                image = await renders.run(('graph', version, key), render_comparison, players, stats, format)
+            await asyncio.get_running_loop().run_in_executor(flights.executor, graph_cache.put, version, key, image)
+    return HttpResponse(image, content_type=CHART_FORMATS[format])
+
+@conditional_on_data
+def export_players(request):
+    ## GET /api/export/?format=csv|ndjson&positions=QB,WR&metrics=1&fields=...
+    ## streams one row per player, formatted a chunk at a time; see export.py
+    if request.method != 'GET':
+        return JsonResponse({'message': 'This operation is not supported'}, status=status.HTTP_204_NO_CONTENT)
 
+    format = request.GET.get('format', 'csv')
+    if format not in EXPORT_FORMATS:
+        return JsonResponse({'message': 'format must be one of %s' % ', '.join(EXPORT_FORMATS)}, status=status.HTTP_400_BAD_REQUEST)
+
+    provider = request_provider(request)
+    available = list(provider.position_payloads())
+    positions = [pos.strip().upper() for pos in request.GET.get('positions', '').split(',') if pos.strip()] or available
+    unknown = [pos for pos in positions if pos not in available]
+    if unknown:
+        return JsonResponse({'message': 'Unknown positions: %s' % ', '.join(unknown)}, status=status.HTTP_400_BAD_REQUEST)
+
+    frames = [(pos, provider.position_frame(pos)) for pos in dict.fromkeys(positions)]
+    metrics = provider.advanced_metrics() if request.GET.get('metrics') in ('1', 'true') else None
+    fields = request.GET.get('fields')
+    try:
+        columns = export_columns(frames, [f.strip() for f in fields.split(',') if f.strip()] if fields else None, metrics)
+    except QueryError as e:
+        return JsonResponse({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    chunks = export_chunks(frames, columns, format, metrics)
+    response = StreamingHttpResponse(iterate(chunks) if isinstance(request, ASGIRequest) else chunks,
+                                     content_type=EXPORT_FORMATS[format])
+    response['Content-Disposition'] = 'attachment; filename="players.%s"' % format
+    return response
+
+## columns of the database-backed lists -> their ORM lookups, and the
+## ones ?column=a,b matches exactly; see TableQuery.apply
+PLAYER_LOOKUPS = dict({name: name for name in ('gsis_id', 'name', 'full_name', 'position', 'team', 'status')},
+                      **{name: 'metrics__' + name for name in METRIC_FIELDS})
+PLAYER_MATCHES = ('gsis_id', 'name', 'position', 'team', 'status', 'consistency_grade')
+WEEK_LOOKUPS = dict({'gsis_id': 'player_id', 'full_name': 'player__full_name', 'position': 'player__position'},
+                    **{name: name for name in PlayerWeekSerializer.Meta.fields if name not in ('gsis_id', 'full_name', 'position')})
+WEEK_MATCHES = ('gsis_id', 'position', 'team', 'season', 'week')
+
+## records sent when the query has no limit=
+TABLE_PAGE_SIZE = 100
+
+def _table_page(queryset, serializer, lookups, matches, params):
+    if params.get('name'):
+        params = params.copy()
+        params['name'] = ','.join(normalize_name(name) for name in params['name'].split(','))
+    with timing.stage('query'):
+        query = TableQuery.parse(params, lookups, matches)
+        if query.limit is None:
+            query.limit = TABLE_PAGE_SIZE
+        page, total = query.apply(queryset, lookups)
+        page = list(page)
+    with timing.stage('encode'):
+        return serializer(page, many=True, fields=query.fields).data, total
+
+def _table_response(request, queryset, serializer, lookups, matches):
+    if request.method != 'GET':
+        return JsonResponse({'message': 'This operation is not supported'}, status=status.HTTP_204_NO_CONTENT)
+    try:
+        page, total = _table_page(queryset, serializer, lookups, matches, request.GET)
+    except QueryError as e:
+        return JsonResponse({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    response = JsonResponse(page, status=status.HTTP_200_OK, safe=False)
+    response['X-Total-Count'] = str(total)
+    return response
+
+def table_players(request):
+    ## GET /api/db/players/?position=WR&team=KC&sort=-target_share: players with
+    ## their season totals and metrics, from the tables load_players fills
+    return _table_response(request, Player.objects.select_related('metrics'), PlayerSerializer,
+                           PLAYER_LOOKUPS, PLAYER_MATCHES)
+
+def table_player_weeks(request):
+    ## GET /api/db/weeks/?season=2023&week=5&position=WR&sort=-fantasy_points_ppr
+    return _table_response(request, PlayerWeek.objects.select_related('player'), PlayerWeekSerializer,
+                           WEEK_LOOKUPS, WEEK_MATCHES)
+
+def _internal(request):
+    ## in development, from INTERNAL_IPS, or a logged-in staff user
+    if settings.DEBUG or request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS:
+        return True
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_staff
+
+def server_stats(request):
+    ## latency percentiles per endpoint, the active data and its load's
+    ## stages, counters for sizing PYBALL_PLAYER_CACHE_SIZE and PYBALL_R_WORKERS,
+    ## and this worker's memory use; they describe the server's internals,
+    ## so only its operators see them
+    if not _internal(request):
+        return JsonResponse({'message': 'Server stats are only available to staff'}, status=status.HTTP_403_FORBIDDEN)
+    provider = snapshots.active()
+    ## only the R backend has worker processes
+    pool = getattr(provider, 'pool', None)
+    stats = {
+        'endpoints': timing.request_stats.snapshot(),
+        'snapshot': snapshots.stats(),
+        'load': provider.timings,
+        'player_cache': player_cache.stats(),
+        'graph_cache': graph_cache.stats(),
+        'r_pool': pool.stats() if pool is not None else None,
+        'single_flight': flights.stats(),
+        'memory': memory.stats(),
+    }
     if request.method == 'GET':
-            return JsonResponse(metrics, status=status.HTTP_200_OK, safe=False, json_dumps_params={"indent": 4})
+        return JsonResponse(stats, status=status.HTTP_200_OK)
     else:
         return JsonResponse({'message': 'This operation is not supported'}, status=status.HTTP_204_NO_CONTENT)
-
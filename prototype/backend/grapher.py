@@ -1,54 +1,106 @@
-import rpy2.robjects as ro
 import pandas as pd
-import json
-from rpy2.robjects import pandas2ri
-from rpy2.robjects.conversion import localconverter
-import matplotlib.pyplot as plt
 import numpy as np
 
+from charts import render_comparison
+from providers import provider
+from query import QueryError
 
-r = ro.r
-r["source"]("ParseNFLPlayers.R")
 
-parse_nfl_player_r = ro.globalenv["get_player_data"]
+class PlayerNotFound(LookupError):
+    """Nobody has the name being graphed."""
 
 
-def get_player_df(name):
+def get_player_df(name, seasons=None, data=provider):
     """Fetches the data and converts it to a dataframe.
 
     Args:
         name (str): Player's name.
-    
+        seasons (iterable[int]): Only these seasons' games, if given.
+        data (DataProvider): Where to look the player up.
+
     Returns:
-        df (pd.DataFrame): Player's data. 
+        df (pd.DataFrame): Player's data, one row per game, with the
+            columns that hold a single value repeated on every row.
+            Empty if nobody has that name.
 
     """
 
-    return pd.json_normalize(
-        json.loads(parse_nfl_player_r(name)[0])
-    )
+    player = data.player_data(name, seasons)
+    if not player:
+        return pd.DataFrame()
+    rows = max(len(values) for values in player.values())
+    return pd.DataFrame({column: values * rows if len(values) == 1 else values
+                         for column, values in player.items()})
+
+
+def comparison_data(names, stats, seasons=None, data=provider):
+    """Collects the games of players to compare.
+
+    Args:
+        names (list[str]): Players' names.
+        stats (list[str]): Statistics to compare.
+        seasons (iterable[int]): Only these seasons' games, if given.
+        data (DataProvider): Where to look the players up.
+
+    Returns:
+        players (list[tuple[str, list[tuple[int, int]], dict[str, list[float]]]]):
+            (full name, (season, week) of each game, stat -> value in
+            each game) per player, games in order. Missing values are NaN.
+
+    Raises:
+        PlayerNotFound: If a name matches nobody.
+        QueryError: If a stat isn't a number any of the players has.
+
+    """
 
+    players = []
+    for name in names:
+        df = get_player_df(name, seasons, data)
+        if df.empty:
+            raise PlayerNotFound(name)
+        if "season" in df and "week" in df:
+            df = df.assign(season=pd.to_numeric(df["season"], errors="coerce"),
+                           week=pd.to_numeric(df["week"], errors="coerce"))
+            df = df.dropna(subset=["season", "week"]).sort_values(["season", "week"], kind="stable")
+            games = list(zip(df["season"].astype(int).tolist(), df["week"].astype(int).tolist()))
+        else:
+            games = [(0, week) for week in range(1, len(df) + 1)]
+
+        values = {}
+        for stat in stats:
+            column = pd.to_numeric(df[stat], errors="coerce") if stat in df else pd.Series(np.nan, index=df.index)
+            values[stat] = column.astype(float).tolist()
+        full_name = df["full_name"].iloc[0] if "full_name" in df and len(df) else name
+        players.append((str(full_name), games, values))
+
+    for stat in stats:
+        if all(np.isnan(values[stat]).all() for _, _, values in players):
+            raise QueryError("None of the players has numbers for '%s'" % stat)
+    return players
+
+
+def make_graph(names, stats, format="png", seasons=None, data=provider):
+    """Creates a graph comparing players' statistics game by game.
 
-def make_graph(name_1, name_2, stats):
-    """Creates a graph based on two players and statistics.
-    
     Args:
-        name_1 (str): Name of the first player.
-        name_2 (str): Name of the second player.
+        names (list[str]): Names of the players, two or more.
         stats (list[str]): Statistics to use.
+        format (str): "png" or "svg".
+        seasons (iterable[int]): Only these seasons' games, if given.
+        data (DataProvider): Where to look the players up.
 
     Returns:
+        image (bytes): The rendered graph. See charts.py.
 
     """
 
-    df_1 = get_player_df(name_1)[["full_name", *stats]]
-    df_2 = get_player_df(name_2)[["full_name", *stats]]
+    return render_comparison(comparison_data(names, stats, seasons, data), stats, format)
 
 
 def main():
     player_df: pd.DataFrame = get_player_df("Patrick Mahomes")
 
-    stats = ["touchdowns"]
+    stats = ["passing_tds"]
     player_df = player_df[["full_name", *stats]]
 
     print(player_df)
@@ -0,0 +1,191 @@
+"""Two-level cache of rendered images.
+
+Rendering a chart takes far longer than looking its data up, and the
+same comparisons (the week's top receivers, say) are asked for again and
+again. `ImageCache` keeps recently served images in memory (see
+`ResponseCache`) and writes every image it renders to disk, where it
+survives restarts and is shared by the server's workers. Both levels
+evict the least recently used images once full, so images of data that
+is no longer served age out.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+
+class DiskCache:
+    """LRU cache of files, bounded by their total size.
+
+    Files live in a directory per data version, and the files of every
+    version share one least-recently-used order: while a new snapshot is
+    swapped in, workers still serving the old one keep their files, which
+    go first once nobody reads them. A version's directory is removed
+    with its last file. Several processes may share the directory: each
+    tracks the files it has seen, and a file another process evicted is
+    just a miss.
+
+    Args:
+        path (str): Cache directory.
+        maxbytes (int): Most bytes kept. 0 disables the cache.
+
+    """
+
+    def __init__(self, path, maxbytes=256 * 1024 * 1024):
+        self.path = path
+        self.maxbytes = maxbytes
+        self._lock = threading.Lock()
+        ## (version, file name) -> size, least recently used first
+        self._files = OrderedDict()
+        self._size = 0
+        self._scanned = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _name(key):
+        return hashlib.sha1(repr(key).encode()).hexdigest()
+
+    def _scan(self):
+        ## called with the lock held: files written by earlier runs or
+        ## other workers, oldest first
+        if self._scanned:
+            return
+        self._scanned = True
+        entries = []
+        try:
+            for directory in os.scandir(self.path):
+                if directory.is_dir():
+                    for entry in os.scandir(directory.path):
+                        if not entry.name.endswith(".tmp"):
+                            stat = entry.stat()
+                            entries.append((stat.st_mtime, directory.name, entry.name, stat.st_size))
+        except OSError:
+            pass
+        for _, version, name, size in sorted(entries):
+            self._files[version, name] = size
+            self._size += size
+
+    def get(self, version, key):
+        """Returns the cached bytes for a key, or None on a miss."""
+
+        if not self.maxbytes:
+            return None
+        name = self._name(key)
+        target = os.path.join(self.path, version, name)
+        with self._lock:
+            self._scan()
+        try:
+            with open(target, "rb") as f:
+                data = f.read()
+            os.utime(target)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+                self._size -= self._files.pop((version, name), 0)
+            return None
+        with self._lock:
+            self.hits += 1
+            self._size += len(data) - self._files.pop((version, name), 0)
+            self._files[version, name] = len(data)
+        return data
+
+    def put(self, version, key, data):
+        """Writes bytes for a key, evicting the least recently used files."""
+
+        if not self.maxbytes or len(data) > self.maxbytes:
+            return
+        name = self._name(key)
+        directory = os.path.join(self.path, version)
+        with self._lock:
+            self._scan()
+            try:
+                os.makedirs(directory, exist_ok=True)
+                target = os.path.join(directory, name)
+                with open(target + ".tmp", "wb") as f:
+                    f.write(data)
+                os.replace(target + ".tmp", target)
+            except OSError:
+                logger.exception("Writing %s to the image cache failed", name)
+                return
+            self._size += len(data) - self._files.pop((version, name), 0)
+            self._files[version, name] = len(data)
+            while self._size > self.maxbytes:
+                (old_version, old), size = self._files.popitem(last=False)
+                self._size -= size
+                self.evictions += 1
+                try:
+                    os.remove(os.path.join(self.path, old_version, old))
+                    if old_version != version:
+                        ## fails unless that was the version's last file
+                        os.rmdir(os.path.join(self.path, old_version))
+                except OSError:
+                    pass
+
+    def stats(self):
+        """Returns the cache's `files`, `bytes`, `maxbytes`, `hits`, `misses` and `evictions`."""
+
+        with self._lock:
+            return {
+                "files": len(self._files),
+                "bytes": self._size,
+                "maxbytes": self.maxbytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class ImageCache:
+    """Rendered images in memory, backed by a `DiskCache`.
+
+    Args:
+        path (str | None): Directory for the disk level, or None for
+            memory only.
+        maxsize (int): Most images kept in memory.
+        maxbytes (int): Most bytes kept on disk.
+
+    """
+
+    def __init__(self, path=None, maxsize=256, maxbytes=256 * 1024 * 1024):
+        self.memory = ResponseCache(maxsize)
+        self.disk = DiskCache(path, maxbytes) if path else None
+
+    def lookup(self, version, key):
+        """Returns an image cached in memory, or None. Never blocks on disk."""
+        return self.memory.lookup(version, key)
+
+    def load(self, version, key):
+        """Returns an image cached on disk, or None, keeping it in memory too.
+
+        For after a `lookup` miss; reads the disk, so call it off the event loop.
+        """
+
+        image = self.disk.get(version, key) if self.disk is not None else None
+        if image is not None:
+            self.memory.put(version, key, image)
+        return image
+
+    def put(self, version, key, image):
+        """Caches a newly rendered image at both levels.
+
+        Returns:
+            image (bytes): `image`, for chaining.
+
+        """
+
+        self.memory.put(version, key, image)
+        if self.disk is not None:
+            self.disk.put(version, key, image)
+        return image
+
+    def stats(self):
+        """Returns the counters of both levels."""
+        return {"memory": self.memory.stats(), "disk": self.disk.stats() if self.disk is not None else None}
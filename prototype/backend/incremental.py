@@ -0,0 +1,356 @@
+"""Folds a new week of data into an existing snapshot.
+
+`ReloadData.R` rebuilds everything from the full play-by-play history
+every week, and exporting a snapshot re-derives every table from it.
+During the season only the latest week changes, so this refreshes a
+snapshot from just that week's rows instead:
+
+    python incremental.py --snapshot snapshot --weekly week.arrow \\
+        --all-data week_all_data.arrow --out snapshot
+
+`--weekly` has the new `official_player_stats` rows and `--all-data` the
+matching `all_data` rows, as Arrow/Feather files (`arrow::write_feather`
+in R). The season totals, the running aggregates behind the consistency
+grades (see `ConsistencyGrade.merge_counts`) and the team passing totals
+behind the receiver shares are updated from the new rows, and only the
+players in them get new position payloads and weekly trends. Tables the
+week doesn't touch are linked into the new snapshot, not rewritten.
+
+Roster changes (signings, new positions) still need a full reload.
+"""
+
+import argparse
+import datetime
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+
+import encoded
+import snapshot
+from compact import concat_compact
+from encoded import EncodedPayload
+from player_index import PlayerIndex
+from ConsistencyGrade import good_game_counts, merge_counts
+from ReceiverShare import TEAM_TOTAL_COLUMNS, team_passing_totals
+from trends import GAME_COLUMNS, weekly_trends
+
+## weekly columns that aren't season stats
+NOT_SUMMED = {"player_id", "season", "week", "games"}
+
+## season totals that are averages over the games, not sums
+RATIO_COLUMNS = ["target_share", "air_yards_share", "wopr", "racr", "pacr", "dakota"]
+
+## tables refreshed from the new week; the rest carry over as they are
+REFRESHED = (["weekly_stats", "official_player_stats", "all_data", "positions"]
+             + snapshot.STATE_TABLES + snapshot.DERIVED_TABLES)
+
+
+def update_season_totals(totals, weekly):
+    """Adds new weekly rows to the season totals.
+
+    Stats add up and `games` counts the new rows. Averages (see
+    `RATIO_COLUMNS`) are updated as running means weighted by the games
+    that have a value, and text columns such as `recent_team` take the
+    player's latest value. Players without totals yet are appended.
+
+    Args:
+        totals (pd.DataFrame): Season totals, one row per `player_id`.
+        weekly (pd.DataFrame): The new weekly rows.
+
+    Returns:
+        totals (pd.DataFrame): Updated copy, same columns and dtypes.
+
+    """
+
+    grouped = weekly.groupby("player_id", sort=False)
+    games = grouped.size()
+
+    df = totals.set_index("player_id")
+    index = df.index.append(games.index.difference(df.index, sort=False))
+    df = df.reindex(index)
+    rows = games.index
+
+    summed = [c for c in df.columns if c in weekly.columns and c not in NOT_SUMMED
+              and c not in RATIO_COLUMNS and pd.api.types.is_numeric_dtype(weekly[c])]
+    ratios = [c for c in RATIO_COLUMNS if c in df.columns and c in weekly.columns]
+    latest = [c for c in df.columns if c in weekly.columns and c not in NOT_SUMMED
+              and c not in summed and c not in ratios]
+
+    old_games = df.loc[rows, "games"].fillna(0)
+    if ratios:
+        old = df.loc[rows, ratios]
+        old_weight = old.notna().mul(old_games, axis=0)
+        weight = old_weight + grouped[ratios].count()
+        total = old.fillna(0).mul(old_weight) + grouped[ratios].sum()
+        df.loc[rows, ratios] = total.div(weight.where(weight > 0))
+    df.loc[rows, summed] = df.loc[rows, summed].fillna(0) + grouped[summed].sum()
+    df.loc[rows, "games"] = old_games + games
+    if latest:
+        df.loc[rows, latest] = grouped[latest].last()
+
+    df = df.reset_index()[totals.columns]
+    return df.astype({c: totals[c].dtype for c in summed + ["games"]})
+
+
+def update_team_totals(team_totals, before, after):
+    """Moves the changed players' passing stats between team totals.
+
+    Args:
+        team_totals (pd.DataFrame): Output of `team_passing_totals`.
+        before (pd.DataFrame): Changed players' season totals before the
+            new week (none for new players).
+        after (pd.DataFrame): The same players' totals after it.
+
+    Returns:
+        team_totals (pd.DataFrame): Updated copy.
+
+    """
+
+    removed = team_passing_totals(before)
+    added = team_passing_totals(after)
+    index = team_totals.index.append(added.index.difference(team_totals.index, sort=False))
+    updated = (team_totals.reindex(index, fill_value=0)
+               .sub(removed.reindex(index, fill_value=0))
+               .add(added.reindex(index, fill_value=0)))
+    return updated.astype(team_totals.dtypes.to_dict())
+
+
+def player_keys(table):
+    """Returns each row's (`gsis_id`, `name`) key, which `PlayerIndex` groups by."""
+    return pc.binary_join_element_wise(pc.cast(table.column("gsis_id"), pa.string()),
+                                       pc.cast(table.column("name"), pa.string()), "\0")
+
+
+def append_player_rows(all_data, rows):
+    """Appends rows to a grouped `all_data` table, keeping it grouped.
+
+    Each new row goes after the last row of its player; players new to the
+    table go at the end, in order of first appearance.
+
+    Args:
+        all_data (pa.Table): `all_data` with each player's rows contiguous.
+        rows (pa.Table): New rows, with the same columns.
+
+    Returns:
+        table (pa.Table): The combined table, compacted like an export.
+
+    """
+
+    keys = pc.dictionary_encode(player_keys(all_data)).combine_chunks()
+    codes = keys.indices.to_numpy()
+
+    new_keys = player_keys(rows)
+    new_codes = pc.index_in(new_keys, value_set=keys.dictionary).to_numpy(zero_copy_only=False)
+    unknown = np.isnan(new_codes)
+    if unknown.any():
+        ## number new players by first appearance, after the existing ones
+        first_seen, _ = pd.factorize(new_keys.to_numpy(zero_copy_only=False)[unknown])
+        new_codes[unknown] = len(keys.dictionary) + first_seen
+
+    combined = concat_compact([all_data, rows.select(all_data.column_names)])
+    order = np.argsort(np.r_[codes, new_codes.astype(codes.dtype)], kind="stable")
+    return combined.take(pa.array(order))
+
+
+def player_payloads(all_data, names):
+    """Rebuilds the lookup result of a few players.
+
+    Args:
+        all_data (pa.Table): Grouped `all_data` table.
+        names (set[str]): Normalized names to look up.
+
+    Returns:
+        payloads (dict[str, dict[str, list]]): Name -> what `get_player_data`
+            returns for it.
+
+    """
+
+    rows = all_data.filter(pc.is_in(all_data.column("name"), value_set=pa.array(sorted(names))))
+    index = PlayerIndex(rows)
+    ## like R, a shared name resolves to whoever comes first
+    payloads = {}
+    for name in names:
+        players = index.players(name)
+        if players:
+            payloads[name] = index.payload(players[0])
+    return payloads
+
+
+def update_positions(positions, payloads):
+    """Replaces the changed players in each position's JSON.
+
+    Args:
+        positions (dict[str, EncodedPayload]): Position -> its payload,
+            see `snapshot.read_positions`.
+        payloads (dict[str, dict]): Normalized name -> new player data.
+
+    Returns:
+        positions (dict[str, EncodedPayload]): Updated copy. Positions
+            without any of the players keep their payload, compressed
+            copies included.
+
+    """
+
+    updated = {}
+    for pos, payload in positions.items():
+        records = encoded.loads(payload.body)
+        changed = [key for key in records if snapshot.normalize_name(key) in payloads]
+        for key in changed:
+            records[key] = payloads[snapshot.normalize_name(key)]
+        updated[pos] = EncodedPayload.from_object(records) if changed else payload
+    return updated
+
+
+def carry_over(path, out, name):
+    """Links an unchanged table into the new snapshot, copying if it can't."""
+
+    source = os.path.join(path, name + ".arrow")
+    target = os.path.join(out, name + ".arrow")
+    if os.path.exists(target):
+        if os.path.samefile(source, target):
+            return
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def refresh_snapshot(path, out, weekly, all_data):
+    """Writes a snapshot with one more week of data.
+
+    Args:
+        path (str): Snapshot directory to start from.
+        out (str): Directory to write to; may be `path` itself, since
+            tables are replaced by renaming.
+        weekly (pd.DataFrame): The week's `official_player_stats` rows.
+        all_data (pd.DataFrame | pa.Table): The week's `all_data` rows.
+
+    Returns:
+        timings (dict[str, float]): Seconds spent in each stage.
+
+    """
+
+    timings = {}
+
+    @contextmanager
+    def stage(name):
+        start = time.perf_counter()
+        yield
+        timings[name] = time.perf_counter() - start
+
+    os.makedirs(out, exist_ok=True)
+    manifest = snapshot.read_manifest(path)
+
+    with stage("weekly_stats"):
+        history = snapshot.read_table(path, "weekly_stats")
+        week = pa.Table.from_pandas(weekly, preserve_index=False).select(history.column_names).cast(history.schema)
+        games = pa.concat_tables([history, week])
+        snapshot.write_table(out, "weekly_stats", games)
+
+    with stage("official_player_stats"):
+        totals = snapshot.read_table(path, "official_player_stats").to_pandas()
+        updated = update_season_totals(totals, weekly)
+        snapshot.write_table(out, "official_player_stats", updated)
+
+    with stage("team_totals"):
+        if snapshot.has_table(path, "team_totals"):
+            team_totals = snapshot.read_table(path, "team_totals").to_pandas().set_index("recent_team")
+        else:
+            team_totals = team_passing_totals(totals)
+        team_totals = update_team_totals(team_totals,
+                                         totals[totals["player_id"].isin(weekly["player_id"])],
+                                         updated[updated["player_id"].isin(weekly["player_id"])])
+        snapshot.write_table(out, "team_totals", team_totals[TEAM_TOTAL_COLUMNS].reset_index())
+
+    with stage("consistency_state"):
+        if snapshot.has_table(path, "consistency_state"):
+            counts = snapshot.read_table(path, "consistency_state").to_pandas().set_index("player_name")
+        else:
+            counts = good_game_counts(history.to_pandas())
+        snapshot.write_table(out, "consistency_state",
+                             merge_counts(counts, good_game_counts(weekly)).reset_index())
+
+    with stage("weekly_trends"):
+        if snapshot.has_table(path, "weekly_trends"):
+            ## only the players in the new week have new trends
+            played = pa.array(weekly["player_id"].dropna().astype(str).unique().tolist(), pa.string())
+            trends = snapshot.read_table(path, "weekly_trends")
+            kept = trends.filter(pc.invert(pc.is_in(pc.cast(trends.column("player_id"), pa.string()),
+                                                    value_set=played)))
+            rows = games.filter(pc.is_in(pc.cast(games.column("player_id"), pa.string()), value_set=played))
+            fresh = pa.Table.from_pandas(weekly_trends(rows.to_pandas()), preserve_index=False).cast(trends.schema)
+            trends = pa.concat_tables([kept, fresh]).sort_by([(name, "ascending") for name in GAME_COLUMNS])
+        else:
+            trends = weekly_trends(games.to_pandas())
+        snapshot.write_table(out, "weekly_trends", trends)
+
+    with stage("all_data"):
+        rows = all_data if isinstance(all_data, pa.Table) else pa.Table.from_pandas(all_data, preserve_index=False)
+        if "name" not in rows.column_names:
+            rows = rows.append_column("name", pa.array(
+                [snapshot.normalize_name(n) for n in rows.column("full_name").to_pylist()], pa.string()))
+        grouped = append_player_rows(snapshot.read_table(path, "all_data"), rows)
+        snapshot.write_table(out, "all_data", grouped)
+
+    partitions = manifest.get("partitions", {}).get("all_data")
+    touched = set()
+    if partitions is not None:
+        with stage("all_data_partitions"):
+            ## only the new week's season is rewritten
+            for season, part in snapshot.split_partitions(rows).items():
+                name = snapshot.partition_name("all_data", season)
+                base = snapshot.read_table(path, name) if season in partitions else grouped.schema.empty_table()
+                snapshot.write_table(out, name, append_player_rows(base, part))
+                touched.add(season)
+            partitions = sorted(set(partitions) | touched)
+
+    with stage("positions"):
+        names = set(pc.unique(rows.column("name")).to_pylist())
+        positions = update_positions(snapshot.read_positions(snapshot.read_table(path, "positions")),
+                                     player_payloads(grouped, names))
+        snapshot.write_table(out, "positions", snapshot.positions_frame(positions))
+
+    with stage("carry_over"):
+        tables = list(dict.fromkeys(manifest["tables"] + REFRESHED))
+        for name in tables:
+            if name not in REFRESHED and snapshot.has_table(path, name):
+                carry_over(path, out, name)
+        for season in set(partitions or ()) - touched:
+            carry_over(path, out, snapshot.partition_name("all_data", season))
+
+    seasons = weekly[["season", "week"]].drop_duplicates().to_dict("records") if "season" in weekly else []
+    snapshot.write_manifest(out, dict(
+        manifest,
+        created=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        tables=tables,
+        **({"partitions": dict(manifest["partitions"], all_data=partitions)} if partitions is not None else {}),
+        incremental={"base": manifest.get("incremental", {}).get("base", manifest["created"]),
+                     "weeks": manifest.get("incremental", {}).get("weeks", []) + seasons},
+    ))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fold a new week of data into an Arrow snapshot.")
+    parser.add_argument("--snapshot", default="snapshot", help="snapshot to start from")
+    parser.add_argument("--weekly", required=True, help="new official_player_stats rows (Arrow/Feather)")
+    parser.add_argument("--all-data", required=True, help="new all_data rows (Arrow/Feather)")
+    parser.add_argument("--out", help="snapshot directory to write (default: --snapshot)")
+    args = parser.parse_args()
+
+    timings = refresh_snapshot(args.snapshot, args.out or args.snapshot,
+                               feather.read_table(args.weekly).to_pandas(), feather.read_table(args.all_data))
+    for stage, seconds in timings.items():
+        print("%-40s %8.3fs" % (stage, seconds))
+
+
+if __name__ == "__main__":
+    main()
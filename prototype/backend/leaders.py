@@ -0,0 +1,179 @@
+"""Top players by a stat, at a position or across all of them.
+
+Sorting a position's players on every leaderboard request would repeat
+the same full sort over and over, for data that only changes when a new
+snapshot is loaded. `Leaderboards` ranks the players on each of
+`LEADER_STATS` once per data load, for each position and for all of
+them together, and keeps the row numbers of the players in rank order.
+A request for the top k is then a slice of k rows. Other stats are
+ranked on demand by partial selection, which finds the top k without
+sorting the rest.
+
+Players are ranked on their totals over their games, or per-game
+averages for rates such as `target_share`, as `/api/position/` sorts
+them (see `query.records_frame`), and on the metrics of
+`DataProvider.advanced_metrics` joined on by gsis id.
+"""
+
+import numpy as np
+import pandas as pd
+
+from query import LATEST_COLUMNS, QueryError
+
+## stats ranked when the data is loaded; any other number is ranked on demand
+LEADER_STATS = [
+    "fantasy_points_ppr", "fantasy_points",
+    "passing_yards", "passing_tds",
+    "rushing_yards", "rushing_tds", "carries",
+    "receiving_yards", "receiving_tds", "receptions", "targets", "target_share",
+    "rec_share", "rec_dom",
+]
+
+## columns of `DataProvider.advanced_metrics` that can be ranked
+METRIC_STATS = ["rec_share", "rec_dom"]
+
+## columns sent with each leader
+PLAYER_COLUMNS = ["gsis_id", "full_name", "team"]
+
+
+def rank_order(values):
+    """Ranks every number, largest first.
+
+    Args:
+        values (np.ndarray[float]): One value per row.
+
+    Returns:
+        rows (np.ndarray[int]): Row numbers of the values that aren't
+            NaN, largest value first. Ties keep their row order.
+
+    """
+
+    present = np.flatnonzero(~np.isnan(values))
+    return present[np.argsort(-values[present], kind="stable")]
+
+
+def top_rows(values, k):
+    """Finds the k largest numbers without sorting the rest.
+
+    Gives the same rows as `rank_order(values)[:k]`, ties included, in
+    O(n + k log k) instead of O(n log n).
+
+    Args:
+        values (np.ndarray[float]): One value per row.
+        k (int): Number of rows wanted.
+
+    Returns:
+        rows (np.ndarray[int]): Row numbers of the k largest values,
+            largest first, ties in row order.
+
+    """
+
+    present = np.flatnonzero(~np.isnan(values))
+    if k <= 0:
+        return present[:0]
+    if k < len(present):
+        ## the k-th largest value; everything above it is in, and ties
+        ## with it fill the remaining places in row order
+        kth = -np.partition(-values[present], k - 1)[k - 1]
+        above = present[values[present] > kth]
+        tied = present[values[present] == kth]
+        present = np.concatenate([above, tied[:k - len(above)]])
+    return present[np.lexsort((present, -values[present]))]
+
+
+class Leaderboards:
+    """Players ranked on each stat, per position and overall.
+
+    Args:
+        frames (list[tuple[str, pd.DataFrame]]): (position, frame) pairs,
+            from `DataProvider.position_frame`.
+        metrics (pd.DataFrame | None): `DataProvider.advanced_metrics`,
+            indexed by gsis id.
+        stats (list[str]): Stats to rank up front, if the players have them.
+
+    """
+
+    def __init__(self, frames, metrics=None, stats=LEADER_STATS):
+        self.positions = {}
+        players = []
+        start = 0
+        for pos, frame in frames:
+            self.positions[pos] = slice(start, start + len(frame))
+            start += len(frame)
+            players.append(frame.reindex(columns=PLAYER_COLUMNS).assign(position=pos))
+        players = pd.concat(players) if players else pd.DataFrame(columns=PLAYER_COLUMNS + ["position"])
+        self.players = players.astype(object).where(players.notna(), None)
+
+        ## one array per numeric column, NaN where a position lacks it;
+        ## the latest game's season and week aren't stats
+        self.values = {}
+        for _, frame in frames:
+            for name in frame.columns:
+                if name not in self.values and name not in LATEST_COLUMNS and pd.api.types.is_float_dtype(frame[name]):
+                    self.values[name] = np.concatenate([
+                        other[name].to_numpy(dtype=float) if name in other else np.full(len(other), np.nan)
+                        for _, other in frames
+                    ])
+        if metrics is not None and len(self.players):
+            joined = metrics.reindex(self.players["gsis_id"].to_numpy())
+            for name in METRIC_STATS:
+                if name in joined:
+                    self.values[name] = joined[name].to_numpy(dtype=float)
+
+        ## (position or None for all of them, stat) -> rows in rank order
+        self._ranks = {}
+        for stat in stats:
+            if stat in self.values:
+                self._ranks[None, stat] = rank_order(self.values[stat])
+                for pos, rows in self.positions.items():
+                    self._ranks[pos, stat] = rank_order(self.values[stat][rows]) + rows.start
+
+    def top(self, stat, pos=None, k=10):
+        """Finds the leaders in a stat.
+
+        Args:
+            stat (str): A numeric column of the players, or a metric.
+            pos (str | None): Position abbreviation, or None for everybody.
+            k (int): Most players returned.
+
+        Returns:
+            rows (np.ndarray[int]): Rows of `players`, best first. Players
+                without a number for the stat are left out.
+
+        Raises:
+            QueryError: If the stat or the position is unknown.
+
+        """
+
+        if stat not in self.values:
+            raise QueryError("'%s' isn't a stat the players have" % stat)
+        rows = slice(None) if pos is None else self.positions.get(pos)
+        if rows is None:
+            raise QueryError("Unknown position '%s'" % pos)
+
+        ranked = self._ranks.get((pos, stat))
+        if ranked is not None:
+            return ranked[:k]
+        return top_rows(self.values[stat][rows], k) + (rows.start or 0)
+
+    def leaders(self, stat, pos=None, k=10):
+        """Returns the leaders in a stat, ready to be sent.
+
+        Args:
+            stat (str): See `top`.
+            pos (str | None): See `top`.
+            k (int): See `top`.
+
+        Returns:
+            leaders (list[dict]): `rank`, `PLAYER_COLUMNS`, `position` and
+                the stat of each leader, best first.
+
+        Raises:
+            QueryError: If the stat or the position is unknown.
+
+        """
+
+        rows = self.top(stat, pos, k)
+        players = self.players.iloc[rows].to_dict("records")
+        return [{"rank": rank, **player, stat: value}
+                for rank, (player, value) in enumerate(zip(players, self.values[stat][rows].tolist()), 1)]
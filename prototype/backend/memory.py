@@ -0,0 +1,83 @@
+"""Per-process memory use.
+
+gunicorn and uvicorn serve from several worker processes. Each one that
+loads the data itself holds its own copy, and RSS alone can't tell that
+apart from pages shared with the other workers. On Linux
+`process_memory` also reads the proportional set size (PSS), which
+splits shared pages between the processes sharing them, so summing PSS
+over the workers gives the memory they really use.
+
+`checkpoint` records memory use at points of interest, e.g. before and
+after `providers.preload`; they are served with the current use at
+`/api/_stats/`.
+"""
+
+import os
+import resource
+import sys
+
+## smaps_rollup line -> key in `process_memory`
+_SMAPS_FIELDS = {
+    "Rss": "rss",
+    "Pss": "pss",
+    "Shared_Clean": "shared",
+    "Shared_Dirty": "shared",
+    "Private_Clean": "private",
+    "Private_Dirty": "private",
+}
+
+checkpoints = {}
+
+
+def process_memory(pid="self"):
+    """Returns the memory a process uses, in bytes.
+
+    Args:
+        pid (int | str): Process id, this process by default.
+
+    Returns:
+        memory (dict[str, int]): `rss`, `pss`, and the `shared` and
+            `private` parts of the RSS, on Linux. Elsewhere, only this
+            process's `max_rss`, its peak RSS so far.
+
+    """
+
+    try:
+        with open("/proc/%s/smaps_rollup" % pid) as f:
+            lines = f.read().splitlines()
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        ## kilobytes on Linux, bytes on macOS
+        return {"max_rss": peak if sys.platform == "darwin" else peak * 1024}
+
+    memory = dict.fromkeys(_SMAPS_FIELDS.values(), 0)
+    for line in lines:
+        field, _, value = line.partition(":")
+        if field in _SMAPS_FIELDS:
+            memory[_SMAPS_FIELDS[field]] += int(value.split()[0]) * 1024
+    return memory
+
+
+def checkpoint(label):
+    """Records this process's memory use under a label.
+
+    Args:
+        label (str): What just happened, e.g. "before_preload".
+
+    Returns:
+        memory (dict[str, int]): What `process_memory` returned, plus the `pid`.
+
+    """
+
+    checkpoints[label] = dict(process_memory(), pid=os.getpid())
+    return checkpoints[label]
+
+
+def stats():
+    """Returns this process's id, current memory use and checkpoints.
+
+    Checkpoints recorded before the server forked its workers carry the
+    parent's `pid`.
+    """
+
+    return {"pid": os.getpid(), "current": process_memory(), "checkpoints": checkpoints}
@@ -0,0 +1,163 @@
+"""In-memory index for looking players up by name.
+
+`get_player_data` in ParseNFLPlayers.R filters all of `all_data` on every
+call. `PlayerIndex` does that work once: it maps each normalized name to
+the players who have it, each player to the contiguous range of their
+rows, and records which columns are constant for each player, so a
+lookup is a dict access and a table slice.
+"""
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from compact import concat_compact
+from snapshot import normalize_name, player_payload
+
+
+def _same_as_first(column, starts, lengths):
+    """Returns, per row, whether a column matches its group's first row.
+
+    Missing values match each other, like `n_distinct` counting NA once.
+    """
+
+    column = column.combine_chunks() if isinstance(column, pa.ChunkedArray) else column
+    if pa.types.is_null(column.type):
+        return np.ones(len(column), dtype=bool)
+    if pa.types.is_dictionary(column.type):
+        column = column.cast(column.type.value_type)
+    first = column.take(pa.array(np.repeat(starts, lengths)))
+    same = pc.fill_null(pc.equal(column, first), False)
+    both_missing = pc.and_(pc.is_null(column, nan_is_null=True), pc.is_null(first, nan_is_null=True))
+    return pc.or_(same, both_missing).to_numpy(zero_copy_only=False)
+
+
+class PlayerIndex:
+    """Name -> player -> rows index over the `all_data` table.
+
+    Args:
+        all_data (pa.Table): `all_data` with a `name` column. Rows are
+            regrouped (copying the table) if a player's rows aren't
+            already contiguous; exported snapshots already are.
+
+    """
+
+    def __init__(self, all_data):
+        keys = pc.binary_join_element_wise(
+            pc.cast(all_data.column("gsis_id"), pa.string()),
+            pc.cast(all_data.column("name"), pa.string()), "\0")
+        codes = pc.dictionary_encode(keys).combine_chunks().indices.to_numpy()
+        if len(codes) and np.any(np.diff(codes) < 0):
+            order = np.argsort(codes, kind="stable")
+            all_data = all_data.take(pa.array(order))
+            codes = codes[order]
+
+        self.table = all_data
+        self.starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.array([], dtype=int)
+        self.lengths = np.diff(np.r_[self.starts, len(codes)])
+
+        self.gsis_ids = pc.cast(all_data.column("gsis_id"), pa.string()).take(pa.array(self.starts)).to_pylist()
+        names = pc.cast(all_data.column("name"), pa.string()).take(pa.array(self.starts)).to_pylist()
+
+        ## players sharing a name are kept in order of first appearance
+        self._by_name = {}
+        for player, name in enumerate(names):
+            self._by_name.setdefault(name, []).append(player)
+
+        ## constant[player, column]: the column holds one value for the player
+        self.constant = np.empty((len(self.starts), all_data.num_columns), dtype=bool)
+        for i, name in enumerate(all_data.column_names):
+            same = _same_as_first(all_data.column(name), self.starts, self.lengths)
+            self.constant[:, i] = np.logical_and.reduceat(same, self.starts) if len(same) else True
+
+    def __len__(self):
+        return len(self.starts)
+
+    def players(self, name):
+        """Returns every player with a given name.
+
+        Args:
+            name (str): Player's name as typed.
+
+        Returns:
+            players (list[int]): Player numbers, first appearance first.
+
+        """
+
+        return self._by_name.get(normalize_name(name), [])
+
+    def rows(self, player):
+        """Returns all of one player's rows.
+
+        Args:
+            player (int): Player number.
+
+        Returns:
+            table (pa.Table): Zero-copy slice of the indexed table.
+
+        """
+
+        return self.table.slice(self.starts[player], self.lengths[player])
+
+    def payload(self, player):
+        """Returns one player's data in the `get_player_data` shape.
+
+        Args:
+            player (int): Player number.
+
+        Returns:
+            payload (dict[str, list]): Column name -> values.
+
+        """
+
+        return player_payload(self.rows(player), self.constant[player])
+
+    def lookup(self, name):
+        """Looks a player up by name.
+
+        Like R, a shared name (two Mike Williamses) resolves to whoever
+        appears first in `all_data`; see `players` for all of them.
+
+        Args:
+            name (str): Player's name as typed.
+
+        Returns:
+            payload (dict[str, list] | list): The player's data, or an empty
+                list if nobody has that name.
+
+        """
+
+        players = self.players(name)
+        return self.payload(players[0]) if players else []
+
+
+def lookup_across(indexes, name):
+    """Looks a player up in several indexes, e.g. one per season.
+
+    Like `PlayerIndex.lookup`, a shared name resolves to the first player
+    with it, here in the first index that has the name. That player's
+    rows from every index are combined into one payload.
+
+    Args:
+        indexes (list[PlayerIndex]): Indexes over parts of `all_data`
+            with the same columns, earliest first.
+        name (str): Player's name as typed.
+
+    Returns:
+        payload (dict[str, list] | list): The player's data, or an empty
+            list if nobody has that name in any of the indexes.
+
+    """
+
+    found = [(index, index.players(name)) for index in indexes]
+    gsis = next((index.gsis_ids[players[0]] for index, players in found if players), None)
+    if gsis is None:
+        return []
+
+    matches = [(index, player) for index, players in found
+               for player in players if index.gsis_ids[player] == gsis]
+    if len(matches) == 1:
+        index, player = matches[0]
+        return index.payload(player)
+    ## seasons may be compacted differently, e.g. a column all NA in one of them
+    return player_payload(concat_compact([index.rows(player) for index, player in matches]))
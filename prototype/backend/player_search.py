@@ -0,0 +1,137 @@
+"""Prefix and fuzzy player name search for autocomplete.
+
+`PlayerSearch` is built once from a `PlayerIndex`. A trie over every
+word-start of each name answers prefix queries ("mah" -> Patrick
+Mahomes); each trie node keeps its most relevant players, so a prefix
+lookup costs one step per typed character. When the prefix finds no
+players, a trigram index catches typos ("mahommes").
+"""
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from snapshot import normalize_name
+
+## players kept at each trie node; the most a search can return
+MAX_RESULTS = 50
+
+## fewest shared trigrams, relative to the union, for a fuzzy match
+MIN_SIMILARITY = 0.3
+
+
+def trigrams(text):
+    """Returns the set of trigrams of a normalized name, padded at the ends."""
+
+    padded = "  %s " % text
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _first_values(index, column):
+    """Returns a column's value on each player's first row, or None if missing."""
+
+    if column not in index.table.column_names:
+        return [None] * len(index)
+    return pc.cast(index.table.column(column), pa.string()).take(pa.array(index.starts)).to_pylist()
+
+
+class PlayerSearch:
+    """Trie plus trigram index over player names.
+
+    Args:
+        index (PlayerIndex): Index to draw the players from.
+        score_column (str): Column summed per player to rank players with
+            the same relevance, so the stars come first.
+
+    """
+
+    def __init__(self, index, score_column="fantasy_points_ppr"):
+        self.names = _first_values(index, "full_name")
+        self.normalized = [normalize_name(n or "") for n in self.names]
+        self.positions = _first_values(index, "position")
+        self.teams = _first_values(index, "team")
+        self.gsis_ids = index.gsis_ids
+
+        if score_column in index.table.column_names:
+            scores = pc.fill_null(pc.cast(index.table.column(score_column), pa.float64()), 0)
+            totals = np.add.reduceat(scores.to_numpy(), index.starts) if len(index) else []
+        else:
+            totals = index.lengths
+        order = sorted(range(len(self.names)), key=lambda p: -totals[p])
+
+        ## each node is {char: child}; the "" key holds the node's players
+        self._exact = {}
+        self._trie = {"": []}
+        self._trigrams = {}
+        self._gram_counts = np.array([len(trigrams(name)) for name in self.normalized])
+        for player in order:
+            name = self.normalized[player]
+            self._exact.setdefault(name, []).append(player)
+            words = name.split()
+            for start in range(len(words)):
+                self._insert(" ".join(words[start:]), player)
+            for gram in trigrams(name):
+                self._trigrams.setdefault(gram, []).append(player)
+        self._trigrams = {gram: np.array(players) for gram, players in self._trigrams.items()}
+
+    def _insert(self, key, player):
+        node = self._trie
+        for char in key:
+            node = node.setdefault(char, {"": []})
+            top = node[""]
+            if len(top) < MAX_RESULTS and (not top or top[-1] != player):
+                top.append(player)
+
+    def _prefix(self, query):
+        node = self._trie
+        for char in query:
+            node = node.get(char)
+            if node is None:
+                return []
+        return node[""]
+
+    def _fuzzy(self, query):
+        grams = trigrams(query)
+        postings = [self._trigrams[gram] for gram in grams if gram in self._trigrams]
+        if not postings:
+            return []
+        shared = np.bincount(np.concatenate(postings), minlength=len(self.names))
+        similarity = shared / (len(grams) + self._gram_counts - shared)
+        matches = np.flatnonzero(similarity >= MIN_SIMILARITY)
+        return matches[np.argsort(-similarity[matches], kind="stable")].tolist()
+
+    def search(self, query, limit=10):
+        """Finds the players best matching what has been typed so far.
+
+        Exact name matches come first, then players with a name or last
+        name starting with the query. If there are none, close
+        misspellings are returned instead.
+
+        Args:
+            query (str): Text typed by the user.
+            limit (int): Most players to return, at most `MAX_RESULTS`.
+
+        Returns:
+            players (list[dict]): `name`, `position`, `team` and `gsis_id`
+                of each candidate, best first.
+
+        """
+
+        query = " ".join(normalize_name(query).split())
+        limit = max(0, min(limit, MAX_RESULTS))
+        if not query or not limit:
+            return []
+
+        found = list(self._exact.get(query, []))
+        seen = set(found)
+        found += [p for p in self._prefix(query) if p not in seen]
+        if not found and len(query) >= 3:
+            found = self._fuzzy(query)
+        found = found[:limit]
+
+        return [{
+            "name": self.names[p],
+            "position": self.positions[p],
+            "team": self.teams[p],
+            "gsis_id": self.gsis_ids[p],
+        } for p in found]
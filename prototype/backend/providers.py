@@ -0,0 +1,85 @@
+"""The provider the API serves from, and swapping in new ones.
+
+`PYBALL_DATA_BACKEND` picks the backend: the R data by default (see
+r_provider.py), or `snapshot` for the Arrow snapshot written by
+snapshot.py (see snapshot_provider.py), which `PYBALL_SNAPSHOT_DIR`
+points at.
+
+A provider never changes its data once loaded. `snapshots` (see
+snapshot_manager.py) swaps in a rebuilt provider when the data changes;
+requests pin `snapshots.active()` for their whole duration, and
+`provider` always forwards to whichever one is active. `preload` loads
+it before a pre-forking server starts its workers.
+"""
+
+import gc
+import logging
+import os
+
+import memory
+from r_pool import RWorkerPool
+from r_provider import RDataProvider
+from snapshot_manager import SnapshotManager
+from snapshot_provider import SnapshotProvider
+
+logger = logging.getLogger(__name__)
+
+## PYBALL_PRECOMPRESS=0 skips keeping compressed copies of the payloads
+_precompress = os.environ.get("PYBALL_PRECOMPRESS", "1") != "0"
+
+## PYBALL_R_WORKERS=<n> runs R in n worker processes per provider
+_r_workers = max(int(os.environ.get("PYBALL_R_WORKERS", 1)), 1)
+
+
+def _build_provider():
+    if os.environ.get("PYBALL_DATA_BACKEND") == "snapshot":
+        return SnapshotProvider(os.environ.get("PYBALL_SNAPSHOT_DIR", "snapshot"), _precompress)
+    return RDataProvider(precompress=_precompress, pool=RWorkerPool(
+        workers=_r_workers,
+        timeout=float(os.environ.get("PYBALL_R_TIMEOUT", 30)),
+        max_calls=int(os.environ.get("PYBALL_R_MAX_CALLS", 1000)),
+    ))
+
+
+## PYBALL_RELOAD_INTERVAL=<s> checks for new data every s seconds and swaps it in
+snapshots = SnapshotManager(_build_provider, interval=float(os.environ.get("PYBALL_RELOAD_INTERVAL", 0)))
+
+
+def preload():
+    """Loads and warms the data before the server forks its workers.
+
+    With `gunicorn --preload`, the app is imported once in the master
+    process and the workers are forked from it, so they share the loaded
+    tables, indexes and encoded payloads copy-on-write instead of each
+    loading their own. `gc.freeze` keeps the collector from touching, and
+    so copying, the pages holding them.
+
+    Forked workers can't share the pipes to one provider's R worker
+    processes, so only a snapshot is preloaded.
+
+    Returns:
+        preloaded (bool): Whether the data was loaded.
+
+    """
+
+    if os.environ.get("PYBALL_DATA_BACKEND") != "snapshot":
+        logger.warning("Preloading needs PYBALL_DATA_BACKEND=snapshot; the data loads in each worker instead")
+        return False
+
+    memory.checkpoint("before_preload")
+    loaded = snapshots.preload()
+    gc.collect()
+    gc.freeze()
+    memory.checkpoint("after_preload")
+    logger.info("Preloaded data version %s", loaded.version()[0])
+    return True
+
+
+class _ActiveProvider:
+    """Forwards to the active provider, for code that doesn't pin one."""
+
+    def __getattr__(self, name):
+        return getattr(snapshots.active(), name)
+
+
+provider = _ActiveProvider()
@@ -0,0 +1,352 @@
+"""Projection, filtering, sorting and pagination for the list endpoints.
+
+`/api/position/` and `/api/metrics/` return one record per player. Their
+query strings can trim that down on the server:
+
+    ?fields=full_name,fantasy_points_ppr     only these columns
+    &fantasy_points_ppr__gte=100             range filters: __gt, __gte, __lt, __lte
+    &sort=-fantasy_points_ppr,full_name      "-" sorts descending
+    &limit=25&offset=50                      one page of the results
+    &team=KC,BUF                             exact matches, on endpoints that
+                                             allow them for a column
+    &format=columns                          /api/metrics/ only: column arrays
+                                             instead of one record per player
+
+`/api/player/` and `/api/players/` take `?seasons=2019-2021` (see
+`parse_seasons`) to only send those seasons' rows.
+
+Filters and sorting run vectorized over a frame with one row per record
+(see `records_frame`), built once per data load; only the records that
+are returned are serialized. On the database-backed endpoints they run
+as SQL over indexed tables instead (see `TableQuery.apply`).
+"""
+
+import operator
+
+import numpy as np
+import pandas as pd
+from django.db.models import F
+
+## range filter suffix -> comparison
+FILTER_OPS = {
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+}
+
+## query string parameters that aren't filters
+RESERVED = {"fields", "sort", "limit", "offset", "format"}
+
+
+## counting stats, totalled over a player's games like the spreadsheet's
+## sums (see StatFunctions.js); every other number is averaged
+SUMMED_COLUMNS = {
+    "completions", "attempts", "passing_yards", "passing_tds", "interceptions",
+    "sacks", "sack_yards", "sack_fumbles", "sack_fumbles_lost",
+    "passing_air_yards", "passing_yards_after_catch", "passing_first_downs",
+    "passing_epa", "passing_2pt_conversions",
+    "carries", "rushing_yards", "rushing_tds", "rushing_fumbles", "rushing_fumbles_lost",
+    "rushing_first_downs", "rushing_epa", "rushing_2pt_conversions",
+    "receptions", "targets", "receiving_yards", "receiving_tds",
+    "receiving_fumbles", "receiving_fumbles_lost", "receiving_air_yards",
+    "receiving_yards_after_catch", "receiving_first_downs", "receiving_epa",
+    "receiving_2pt_conversions", "special_teams_tds",
+    "fantasy_points", "fantasy_points_ppr",
+}
+
+## columns that take the value of the player's latest game
+LATEST_COLUMNS = ["season", "week"]
+
+
+def records_frame(records):
+    """Tabulates the records of a position payload, one row per player.
+
+    In the position JSON each player maps columns to lists of values, one
+    per game, except that a column holding the same value in every game
+    is sent once. Numbers are aggregated over the player's games:
+    `SUMMED_COLUMNS` are totalled, `LATEST_COLUMNS` come from the latest
+    game, and any other number is averaged, so filters and sorting go by
+    season totals and per-game averages. Games without a value ("NA") are
+    skipped. Other columns keep their first value.
+
+    Args:
+        records (dict[str, dict[str, list]]): Player -> column -> values.
+
+    Returns:
+        frame (pd.DataFrame): One row per player, indexed like `records`,
+            with a `games` column counting the player's games. Columns
+            whose values are all numbers (or "NA") are numeric, the rest
+            strings.
+
+    """
+
+    keys = list(records)
+    records = [record if isinstance(record, dict) else {} for record in records.values()]
+    names = list(dict.fromkeys(name for record in records for name in record))
+
+    def values_of(record, name):
+        values = record.get(name, [])
+        if isinstance(values, dict):
+            return []
+        return values if isinstance(values, list) else [values]
+
+    lists = {name: [values_of(record, name) for record in records] for name in names}
+    lengths = {name: np.array([len(values) for values in column], dtype=np.int64) for name, column in lists.items()}
+    games = np.max(list(lengths.values()), axis=0) if lengths else np.zeros(len(keys), dtype=np.int64)
+
+    ## each player's games laid end to end; a value sent once stands for every game
+    player = np.repeat(np.arange(len(keys)), games)
+    starts = np.r_[0, np.cumsum(games)[:-1]].astype(np.int64)
+    game = np.arange(len(player)) - starts[player]
+    played = np.flatnonzero(games)
+
+    def per_game(name, flat):
+        offsets = np.r_[0, np.cumsum(lengths[name])[:-1]].astype(np.int64)
+        have = lengths[name][player] > 0
+        rows = np.where(have, offsets[player] + np.minimum(game, lengths[name][player] - 1), 0)
+        return np.where(have, flat[rows] if len(flat) else np.nan, np.nan)
+
+    def by_player(totals):
+        result = np.full(len(keys), np.nan)
+        result[played] = totals
+        return result
+
+    numeric = {}
+    columns = {}
+    for name in names:
+        flat = [value for values in lists[name] for value in values]
+        try:
+            number = np.array([np.nan if value is None or value == "NA" else value for value in flat], dtype=float)
+        except (TypeError, ValueError):
+            number = None
+        if number is not None:
+            numeric[name] = values = per_game(name, number)
+            columns[name] = np.full(len(keys), np.nan)
+            if len(played) and name not in LATEST_COLUMNS:
+                counted = np.add.reduceat(~np.isnan(values), starts[played])
+                total = np.add.reduceat(np.nan_to_num(values), starts[played])
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    aggregate = total if name in SUMMED_COLUMNS else total / counted
+                ## to the JSON's four decimals, without the sums' rounding error
+                columns[name] = by_player(np.where(counted > 0, np.round(aggregate, 4), np.nan))
+        else:
+            offsets = np.r_[0, np.cumsum(lengths[name])[:-1]]
+            first = [flat[offset] if length else None for offset, length in zip(offsets, lengths[name])]
+            columns[name] = [None if value is None or value == "NA" or isinstance(value, (list, dict)) else str(value)
+                             for value in first]
+
+    ## the latest game: the last by season then week, among each player's games
+    latest = [name for name in LATEST_COLUMNS if name in numeric]
+    if latest and len(played):
+        order = np.lexsort([np.nan_to_num(numeric[name], nan=-np.inf) for name in reversed(latest)] + [player])
+        last = order[np.r_[starts[played][1:], len(order)] - 1]
+        for name in latest:
+            columns[name] = by_player(numeric[name][last])
+
+    frame = pd.DataFrame({name: columns[name] for name in names}, index=keys)
+    frame["games"] = games.astype(float)
+    return frame
+
+
+class QueryError(ValueError):
+    """The query string asks for something the data doesn't have."""
+
+
+## widest span of seasons a `seasons=` range may cover
+MAX_SEASON_SPAN = 100
+
+
+def parse_seasons(value):
+    """Parses a `seasons=` parameter.
+
+    Args:
+        value (str): Seasons and inclusive ranges of seasons separated by
+            commas, e.g. "2021", "2019-2021" or "2017,2019-2021".
+
+    Returns:
+        seasons (tuple[int]): The seasons, sorted and without repeats.
+
+    Raises:
+        QueryError: On anything that isn't a season or a range of them.
+
+    """
+
+    seasons = set()
+    for part in value.split(","):
+        first, _, last = part.strip().partition("-")
+        try:
+            first = int(first)
+            last = int(last) if last else first
+        except ValueError:
+            raise QueryError("seasons must look like 2021 or 2019-2021") from None
+        if not 0 <= last - first < MAX_SEASON_SPAN:
+            raise QueryError("seasons ranges go from the earlier season to the later one, at most %d seasons"
+                             % MAX_SEASON_SPAN)
+        seasons.update(range(first, last + 1))
+    return tuple(sorted(seasons))
+
+
+class TableQuery:
+    """A parsed list query.
+
+    Args:
+        fields (list[str] | None): Columns to return, or None for all of them.
+        sort (list[tuple[str, bool]]): (column, descending) pairs, most
+            significant first.
+        filters (list[tuple[str, str, float]]): (column, op, value) triples,
+            op being a key of `FILTER_OPS`.
+        limit (int | None): Most records to return.
+        offset (int): Records to skip first.
+        matches (list[tuple[str, list[str]]]): (column, values) pairs; the
+            column has to equal one of the values.
+
+    """
+
+    def __init__(self, fields=None, sort=(), filters=(), limit=None, offset=0, matches=()):
+        self.fields = fields
+        self.sort = list(sort)
+        self.filters = list(filters)
+        self.limit = limit
+        self.offset = offset
+        self.matches = list(matches)
+
+    def __bool__(self):
+        return bool(self.fields is not None or self.sort or self.filters or self.matches
+                    or self.limit is not None or self.offset)
+
+    @classmethod
+    def parse(cls, params, columns, exact=()):
+        """Parses a query string.
+
+        Args:
+            params (QueryDict | dict): The request's GET parameters.
+            columns (iterable[str]): Columns the records have.
+            exact (iterable[str]): Columns that `?column=a,b` matches
+                exactly.
+
+        Returns:
+            query (TableQuery): The parsed query.
+
+        Raises:
+            QueryError: On unknown columns and parameters, and malformed
+                values.
+
+        """
+
+        columns = set(columns)
+        exact = set(exact)
+
+        def column(name):
+            if name not in columns:
+                raise QueryError("Unknown field '%s'" % name)
+            return name
+
+        def count(name):
+            value = params.get(name)
+            if value is None or value == "":
+                return None
+            try:
+                value = int(value)
+            except ValueError:
+                raise QueryError("%s must be a number" % name) from None
+            if value < 0:
+                raise QueryError("%s can't be negative" % name)
+            return value
+
+        fields = params.get("fields")
+        if fields is not None:
+            fields = [column(f.strip()) for f in fields.split(",") if f.strip()]
+
+        sort = []
+        for key in (params.get("sort") or "").split(","):
+            key = key.strip()
+            if key:
+                sort.append((column(key.lstrip("-")), key.startswith("-")))
+
+        filters = []
+        for key in params:
+            if key in RESERVED or key in exact:
+                continue
+            name, _, op = key.rpartition("__")
+            if not name or op not in FILTER_OPS:
+                ## rather than answering as if it weren't there
+                raise QueryError("Unknown filter '%s'" % key)
+            try:
+                value = float(params.get(key))
+            except ValueError:
+                raise QueryError("%s must be a number" % key) from None
+            filters.append((column(name), op, value))
+
+        matches = [(column(name), params.get(name).split(",")) for name in sorted(exact) if params.get(name)]
+
+        return cls(fields, sort, filters, count("limit"), count("offset") or 0, matches)
+
+    def select(self, frame):
+        """Picks the records to return.
+
+        Args:
+            frame (pd.DataFrame): One row per record, indexed by the
+                record's key. Rows whose filtered value is missing or not
+                a number never match a filter.
+
+        Returns:
+            keys (list): Keys of the page of records, in order.
+            total (int): Number of records matching the filters, before
+                `limit` and `offset`.
+
+        """
+
+        mask = np.ones(len(frame), dtype=bool)
+        for name, values in self.matches:
+            column = frame[name]
+            if pd.api.types.is_numeric_dtype(column):
+                values = pd.to_numeric(pd.Series(values), errors="coerce")
+            mask &= column.isin(values).to_numpy()
+        for name, op, value in self.filters:
+            values = pd.to_numeric(frame[name], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+            with np.errstate(invalid="ignore"):
+                mask &= FILTER_OPS[op](values, value)
+        selected = frame[mask]
+
+        if self.sort:
+            names = [name for name, _ in self.sort]
+            ascending = [not descending for _, descending in self.sort]
+            selected = selected.sort_values(names, ascending=ascending, kind="stable", na_position="last")
+
+        end = None if self.limit is None else self.offset + self.limit
+        return selected.index[self.offset:end].tolist(), len(selected)
+
+    def apply(self, queryset, lookups):
+        """Runs the query in the database.
+
+        Like `select`, records whose sort column is missing go last, and
+        ties keep their order, here by primary key.
+
+        Args:
+            queryset (QuerySet): All the records.
+            lookups (dict[str, str]): Column -> the ORM lookup of its
+                field, e.g. "target_share" -> "metrics__target_share".
+
+        Returns:
+            page (QuerySet): The page of records, in order.
+            total (int): Number of records matching the filters, before
+                `limit` and `offset`.
+
+        Raises:
+            QueryError: On values the fields can't hold.
+
+        """
+
+        try:
+            for name, values in self.matches:
+                queryset = queryset.filter(**{lookups[name] + "__in": values})
+            for name, op, value in self.filters:
+                queryset = queryset.filter(**{"%s__%s" % (lookups[name], op): value})
+        except (TypeError, ValueError) as e:
+            raise QueryError(str(e)) from None
+
+        order = [F(lookups[name]).desc(nulls_last=True) if descending else F(lookups[name]).asc(nulls_last=True)
+                 for name, descending in self.sort]
+        end = None if self.limit is None else self.offset + self.limit
+        return queryset.order_by(*order, "pk")[self.offset:end], queryset.count()
@@ -0,0 +1,296 @@
+"""Pool of R worker processes.
+
+Embedded R is single-threaded and not thread-safe, and there is one R
+session per process. `RWorkerPool` starts long-lived worker processes
+instead; each sources `ParseNFLPlayers.R` (loading `APIData.Rdata`) into
+its own R session once and then answers calls to its R functions, and
+requests for its tibbles converted to pandas. Callers wait in a queue
+for a free worker, so requests run in parallel across cores, one per
+worker.
+
+A call that runs past its timeout kills its worker, and workers are
+recycled after a number of calls so R's heap doesn't grow without
+bound. Either way a fresh worker takes the old one's place.
+"""
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class RWorkerError(RuntimeError):
+    """An R call failed in the worker."""
+
+
+class RWorkerTimeout(RWorkerError):
+    """No worker was free, or the call didn't finish, in time."""
+
+
+def _worker_main(conn, script):
+    """Worker process: sources the script, then answers calls until told to stop.
+
+    Each message is ("call", function, args) or ("frame", object name, ()).
+    """
+
+    import rpy2.robjects as ro
+    from rpy2.robjects import pandas2ri
+    from rpy2.robjects.conversion import localconverter
+
+    ro.r["source"](script)
+    conn.send(("ready", None))
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        kind, name, args = message
+        try:
+            if kind == "frame":
+                with localconverter(ro.default_converter + pandas2ri.converter):
+                    result = ro.conversion.rpy2py(ro.globalenv[name])
+            else:
+                result = str(ro.globalenv[name](*args)[0])
+            conn.send(("ok", result))
+        except Exception as e:
+            conn.send(("error", repr(e)))
+
+
+class _Worker:
+    """One worker process and the pipe to it."""
+
+    def __init__(self, context, target, script):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=target, args=(child, script), daemon=True)
+        self.process.start()
+        child.close()
+        self.ready = False
+        self.calls = 0
+
+    def wait_ready(self, timeout):
+        if not self.ready:
+            if not self.conn.poll(timeout):
+                raise RWorkerTimeout("R worker didn't start within %ss" % timeout)
+            self.conn.recv()
+            self.ready = True
+
+    def call(self, message, timeout):
+        self.conn.send(message)
+        if not self.conn.poll(timeout):
+            raise RWorkerTimeout("%s didn't return within %ss" % (message[1], timeout))
+        self.calls += 1
+        kind, result = self.conn.recv()
+        if kind == "error":
+            raise RWorkerError(result)
+        return result
+
+    def stop(self, kill=False):
+        if not kill and self.process.is_alive():
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class RWorkerPool:
+    """Runs R functions in a pool of worker processes.
+
+    Args:
+        script (str): R script that loads the data and defines the functions.
+        workers (int): Number of worker processes.
+        timeout (float): Seconds a call may wait for a worker, and then run.
+        max_calls (int): Calls a worker answers before it is replaced.
+            0 keeps workers for good.
+        start_timeout (float): Seconds a worker may take to source the
+            script, and to convert a tibble.
+        target (callable): What the worker processes run, given the pipe
+            to the pool and `script`; see `_worker_main`.
+
+    """
+
+    def __init__(self, script="ParseNFLPlayers.R", workers=2, timeout=30.0,
+                 max_calls=1000, start_timeout=300.0, target=_worker_main):
+        self.script = script
+        self.target = target
+        self.workers = workers
+        self.timeout = timeout
+        self.max_calls = max_calls
+        self.start_timeout = start_timeout
+        ## spawn, not fork: R can't be forked safely, nor can a server with threads mid-call
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._idle = None
+        self._all = set()
+        self._closed = False
+        self._waiting = 0
+        self._counters = {"calls": 0, "errors": 0, "timeouts": 0, "recycled": 0, "max_queue_depth": 0}
+
+    def start(self):
+        """Starts the workers sourcing the script, if they haven't been started.
+
+        Calls start them too; this only lets them load ahead of the first.
+
+        Raises:
+            RWorkerError: The pool is closed.
+
+        """
+
+        with self._lock:
+            if self._closed:
+                raise RWorkerError("the R worker pool is closed")
+            if self._idle is None:
+                self._idle = queue.Queue()
+                for _ in range(self.workers):
+                    self._spawn()
+
+    def _spawn(self):
+        worker = _Worker(self._context, self.target, self.script)
+        self._all.add(worker)
+        self._idle.put(worker)
+
+    def _replace(self, worker, kill):
+        worker.stop(kill)
+        with self._lock:
+            self._all.discard(worker)
+            self._counters["recycled"] += 1
+            if self._idle is not None:
+                self._spawn()
+
+    def _release(self, worker):
+        ## back to the idle queue, or stopped if the pool was closed meanwhile
+        with self._lock:
+            if self._idle is not None and worker in self._all:
+                self._idle.put(worker)
+                return
+        worker.stop()
+
+    def call(self, func, *args, timeout=None):
+        """Calls an R function in a free worker.
+
+        Args:
+            func (str): Name of a function the script defines.
+            *args: Arguments, converted by rpy2.
+            timeout (float): Overrides the pool's timeout.
+
+        Returns:
+            result (str): First element of the function's result.
+
+        Raises:
+            RWorkerTimeout: No worker was free in time, or the call ran
+                too long; the worker that ran it is replaced.
+            RWorkerError: The R function raised an error, or the pool
+                is closed.
+
+        """
+
+        return self._run(("call", func, args), self.timeout if timeout is None else timeout)
+
+    def frame(self, name, timeout=None):
+        """Converts an R object in a free worker to a pandas DataFrame.
+
+        Args:
+            name (str): Name of a tibble the script defines.
+            timeout (float): Overrides `start_timeout`, which bounds the
+                conversion by default.
+
+        Returns:
+            df (pd.DataFrame): The converted tibble.
+
+        Raises:
+            RWorkerTimeout: See `call`.
+            RWorkerError: See `call`.
+
+        """
+
+        return self._run(("frame", name, ()), self.start_timeout if timeout is None else timeout)
+
+    def _run(self, message, timeout):
+        self.start()
+        _, func, args = message
+
+        with self._lock:
+            idle = self._idle
+            if idle is None:
+                raise RWorkerError("the R worker pool is closed")
+            self._waiting += 1
+            self._counters["max_queue_depth"] = max(self._counters["max_queue_depth"], self._waiting)
+        try:
+            worker = idle.get(timeout=timeout)
+        except queue.Empty:
+            raise RWorkerTimeout("no R worker was free within %ss" % timeout) from None
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+        start = time.perf_counter()
+        try:
+            worker.wait_ready(self.start_timeout)
+            result = worker.call(message, timeout)
+        except RWorkerTimeout:
+            with self._lock:
+                self._counters["timeouts"] += 1
+            logger.warning("R worker timed out on %s; replacing it", func)
+            self._replace(worker, kill=True)
+            raise
+        except RWorkerError:
+            with self._lock:
+                self._counters["errors"] += 1
+            self._release(worker)
+            raise
+        except (EOFError, OSError) as e:
+            ## the worker died
+            with self._lock:
+                self._counters["errors"] += 1
+            self._replace(worker, kill=True)
+            raise RWorkerError("R worker exited during %s" % func) from e
+
+        with self._lock:
+            self._counters["calls"] += 1
+        logger.debug("%s%r took %.3fs", func, args, time.perf_counter() - start)
+
+        if self.max_calls and worker.calls >= self.max_calls:
+            self._replace(worker, kill=False)
+        else:
+            self._release(worker)
+        return result
+
+    def queue_depth(self):
+        """Returns how many calls are waiting for a free worker."""
+        with self._lock:
+            return self._waiting
+
+    def stats(self):
+        """Returns the pool's counters.
+
+        Returns:
+            stats (dict): `workers`, `idle`, `queue_depth`, and the
+                `calls`, `errors`, `timeouts`, `recycled` and
+                `max_queue_depth` seen so far.
+
+        """
+
+        with self._lock:
+            return dict(self._counters,
+                        workers=len(self._all),
+                        idle=self._idle.qsize() if self._idle is not None else 0,
+                        queue_depth=self._waiting)
+
+    def close(self):
+        """Stops the workers.
+
+        Idle workers stop now; workers still running a call stop when it
+        returns. Calls made after closing raise `RWorkerError`.
+        """
+
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, None
+            self._all = set()
+        while idle is not None and not idle.empty():
+            idle.get_nowait().stop()
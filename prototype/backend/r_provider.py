@@ -0,0 +1,127 @@
+"""Player data loaded from APIData.Rdata through R.
+
+R never runs in the server process. Each provider has its own pool of R
+worker processes (see r_pool.py), which source `ParseNFLPlayers.R` when
+the provider is first used; each tibble is converted to pandas in a
+worker the first time somebody asks for it, and the R functions run
+there too. A provider built for new data therefore loads it into R
+sessions of its own: the one being served keeps reading the data its
+version names, and its calls never wait on the load.
+
+`PYBALL_R_WORKERS=<n>` sets the number of workers per provider.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import snapshot
+import timing
+from data_provider import DataProvider
+from r_pool import RWorkerPool
+
+## frame name -> name of the R object the script defines
+R_FRAMES = {
+    "player_stats": "player_stats",
+    "team_data": "team_data",
+    "player_stats_kicker": "player_stats_kicker",
+    "roster": "roster",
+    "official_player_stats": "official_player_stats_total",
+    "weekly_stats": "official_player_stats",
+    "all_data": "all_data",
+}
+
+
+class RDataProvider(DataProvider):
+    """Loads the R data lazily and hands out pandas frames and metrics.
+
+    A worker recycled by the pool sources the script again, so its R
+    function calls see `rdata` as it is then. The frames, and everything
+    built from them, are fetched once and stay on the provider's version.
+
+    Args:
+        script (str): R script that loads the data and defines
+            `get_player_data` and `get_position_players`.
+        precompress (bool): Keep compressed copies of each encoded payload.
+        rdata (str): The data file the script loads, used to version it.
+        pool (RWorkerPool): The provider's own R workers, running
+            `script`. One worker if not given.
+
+    """
+
+    def __init__(self, script="ParseNFLPlayers.R", precompress=True, rdata="APIData.Rdata", pool=None):
+        super().__init__(precompress)
+        self.script = script
+        self.rdata = rdata
+        self.pool = pool if pool is not None else RWorkerPool(script, workers=1)
+
+    @staticmethod
+    def _file_version(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            ## no file to go by, so every load counts as new data
+            return "%x" % time.time_ns(), time.time()
+        return "%x-%x" % (stat.st_mtime_ns, stat.st_size), stat.st_mtime
+
+    def version(self):
+        if self._version is None:
+            with self._lock:
+                if self._version is None:
+                    ## taken before the workers load the file: if it changes
+                    ## meanwhile, `stale()` sees a newer version and rebuilds
+                    self._version = self._file_version(self.rdata)
+                    self.pool.start()
+        return self._version
+
+    def source_version(self):
+        ## only looks at the file, never loads it
+        if not os.path.exists(self.rdata):
+            return None
+        return self._file_version(self.rdata)[0]
+
+    def close(self):
+        self.pool.close()
+
+    def frame(self, name):
+        with self._lock:
+            if name not in self._frames:
+                self.version()
+                with self._stage("r_frame:" + name):
+                    self._frames[name] = self.pool.frame(R_FRAMES[name])
+            return self._frames[name]
+
+    def get_player_data(self, name):
+        """Calls the R `get_player_data` function.
+
+        Args:
+            name (str): Player's name.
+
+        Returns:
+            json (str): Player's data as JSON.
+
+        """
+
+        self.version()
+        with timing.stage("r:get_player_data"):
+            return self.pool.call("get_player_data", name)
+
+    def get_position_players(self, pos):
+        """Calls the R `get_position_players` function.
+
+        Args:
+            pos (str): Position abbreviation.
+
+        Returns:
+            json (str): Data on every player at the position as JSON.
+
+        """
+
+        self.version()
+        with timing.stage("r:get_position_players"):
+            return self.pool.call("get_position_players", pos)
+
+    def position_json(self):
+        ## one position per worker at a time
+        with ThreadPoolExecutor(self.pool.workers) as executor:
+            return self._valid_positions(list(executor.map(self.get_position_players, snapshot.POSITIONS)))
@@ -0,0 +1,119 @@
+"""Bounded cache of encoded responses.
+
+A few hundred star players make up most `/api/player/` requests, and
+typos and defensive players keep asking for names that aren't there.
+`ResponseCache` keeps the encoded response for both, most recently used
+first, and evicts the least recently used entry once it is full.
+
+Entries are keyed by the version of the data they were built from (see
+`DataProvider.version`). While a new snapshot is swapped in, requests
+still pinned to the old one keep hitting their own entries instead of
+emptying the cache for everybody; once the old version stops being
+asked for, its entries are the least recently used and go first.
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """LRU cache of `EncodedPayload`s keyed by data version.
+
+    Args:
+        maxsize (int): Most entries kept. 0 disables the cache.
+
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, version, key):
+        """Returns the cached response for a key, or None on a miss.
+
+        Args:
+            version (str): Version of the data being served.
+            key (hashable): Cache key, e.g. a normalized player name.
+
+        Returns:
+            payload (EncodedPayload | None): The cached response.
+
+        """
+
+        with self._lock:
+            payload = self._entries.get((version, key))
+            if payload is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((version, key))
+            self.hits += 1
+            return payload
+
+    def put(self, version, key, payload):
+        """Caches a response built for a version of the data.
+
+        Returns:
+            payload (EncodedPayload): `payload`, for chaining.
+
+        """
+
+        with self._lock:
+            if self.maxsize > 0:
+                self._entries[version, key] = payload
+                self._entries.move_to_end((version, key))
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return payload
+
+    def get(self, version, key, build):
+        """Returns the cached response for a key, building it on a miss.
+
+        Args:
+            version (str): Version of the data being served.
+            key (hashable): Cache key.
+            build (callable): Makes the `EncodedPayload` when it isn't cached.
+                Called without the lock held.
+
+        Returns:
+            payload (EncodedPayload): The cached or newly built response.
+
+        """
+
+        payload = self.lookup(version, key)
+        if payload is None:
+            payload = self.put(version, key, build())
+        return payload
+
+    def clear(self):
+        """Drops every entry, keeping the counters."""
+
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Returns the cache's counters, for sizing it.
+
+        Returns:
+            stats (dict): `size`, `maxsize`, `hits`, `misses`, `evictions`
+                and `hit_rate`.
+
+        """
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else None,
+            }
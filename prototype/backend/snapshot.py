@@ -0,0 +1,366 @@
+"""Columnar on-disk snapshot of the API data.
+
+Run this after `ReloadData.R` to export `all_data`, the precomputed
+position JSON (compacted and compressed, ready to send) and the frames
+the metrics are built from to Arrow IPC files:
+
+    Rscript ReloadData.R
+    python snapshot.py --out snapshot
+
+`all_data` is also written once per season, so a query for a few
+seasons only maps and indexes those (see `split_partitions`).
+
+The files are uncompressed so they can be memory-mapped. Every worker
+process that opens them shares the same pages through the OS page cache
+instead of holding a private copy in an R heap. `SnapshotProvider` in
+snapshot_provider.py serves the API from them without R.
+"""
+
+import argparse
+import datetime
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import encoded
+from compact import missing_value
+from ConsistencyGrade import good_game_counts
+from encoded import EncodedPayload
+from ReceiverShare import team_passing_totals
+from trends import weekly_trends
+
+## every position ReloadData.R precomputes a `<pos>_data` JSON for
+POSITIONS = [
+    "QB", "RB", "WR", "PK", "CB", "DB", "DE", "DT", "K", "LB", "LS", "OL",
+    "P", "T", "TE", "C", "FB", "G", "OT", "SS", "FS", "OG", "NT", "OLB",
+    "DL", "ILB", "S",
+]
+
+MANIFEST = "manifest.json"
+
+## running aggregates kept so a new week can be folded in (see incremental.py)
+STATE_TABLES = ["consistency_state", "team_totals"]
+
+## metrics computed at export time and served as they are
+DERIVED_TABLES = ["weekly_trends"]
+
+## all_data is partitioned on this column
+PARTITION_COLUMN = "season"
+
+
+def normalize_name(name):
+    """Normalizes a player name the way `get_player_data` does.
+
+    Args:
+        name (str): Player's name as typed.
+
+    Returns:
+        name (str): Lowercased name with the dots removed.
+
+    """
+
+    return name.lower().replace(".", "")
+
+
+def write_table(path, name, df):
+    """Writes a DataFrame as an uncompressed Arrow IPC file.
+
+    The file is written under a temporary name and renamed into place, so
+    processes that have the old file mapped keep reading it intact.
+
+    Args:
+        path (str): Snapshot directory.
+        name (str): Table name, used as the file name.
+        df (pd.DataFrame | pa.Table): Data to write.
+
+    """
+
+    table = df if isinstance(df, pa.Table) else pa.Table.from_pandas(df, preserve_index=False)
+    target = os.path.join(path, name + ".arrow")
+    with pa.OSFile(target + ".tmp", "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(target + ".tmp", target)
+
+
+def has_table(path, name):
+    """Returns whether a snapshot has a table, e.g. one added after it was written."""
+    return os.path.exists(os.path.join(path, name + ".arrow"))
+
+
+def read_table(path, name):
+    """Memory-maps an Arrow IPC file written by `write_table`.
+
+    Args:
+        path (str): Snapshot directory.
+        name (str): Table name.
+
+    Returns:
+        table (pa.Table): Zero-copy table backed by the mapped file.
+
+    """
+
+    source = pa.memory_map(os.path.join(path, name + ".arrow"), "r")
+    return pa.ipc.open_file(source).read_all()
+
+
+def read_manifest(path):
+    """Returns the manifest written alongside the tables."""
+
+    with open(os.path.join(path, MANIFEST)) as f:
+        return json.load(f)
+
+
+def write_manifest(path, manifest):
+    """Writes the manifest, replacing the old one in a single rename."""
+
+    target = os.path.join(path, MANIFEST)
+    with open(target + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(target + ".tmp", target)
+
+
+def json_values(column, missing=None):
+    """Converts an Arrow column to the values jsonlite would print.
+
+    Mirrors `jsonlite::toJSON` defaults: numbers keep 4 decimal digits,
+    missing numbers print as "NA", other missing values as null.
+
+    Args:
+        column (pa.ChunkedArray | pa.Array): The values.
+        missing (str | None): What the values of a null-typed column, i.e.
+            an all-NA one (see compact.py), print as.
+
+    """
+
+    kind = column.type.value_type if pa.types.is_dictionary(column.type) else column.type
+    if pa.types.is_null(kind):
+        return [missing] * len(column)
+    values = column.to_pylist()
+    if pa.types.is_floating(kind) or pa.types.is_integer(kind):
+        return ["NA" if v is None or (isinstance(v, float) and math.isnan(v))
+                else int(v) if float(v).is_integer() else round(v, 4)
+                for v in values]
+    if pa.types.is_temporal(kind):
+        return [None if v is None else v.isoformat() for v in values]
+    return values
+
+
+def player_payload(table, constant=None):
+    """Collapses one player's rows the way `get_player_data` does.
+
+    Columns that hold a single value across the player's rows come first
+    with that value; the rest follow with their distinct rows.
+
+    Args:
+        table (pa.Table): All of the player's rows.
+        constant (list[bool]): Which columns hold a single value, if
+            already known. Worked out from the rows otherwise.
+
+    Returns:
+        payload (dict[str, list]): Column name -> values.
+
+    """
+
+    missing = [missing_value(field) for field in table.schema]
+    if constant is None:
+        columns = {name: json_values(table.column(name), na)
+                   for name, na in zip(table.column_names, missing)}
+        constant = [len(set(map(repr, values))) == 1 for values in columns.values()]
+    else:
+        columns = {name: json_values(table.column(name).slice(0, 1) if const else table.column(name), na)
+                   for name, const, na in zip(table.column_names, constant, missing)}
+    varying = [name for name, const in zip(columns, constant) if not const]
+
+    payload = {name: values[:1] for name, const, values
+               in zip(columns, constant, columns.values()) if const}
+    if varying:
+        seen = set()
+        rows = []
+        for row in zip(*(columns[name] for name in varying)):
+            key = repr(row)
+            if key not in seen:
+                seen.add(key)
+                rows.append(row)
+        for name, values in zip(varying, zip(*rows)):
+            payload[name] = list(values)
+    return payload
+
+
+def find_player(all_data, name):
+    """Looks a player up by name in the `all_data` table.
+
+    Args:
+        all_data (pa.Table): The exported `all_data` table.
+        name (str): Player's name as typed.
+
+    Returns:
+        payload (dict[str, list] | list): The player's data, or an empty
+            list if nobody has that name.
+
+    """
+
+    rows = all_data.filter(pc.equal(all_data.column("name"), normalize_name(name)))
+    if rows.num_rows == 0:
+        return []
+    ## like R, a shared name resolves to whoever comes first
+    gsis = rows.column("gsis_id")[0]
+    return player_payload(rows.filter(pc.equal(rows.column("gsis_id"), gsis)))
+
+
+def group_player_rows(all_data):
+    """Prepares `all_data` for export.
+
+    Adds the normalized `name` column if R didn't, and stably reorders the
+    rows so each player's rows are contiguous. Players keep the order in
+    which they first appear, so a shared name still resolves to the same
+    player as in R.
+
+    Args:
+        all_data (pd.DataFrame): The `all_data` frame.
+
+    Returns:
+        df (pd.DataFrame): The reordered frame.
+
+    """
+
+    if "name" not in all_data.columns:
+        all_data = all_data.assign(name=all_data["full_name"].astype(str).map(normalize_name))
+    codes, _ = pd.factorize(all_data["gsis_id"].astype(str) + "\0" + all_data["name"].astype(str))
+    return all_data.iloc[np.argsort(codes, kind="stable")].reset_index(drop=True)
+
+
+def partition_name(name, value):
+    """Returns the table name of one partition, e.g. `all_data_season_2021`."""
+    return "%s_%s_%d" % (name, PARTITION_COLUMN, value)
+
+
+def split_partitions(table):
+    """Splits a table by season.
+
+    Args:
+        table (pa.Table): Table with a numeric `season` column.
+
+    Returns:
+        partitions (dict[int, pa.Table]): Season -> its rows, in their
+            original order, so rows grouped by player stay grouped. Rows
+            without a season are left out; a table without the column has
+            no partitions.
+
+    """
+
+    if PARTITION_COLUMN not in table.column_names:
+        return {}
+    values = pc.cast(table.column(PARTITION_COLUMN), pa.float64()).to_numpy(zero_copy_only=False)
+    return {int(value): table.filter(pa.array(values == value))
+            for value in np.unique(values[~np.isnan(values)])}
+
+
+def positions_frame(payloads):
+    """Builds the `positions` table, each position's JSON encoded once.
+
+    Args:
+        payloads (dict[str, EncodedPayload]): Position -> payload.
+
+    Returns:
+        df (pd.DataFrame): `position`, `payload` (the compact JSON bytes)
+            and, for each of `encoded.ENCODINGS`, the body compressed with
+            it, or None if the payload has no such copy.
+
+    """
+
+    return pd.DataFrame(dict(
+        position=list(payloads),
+        payload=[payload.body for payload in payloads.values()],
+        **{encoding: [payload.compressed.get(encoding) for payload in payloads.values()]
+           for encoding in encoded.ENCODINGS},
+    ))
+
+
+def read_positions(table, precompress=True):
+    """Reads the payloads in a `positions` table as they were stored.
+
+    Args:
+        table (pa.Table): The snapshot's `positions` table.
+        precompress (bool): Keep the stored compressed copies.
+
+    Returns:
+        payloads (dict[str, EncodedPayload]): Position -> payload.
+            Snapshots from before payloads were stored encoded hold JSON
+            text, which is encoded here instead.
+
+    """
+
+    positions = table.column("position").to_pylist()
+    bodies = table.column("payload").to_pylist()
+    if not pa.types.is_binary(table.schema.field("payload").type):
+        return {pos: EncodedPayload.from_json(text, precompress) for pos, text in zip(positions, bodies)}
+
+    columns = [encoding for encoding in encoded.ENCODINGS if precompress and encoding in table.column_names]
+    copies = zip(*(table.column(encoding).to_pylist() for encoding in columns)) if columns else [()] * len(bodies)
+    return {
+        pos: EncodedPayload.from_encoded(body, {e: c for e, c in zip(columns, compressed) if c is not None})
+        for pos, body, compressed in zip(positions, bodies, copies)
+    }
+
+
+def export_snapshot(provider, path):
+    """Exports the data loaded by an R-backed provider.
+
+    Args:
+        provider (DataProvider): Provider that has the R data.
+        path (str): Directory to write the snapshot to.
+
+    """
+
+    from r_provider import R_FRAMES
+
+    os.makedirs(path, exist_ok=True)
+
+    for name in R_FRAMES:
+        ## all_data grouped by player, see group_player_rows
+        write_table(path, name, provider.all_data_table() if name == "all_data" else provider.frame(name))
+
+    partitions = split_partitions(provider.all_data_table())
+    for season, table in partitions.items():
+        write_table(path, partition_name("all_data", season), table)
+
+    ## compacted and compressed here, so servers send the stored bytes as they are
+    write_table(path, "positions", positions_frame({
+        pos: EncodedPayload.from_json(payload) for pos, payload in provider.position_json().items()
+    }))
+
+    write_table(path, "consistency_state", good_game_counts(provider.frame("weekly_stats")).reset_index())
+    write_table(path, "team_totals", team_passing_totals(provider.frame("official_player_stats")).reset_index())
+    write_table(path, "weekly_trends", weekly_trends(provider.frame("weekly_stats")))
+
+    rdata = "APIData.Rdata"
+    write_manifest(path, {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "source": rdata,
+        "source_mtime": os.path.getmtime(rdata) if os.path.exists(rdata) else None,
+        "tables": list(R_FRAMES) + ["positions"] + STATE_TABLES + DERIVED_TABLES,
+        "partitions": {"all_data": sorted(partitions)},
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export APIData.Rdata to an Arrow snapshot.")
+    parser.add_argument("--out", default="snapshot", help="snapshot directory")
+    args = parser.parse_args()
+
+    from r_provider import RDataProvider
+
+    provider = RDataProvider()
+    export_snapshot(provider, args.out)
+    for stage, seconds in provider.timings.items():
+        print("%-40s %8.3fs" % (stage, seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Swaps freshly loaded data in without restarting the server.
+
+A provider loads its data once and never changes it. To pick up a new
+`APIData.Rdata` (or a refreshed snapshot, see incremental.py),
+`SnapshotManager` builds a whole new provider in a background thread,
+warms every derived table and encoded payload, and only then replaces
+the active one with a single reference assignment. Requests that already
+hold the old provider finish on it; new requests get the new one, with
+nothing left to compute. The old provider is closed after a grace period
+and freed once nobody uses it.
+
+Rebuilds run when `refresh()` is called, or when the source data changes
+if `watch()` polls for it.
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotManager:
+    """Holds the active provider and replaces it with rebuilt ones.
+
+    Args:
+        build (callable): Returns a new provider, not loaded yet.
+        interval (float): Seconds between checks for changed source data
+            once `watch()` has started. 0 never checks.
+        grace (float): Seconds a replaced provider is kept open for the
+            requests still using it.
+
+    """
+
+    def __init__(self, build, interval=0.0, grace=60.0):
+        self.build = build
+        self.interval = interval
+        self.grace = grace
+        self._lock = threading.Lock()
+        self._active = build()
+        self._builder = None
+        self._watcher = None
+        self.swaps = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_build_seconds = None
+        self.activated = time.time()
+
+    def active(self):
+        """Returns the provider to serve from.
+
+        Hold on to it for the rest of the request, so the request sees a
+        single version of the data even if a new one is swapped in.
+        """
+
+        if self.interval and self._watcher is None:
+            self.watch()
+        return self._active
+
+    def preload(self):
+        """Loads and warms the active provider, without starting `watch()`.
+
+        For servers that fork their workers after loading the app: threads
+        don't survive a fork, so each worker starts its own watcher on its
+        first `active()` call instead.
+
+        Returns:
+            provider: The active provider.
+
+        """
+
+        provider = self._active
+        provider.warm()
+        return provider
+
+    def refresh(self, wait=False):
+        """Builds a new provider in the background and swaps it in.
+
+        Does nothing if a build is already running.
+
+        Args:
+            wait (bool): Block until the build is done.
+
+        Returns:
+            builder (threading.Thread): The running build.
+
+        """
+
+        with self._lock:
+            if self._builder is None or not self._builder.is_alive():
+                self._builder = threading.Thread(target=self._rebuild, name="pyball-snapshot-build", daemon=True)
+                self._builder.start()
+            builder = self._builder
+        if wait:
+            builder.join()
+        return builder
+
+    def _rebuild(self):
+        start = time.perf_counter()
+        try:
+            provider = self.build()
+            provider.warm()
+        except Exception as e:
+            ## keep serving the old data
+            logger.exception("Building a new snapshot failed")
+            self.failures += 1
+            self.last_error = repr(e)
+            return
+
+        with self._lock:
+            old, self._active = self._active, provider
+            self.swaps += 1
+            self.last_error = None
+            self.last_build_seconds = time.perf_counter() - start
+            self.activated = time.time()
+        logger.info("Swapped in data version %s after %.3fs", provider.version()[0], self.last_build_seconds)
+
+        timer = threading.Timer(self.grace, old.close)
+        timer.daemon = True
+        timer.start()
+
+    def stale(self):
+        """Returns whether the source data differs from what is being served."""
+
+        provider = self._active
+        if not provider.loaded():
+            ## it will load whatever is there on first use
+            return False
+        source = provider.source_version()
+        return source is not None and source != provider.version()[0]
+
+    def watch(self):
+        """Starts checking for changed source data every `interval` seconds."""
+
+        def poll():
+            while True:
+                time.sleep(self.interval)
+                try:
+                    if self.stale():
+                        self.refresh(wait=True)
+                except Exception:
+                    logger.exception("Checking for new data failed")
+
+        with self._lock:
+            if self._watcher is None:
+                self._watcher = threading.Thread(target=poll, name="pyball-snapshot-watch", daemon=True)
+                self._watcher.start()
+
+    def stats(self):
+        """Describes the active data and the rebuilds so far.
+
+        Returns:
+            stats (dict): `version` of the active data (None until it is
+                loaded), when it was `activated`, whether a rebuild is
+                `building`, and the `swaps`, `failures`, `last_error` and
+                `last_build_seconds` so far.
+
+        """
+
+        provider = self._active
+        builder = self._builder
+        return {
+            "version": provider.version()[0] if provider.loaded() else None,
+            "activated": self.activated,
+            "building": builder is not None and builder.is_alive(),
+            "swaps": self.swaps,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "last_build_seconds": self.last_build_seconds,
+        }
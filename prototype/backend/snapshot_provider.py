@@ -0,0 +1,127 @@
+"""Player data served from a memory-mapped Arrow snapshot, without R.
+
+snapshot.py exports the R data once; `SnapshotProvider` maps the exported
+tables and serves the same API from them. Tables derived from the
+weekly stats are exported too, so they are read rather than rebuilt.
+"""
+
+import hashlib
+import json
+import os
+
+import snapshot
+from data_provider import DataProvider
+from ConsistencyGrade import grade_counts
+from ReceiverShare import compute_share_metrics
+
+
+class SnapshotProvider(DataProvider):
+    """Serves the player data from a memory-mapped Arrow snapshot.
+
+    Args:
+        path (str): Snapshot directory written by snapshot.py.
+
+    """
+
+    def __init__(self, path="snapshot", precompress=True):
+        super().__init__(precompress)
+        self.path = path
+        self._tables = {}
+
+    def table(self, name):
+        """Returns a snapshot table, memory-mapping it on first use.
+
+        Args:
+            name (str): A key of `r_provider.R_FRAMES`, "positions", one of
+                `snapshot.STATE_TABLES` or `snapshot.DERIVED_TABLES`, or a
+                partition (see `snapshot.partition_name`).
+
+        Returns:
+            table (pa.Table): The table.
+
+        """
+
+        with self._lock:
+            if name not in self._tables:
+                with self._stage("mmap:" + name):
+                    self._tables[name] = snapshot.read_table(self.path, name)
+            return self._tables[name]
+
+    def frame(self, name):
+        with self._lock:
+            if name not in self._frames:
+                table = self.table(name)
+                with self._stage("to_pandas:" + name):
+                    self._frames[name] = table.to_pandas()
+            return self._frames[name]
+
+    def all_data_table(self):
+        return self.table("all_data")
+
+    def _partitions(self):
+        return self._derived("partitions", lambda: snapshot.read_manifest(self.path).get("partitions", {}))
+
+    def seasons(self):
+        if "all_data" not in self._partitions():
+            return super().seasons()
+        return self._partitions()["all_data"]
+
+    def season_table(self, season):
+        if "all_data" not in self._partitions():
+            return super().season_table(season)
+        ## only the seasons asked for are ever mapped
+        return self.table(snapshot.partition_name("all_data", season))
+
+    def consistency_grades(self):
+        if not snapshot.has_table(self.path, "consistency_state"):
+            return super().consistency_grades()
+        ## grade from the stored running aggregates instead of every week
+        return self._derived("consistency_grade", lambda: grade_counts(
+            self.frame("consistency_state").set_index("player_name"),
+            self.frame("official_player_stats"),
+            self.frame("roster"),
+        ))
+
+    def receiver_share(self):
+        if not snapshot.has_table(self.path, "team_totals"):
+            return super().receiver_share()
+        return self._derived("receiver_share", lambda: compute_share_metrics(
+            self.frame("official_player_stats"),
+            team_totals=self.frame("team_totals").set_index("recent_team"),
+        ).sort_values(by="rec_share", ascending=False))
+
+    def weekly_trends(self):
+        if not snapshot.has_table(self.path, "weekly_trends"):
+            return super().weekly_trends()
+        ## exported with the snapshot, served from the mapped file
+        return self.table("weekly_trends")
+
+    def _manifest_version(self):
+        manifest = os.path.join(self.path, snapshot.MANIFEST)
+        with open(manifest, "rb") as f:
+            token = hashlib.sha1(f.read()).hexdigest()[:16]
+        return token, os.stat(manifest).st_mtime
+
+    def version(self):
+        with self._lock:
+            if self._version is None:
+                self._version = self._manifest_version()
+            return self._version
+
+    def source_version(self):
+        try:
+            return self._manifest_version()[0]
+        except OSError:
+            return None
+
+    def position_json(self):
+        return {pos: payload.body.decode() for pos, payload in self.position_payloads().items()}
+
+    def position_payloads(self):
+        ## stored encoded and compressed by export_snapshot, so never parsed here
+        return self._derived("position_payloads", lambda: snapshot.read_positions(
+            self.table("positions"), self.precompress))
+
+    def get_position_players(self, pos):
+        payload = self.position_payload(pos)
+        return "[]" if payload is None else payload.body.decode()
@@ -0,0 +1,153 @@
+"""Per-request stage timings.
+
+`TimingMiddleware` starts a recorder for each request. Code anywhere
+below it, in the views or the data provider, times its work with
+
+    with timing.stage("lookup"):
+        ...
+
+and the durations end up in the response's `Server-Timing` header and in
+rolling per-endpoint percentiles (see `RollingStats`), served at
+`/api/_stats/`. Outside a request `stage` only runs the block.
+"""
+
+import contextvars
+import os
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import numpy as np
+
+_recorder = contextvars.ContextVar("pyball_timings", default=None)
+
+## requests kept per endpoint for the percentiles
+STATS_WINDOW = int(os.environ.get("PYBALL_STATS_WINDOW", 1000))
+
+
+class Recorder:
+    """Stage durations of one request, in seconds, in the order first seen."""
+
+    __slots__ = ("start", "stages")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = {}
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def total(self):
+        return time.perf_counter() - self.start
+
+
+def begin():
+    """Starts recording a request's stages.
+
+    Returns:
+        recorder (Recorder): Collects the stages.
+        token (Token): Pass to `end`.
+
+    """
+
+    recorder = Recorder()
+    return recorder, _recorder.set(recorder)
+
+
+def end(token):
+    """Stops recording into the recorder `begin` started."""
+    _recorder.reset(token)
+
+
+def record(name, seconds):
+    """Adds a duration measured elsewhere to the current request, if any."""
+
+    recorder = _recorder.get()
+    if recorder is not None:
+        recorder.add(name, seconds)
+
+
+@contextmanager
+def stage(name):
+    """Times a block as one stage of the current request."""
+
+    recorder = _recorder.get()
+    if recorder is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.add(name, time.perf_counter() - start)
+
+
+def server_timing(recorder, total):
+    """Formats a recorder's stages as a `Server-Timing` header value.
+
+    Args:
+        recorder (Recorder): The request's stages.
+        total (float): Seconds the whole request took.
+
+    Returns:
+        header (str): e.g. `lookup;dur=1.20, encode;dur=0.08, total;dur=1.41`.
+
+    """
+
+    metrics = ["%s;dur=%.2f" % (re.sub(r"[^\w.-]", "_", name), seconds * 1e3)
+               for name, seconds in recorder.stages.items()]
+    metrics.append("total;dur=%.2f" % (total * 1e3))
+    return ", ".join(metrics)
+
+
+class RollingStats:
+    """Percentiles of the latest requests to each endpoint.
+
+    Args:
+        window (int): Requests kept per endpoint, and per stage.
+
+    """
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._counts = defaultdict(int)
+        self._totals = defaultdict(lambda: deque(maxlen=self.window))
+        self._stages = defaultdict(lambda: defaultdict(lambda: deque(maxlen=self.window)))
+
+    def add(self, endpoint, recorder, total):
+        """Records one finished request."""
+
+        with self._lock:
+            self._counts[endpoint] += 1
+            self._totals[endpoint].append(total)
+            for name, seconds in recorder.stages.items():
+                self._stages[endpoint][name].append(seconds)
+
+    @staticmethod
+    def _summary(values):
+        p50, p90, p99 = np.percentile(np.fromiter(values, float, len(values)), [50, 90, 99]) * 1e3
+        return {"n": len(values), "p50_ms": p50, "p90_ms": p90, "p99_ms": p99}
+
+    def snapshot(self):
+        """Returns the percentiles of every endpoint.
+
+        Returns:
+            stats (dict): Endpoint -> `count` of requests so far, and the
+                `total` and per-stage latency percentiles over the window.
+
+        """
+
+        with self._lock:
+            return {endpoint: {
+                "count": self._counts[endpoint],
+                "total": self._summary(totals),
+                "stages": {name: self._summary(values)
+                           for name, values in self._stages[endpoint].items()},
+            } for endpoint, totals in self._totals.items()}
+
+
+## every request's stages, filled in by TimingMiddleware
+request_stats = RollingStats(STATS_WINDOW)
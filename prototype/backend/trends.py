@@ -0,0 +1,188 @@
+"""Week-to-week trends in each player's scoring and usage.
+
+The consistency grades (see ConsistencyGrade.py) boil a player's season
+down to one number. For start/sit decisions, how a player has been doing
+lately matters more: `weekly_trends` follows every player through their
+games, and after each game keeps the rolling mean and standard deviation
+of `TREND_STATS` over the player's last few games, and an exponentially
+weighted mean that leans toward the latest games.
+
+Every player is computed at once, with grouped rolling windows over the
+weekly table sorted by player. The result is exported with the snapshot
+(see snapshot.py) and refreshed for the players in each new week (see
+incremental.py). `PlayerTrends` serves one player's rows of it.
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pandas.api.indexers import BaseIndexer
+
+## weekly stats followed: scoring, and how much the player is used
+TREND_STATS = ["fantasy_points_ppr", "targets", "target_share", "receptions", "carries", "attempts"]
+
+## window lengths, in games; the EWMA of each has the same span
+TREND_WINDOWS = (3, 5, 8)
+
+## decimal places kept of each trend
+TREND_DECIMALS = 4
+
+## columns that say which game a row follows
+GAME_COLUMNS = ["player_id", "season", "week"]
+
+
+def trend_columns(stats=TREND_STATS, windows=TREND_WINDOWS):
+    """Returns the names of the trend columns, e.g. `fantasy_points_ppr_mean_3`."""
+
+    return ["%s_%s_%d" % (stat, kind, window)
+            for stat in stats for window in windows for kind in ("mean", "sd", "ewma")]
+
+
+class LastGames(BaseIndexer):
+    """Rolling windows over each row's last `window_size` rows of the same player.
+
+    `groupby().rolling()` works the windows out one player at a time in
+    Python; these are worked out for every row at once, so each rolling
+    statistic is a single pass over the whole column.
+
+    Args:
+        first_rows (np.ndarray[int]): For each row, the first row of its
+            player's rows, which are contiguous.
+        window_size (int): Rows per window.
+
+    """
+
+    def get_window_bounds(self, num_values=0, min_periods=None, center=None, closed=None, step=None):
+        end = np.arange(1, num_values + 1, dtype=np.int64)
+        start = np.maximum(end - self.window_size, self.first_rows).astype(np.int64)
+        return start, end
+
+
+def group_ewma(values, first_rows, spans):
+    """Exponentially weighted means down each player's rows, all players at once.
+
+    The same as `groupby().ewm(span=span).mean()` (adjusted weights, NaN
+    skipped but still aging the values before it), computed one game
+    number at a time for every player together, instead of one player
+    at a time.
+
+    Args:
+        values (np.ndarray[float]): Rows by columns.
+        first_rows (np.ndarray[int]): See `LastGames`.
+        spans (np.ndarray[int]): Span of the weights of each column, as
+            in `DataFrame.ewm`.
+
+    Returns:
+        ewma (np.ndarray[float]): Same shape as `values`; NaN until the
+            player has a value.
+
+    """
+
+    decay = 1 - 2 / (np.asarray(spans, dtype=float) + 1)
+    present = ~np.isnan(values)
+    weighted = np.where(present, values, 0.0)
+    weights = present.astype(float)
+
+    ## rows by game number: every player's first game, then their second, ...
+    game = np.arange(len(values)) - first_rows
+    by_game = np.argsort(game, kind="stable")
+    bounds = np.searchsorted(game[by_game], np.arange(game.max() + 2 if len(game) else 1))
+    for start, stop in zip(bounds[1:-1], bounds[2:]):
+        rows = by_game[start:stop]
+        weighted[rows] += decay * weighted[rows - 1]
+        weights[rows] += decay * weights[rows - 1]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(weights > 0, weighted / weights, np.nan)
+
+
+def weekly_trends(df_weekly_stats, stats=TREND_STATS, windows=TREND_WINDOWS):
+    """Computes each player's rolling trends after every game.
+
+    Windows count the player's games, not calendar weeks, so byes and
+    missed games don't shorten them, and carry over from one season into
+    the next. Games without a value for a stat are skipped.
+
+    Args:
+        df_weekly_stats (pd.DataFrame): Weekly stats with `player_id`,
+            `season`, `week` and the stats.
+        stats (list[str]): Stats to follow; those the table lacks are left out.
+        windows (tuple[int]): Window lengths, in games.
+
+    Returns:
+        df (pd.DataFrame): One row per weekly row, sorted by `player_id`,
+            `season` and `week`, with `GAME_COLUMNS` and, for each stat and
+            window, `<stat>_mean_<w>` (NaN until the player has a value),
+            `<stat>_sd_<w>` (sample standard deviation, NaN until two
+            values) and `<stat>_ewma_<w>` (span `w`).
+
+    """
+
+    stats = [stat for stat in stats if stat in df_weekly_stats.columns]
+    df = df_weekly_stats.sort_values(GAME_COLUMNS, kind="stable", ignore_index=True)
+    values = df[stats].apply(pd.to_numeric, errors="coerce").astype(float)
+
+    ## sorted by player, so each player's rows are contiguous
+    players, _ = pd.factorize(df["player_id"], use_na_sentinel=False)
+    rows = np.arange(len(df))
+    first_rows = np.maximum.accumulate(np.where(np.r_[True, players[1:] != players[:-1]], rows, 0))
+
+    trends = {}
+    ## every window's EWMA in one pass: one block of columns per window
+    ewma = group_ewma(np.tile(values.to_numpy(), len(windows)), first_rows, np.repeat(windows, len(stats)))
+    for i, window in enumerate(windows):
+        last_games = LastGames(first_rows=first_rows, window_size=window)
+        computed = {
+            "mean": values.rolling(last_games, min_periods=1).mean(),
+            "sd": values.rolling(last_games, min_periods=2).std(),
+            "ewma": pd.DataFrame(ewma[:, i * len(stats):(i + 1) * len(stats)], columns=stats),
+        }
+        for kind, frame in computed.items():
+            for stat in stats:
+                trends["%s_%s_%d" % (stat, kind, window)] = np.round(frame[stat].to_numpy(), TREND_DECIMALS)
+
+    result = df[GAME_COLUMNS].copy()
+    for name in trend_columns(stats, windows):
+        result[name] = trends[name]
+    return result
+
+
+class PlayerTrends:
+    """Player -> their rows of the `weekly_trends` table.
+
+    Args:
+        trends (pa.Table): `weekly_trends` as a table, each player's rows
+            contiguous.
+
+    """
+
+    def __init__(self, trends):
+        self.table = trends
+        ids = pc.cast(trends.column("player_id"), pa.string()).to_numpy(zero_copy_only=False)
+        starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]]) if len(ids) else np.array([], dtype=int)
+        stops = np.r_[starts[1:], len(ids)]
+        self._rows = {player: (start, stop) for player, start, stop in zip(ids[starts].tolist(), starts, stops)}
+
+    def __contains__(self, player_id):
+        return player_id in self._rows
+
+    def player(self, player_id, seasons=None):
+        """Returns one player's trends.
+
+        Args:
+            player_id (str): The player's gsis id.
+            seasons (iterable[int]): Only these seasons' games, if given.
+
+        Returns:
+            trends (dict[str, list]): Column -> one value per game, games
+                in order. Empty lists if the player has no games.
+
+        """
+
+        start, stop = self._rows.get(player_id, (0, 0))
+        rows = self.table.slice(start, stop - start)
+        if seasons is not None:
+            rows = rows.filter(pc.is_in(pc.cast(rows.column("season"), pa.int64()),
+                                        value_set=pa.array(sorted(seasons), pa.int64())))
+        return rows.to_pydict()
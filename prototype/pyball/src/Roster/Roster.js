@@ -44,13 +44,27 @@ export function Roster({rosterPositions}) {
   // State to keep track of errors
   const [error, setError] = React.useState('');
   
+  // State to keep track of the data on players already in the roster
+  const [preloaded, setPreloaded] = React.useState(null);
+
   // Fetch metrics (should only occur once)
   React.useEffect(() => {
     fetchData('/metrics/', setMetrics, (errorMsg) => setError(errorMsg));
   }, []); // no dependencies since this should only occur once
 
+  // Fetch every player saved in the roster with a single request (should only occur once)
+  React.useEffect(() => {
+    const names = JSON.parse(localStorage.getItem('pyballRoster')).filter((name) => name != null);
+    if (names.length === 0) {
+      setPreloaded({});
+    } else {
+      fetchData(`/players/?names=${names.map(encodeURIComponent).join(',')}`, setPreloaded,
+        (errorMsg) => setError(errorMsg));
+    }
+  }, []); // no dependencies since this should only occur once
+
   return (
-    error === '' && metrics
+    error === '' && metrics && preloaded
     ? <table>
         <thead>
           <th>Position</th>
@@ -72,6 +86,7 @@ export function Roster({rosterPositions}) {
               stats={rosterStats}
               rosterIndex={index}
               metrics={metrics}
+              preloaded={preloaded}
             />
           )}
         </tbody>
@@ -30,12 +30,13 @@ function RemoveButton({onClick}) {
  * will be displayed (for example, to average the data and/or format it for display).
  * @param rosterIndex The index in the roster to which this row corresponds.
  * @param metrics Additional metrics which can be accessed by each player's gsis_id.
+ * @param preloaded Player data already fetched for the whole roster, keyed by player name.
  * @returns The roster entry as a row.
  * Precondition: localStorage.getItem('pyballRoster') != null.
  * Postconditon: If a player has been added to the roster, then that player has also been added
  * to 'pyballRoster' at index rosterIndex in local storage.
  */
-export function RosterRow({label, positions, stats, rosterIndex, metrics}) {
+export function RosterRow({label, positions, stats, rosterIndex, metrics, preloaded}) {
 
   // The query to use when searching for a player
   const [query, setQuery] = React.useState('');
@@ -183,9 +184,11 @@ export function RosterRow({label, positions, stats, rosterIndex, metrics}) {
 
     // Update row state based on current mode, data, and local storage values
     if (mode === FETCH_MODE) {
-      // fetch player data and check for errors
+      // fetch player data (unless it was preloaded) and check for errors
       // if no error was detected, add player to roster and set mode to VALID_MODE
-      fetchData(`player/${query}/`, setData, onError);
+      if (data == null) {
+        fetchData(`player/${query}/`, setData, onError);
+      }
       if (data != null && !checkForError()) {
         // no error detected
         modifyRoster(data.full_name);
@@ -197,13 +200,18 @@ export function RosterRow({label, positions, stats, rosterIndex, metrics}) {
       if (preexistent != null) {
         // this row already contains a player in local storage
         setQuery(String(preexistent));
+        const cached = preloaded && preloaded[String(preexistent)];
+        if (cached != null && cached.full_name != null) {
+          // use the data the roster already fetched instead of fetching it again
+          setData(cached);
+        }
         setMode(FETCH_MODE);
       } else {
         // this row does not contain a player in local storage
         setMode(SEARCH_MODE);
       }
     }
-  }, [data, mode, query, positions, rosterIndex, modifyRoster, setQuery, setMode]);
+  }, [data, mode, query, positions, rosterIndex, modifyRoster, setQuery, setMode, preloaded]);
   
   return (
     <tr>